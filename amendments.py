@@ -0,0 +1,379 @@
+# amendments.py
+# Правка и удаление старых записей через журнал поправок рядом с TXT-файлом
+
+import os
+import json
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import datetime, date
+
+import state # Для доступа к путям файлов из настроек
+import data_processing
+import file_operations
+from file_lock import FileLock
+
+# Журнал поправок: <путь к TXT>.amend. Строка JSON на поправку:
+#   {"offset": смещение строки в TXT, "base": исходная запись, "new": новая запись}
+#   {"offset": ..., "base": ..., "del": true} - запись удалена
+# Действует последняя поправка для смещения. Исходная запись хранится, чтобы
+# не применить поправку к другой строке, если TXT изменился, и чтобы статистика
+# из XLSX могла вычесть старое значение.
+AMEND_SUFFIX = ".amend"
+# Поправки, уже внесённые в TXT, пока XLSX ещё не пересобран
+FOLDED_SUFFIX = ".folded"
+# Когда журнал поправок больше этого размера, он вносится в файлы (в фоне)
+COMPACT_THRESHOLD_BYTES = 64 * 1024
+# Как часто (в строках) обновлять блокировки при перезаписи TXT
+LOCK_REFRESH_LINES = 10000
+
+# Кэш разобранных журналов: путь -> (размер, mtime_ns, поправки)
+_cache = {}
+# Не больше одного уплотнения одновременно
+_compaction_lock = threading.Lock()
+
+
+def amend_log_path(txt_path):
+    return txt_path + AMEND_SUFFIX
+
+
+def load_amendments(log_path):
+    """Поправки из журнала: {смещение: (исходная запись, новая запись или None - удалена)}."""
+    try:
+        stat = os.stat(log_path)
+    except OSError:
+        return {}
+    cached = _cache.get(log_path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    amendments = {}
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # Оборванная строка (сбой во время записи)
+            amendments[entry["offset"]] = (entry["base"], None if entry.get("del") else entry["new"])
+    _cache[log_path] = (stat.st_size, stat.st_mtime_ns, amendments)
+    return amendments
+
+
+def current_amendments(txt_path):
+    """Поправки, которые ещё не внесены в TXT."""
+    return load_amendments(amend_log_path(txt_path))
+
+
+def read_txt_record_at(txt_path, offset):
+    """Запись TXT-файла, начинающаяся с данного смещения (None, если строки нет)."""
+    with open(txt_path, "rb") as f:
+        f.seek(offset)
+        return data_processing.parse_txt_line(f.readline().decode("utf-8", errors="replace"))
+
+
+def _append(txt_path, entry):
+    """Дописывает одну поправку (единственная операция ввода-вывода при правке)."""
+    log_path = amend_log_path(txt_path)
+    with FileLock(log_path):
+        if read_txt_record_at(txt_path, entry["offset"]) != entry["base"]:
+            raise ValueError("Запись в TXT-файле изменилась. Обновите список и повторите.")
+        with open(log_path, "ab") as f:
+            f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def amend_record(txt_path, offset, base, new):
+    """Заменяет запись TXT-файла (по смещению) новой записью."""
+    _append(txt_path, {"offset": offset, "base": list(base), "new": list(new)})
+
+
+def delete_record(txt_path, offset, base):
+    """Удаляет запись TXT-файла (по смещению)."""
+    _append(txt_path, {"offset": offset, "base": list(base), "del": True})
+
+
+def apply_in_period(records, amendments, date_from=None, date_to=None):
+    """
+    Применяет поправки к записям периода. records - (смещение, дата, запись)
+    с датой в [date_from, date_to]. Выдаёт (смещение, исходная запись, дата, действующая запись).
+    Записи, перенесённые правкой в период из другого дня, выдаются в конце.
+    """
+    def in_period(day):
+        return day is not None and not (date_from and day < date_from) and not (date_to and day > date_to)
+
+    seen = set()
+    for offset, day, record in records:
+        change = amendments.get(offset)
+        if change is None or change[0] != record:
+            yield offset, record, day, record
+            continue
+        seen.add(offset)
+        base, new = change
+        if new is None:
+            continue
+        new_day = data_processing.parse_record_date(new[0])
+        if in_period(new_day):
+            yield offset, base, new_day, new
+    for offset, (base, new) in amendments.items():
+        if offset in seen or new is None or in_period(data_processing.parse_record_date(base[0])):
+            continue
+        new_day = data_processing.parse_record_date(new[0])
+        if in_period(new_day):
+            yield offset, base, new_day, new
+
+
+def read_last_lines(txt_path, num_lines):
+    """Последние строки журнала с учётом поправок (для панели последних задач)."""
+    amendments = current_amendments(txt_path)
+    if not amendments:
+        return data_processing.read_last_lines(txt_path, num_lines)
+    if not os.path.exists(txt_path):
+        return []
+    deleted = sum(1 for _, new in amendments.values() if new is None)
+    lines = []
+    for offset, raw_line in data_processing.read_last_raw_lines(txt_path, num_lines + deleted):
+        record = data_processing.parse_txt_line(raw_line.decode("utf-8", errors="replace"))
+        if record is None:
+            continue
+        change = amendments.get(offset)
+        if change is not None and change[0] == record:
+            if change[1] is None:
+                continue
+            record = change[1]
+        lines.append(file_operations.record_to_txt_line(record) + "\n")
+    return lines[-num_lines:]
+
+
+def _difficulty(record):
+    try:
+        return int(record[6])
+    except ValueError:
+        return 0
+
+
+def apply_to_day_stats(days_data, txt_path, include_folded=True):
+    """
+    Учитывает поправки в статистике по дням: исходная запись вычитается, новая добавляется.
+    Дни без записей убираются. include_folded - учитывать и поправки, уже внесённые в TXT,
+    но ещё не в XLSX (для статистики, посчитанной по XLSX).
+    """
+    log_path = amend_log_path(txt_path)
+    changes = list(load_amendments(log_path).values())
+    if include_folded:
+        changes += list(load_amendments(log_path + FOLDED_SUFFIX).values())
+    if not changes:
+        return
+    for base, new in changes:
+        base_date = data_processing.parse_record_date(base[0])
+        if base_date is not None:
+            data_processing.add_to_day_stats(days_data, base_date, base[4], -_difficulty(base), count=-1)
+        if new is not None:
+            new_date = data_processing.parse_record_date(new[0])
+            if new_date is not None:
+                data_processing.add_to_day_stats(days_data, new_date, new[4], _difficulty(new))
+    for day in [day for day, stats in days_data.items() if stats['count'] <= 0]:
+        del days_data[day]
+
+
+# === УПЛОТНЕНИЕ: ВНЕСЕНИЕ ПОПРАВОК В ФАЙЛЫ ===
+def needs_compaction(txt_path):
+    log_path = amend_log_path(txt_path)
+    if os.path.exists(log_path + FOLDED_SUFFIX):
+        return True
+    try:
+        return os.path.getsize(log_path) > COMPACT_THRESHOLD_BYTES
+    except OSError:
+        return False
+
+
+def compact(txt_path, xlsx_path=None):
+    """
+    Вносит поправки в TXT (перезапись через временный файл под блокировкой),
+    затем в XLSX - по его собственным строкам (строки только из XLSX и ручные
+    правки в книге сохраняются). Пока поправки не внесены в XLSX, журнал хранится
+    с суффиксом .folded, и статистика по XLSX продолжает его учитывать.
+    """
+    log_path = amend_log_path(txt_path)
+    folded_path = log_path + FOLDED_SUFFIX
+    if not os.path.exists(folded_path):
+        with FileLock(txt_path) as txt_lock:
+            with FileLock(log_path) as log_lock:
+                amendments = load_amendments(log_path)
+                if not amendments:
+                    if os.path.exists(log_path):
+                        os.remove(log_path)
+                    return
+                tmp_path = txt_path + ".tmp"
+                with open(txt_path, "rb") as src, open(tmp_path, "wb") as dst:
+                    offset = 0
+                    for line_number, raw_line in enumerate(src, start=1):
+                        if line_number % LOCK_REFRESH_LINES == 0:
+                            # Перезапись большого журнала не должна выглядеть как зависшая блокировка
+                            txt_lock.refresh()
+                            log_lock.refresh()
+                        change = amendments.get(offset)
+                        offset += len(raw_line)
+                        if change is not None:
+                            record = data_processing.parse_txt_line(raw_line.decode("utf-8", errors="replace"))
+                            if record == change[0]:
+                                if change[1] is not None:
+                                    dst.write(file_operations.txt_payload([change[1]]))
+                                continue
+                        dst.write(raw_line)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.replace(tmp_path, txt_path)
+                os.replace(log_path, folded_path)
+        print(f"Поправки внесены в {txt_path}: {len(amendments)}") # Для отладки
+    if xlsx_path and os.path.exists(xlsx_path):
+        changed = file_operations.apply_changes_to_excel(xlsx_path, load_amendments(folded_path).values())
+        print(f"Поправки внесены в {xlsx_path}: {changed}") # Для отладки
+    os.remove(folded_path)
+
+
+def compact_in_background(txt_path, xlsx_path=None, on_done=None):
+    """Запускает уплотнение в фоновом потоке, если журнал поправок вырос (или не доведён).
+       on_done() вызывается из фонового потока после успешного уплотнения."""
+    if not txt_path or not needs_compaction(txt_path):
+        return None
+    if not _compaction_lock.acquire(blocking=False):
+        return None
+
+    def run():
+        try:
+            compact(txt_path, xlsx_path)
+            if on_done:
+                on_done()
+        except Exception as e:
+            print(f"Ошибка при внесении поправок в файлы: {e}")
+        finally:
+            _compaction_lock.release()
+
+    # Поток не фоновый (daemon=False): при закрытии окна процесс дождётся конца перезаписи
+    thread = threading.Thread(target=run, name="amendments-compaction")
+    thread.start()
+    return thread
+
+
+# === ОКНО ПРАВКИ ЗАПИСЕЙ ===
+def show_edit_window(parent_window, on_change=None):
+    """Окно правки и удаления записей за выбранный день.
+       on_change() вызывается после каждой правки (например, для обновления панели задач)."""
+    import report_export # Индекс дат журнала
+
+    txt_path = state.settings["txt_path"].get().strip()
+    if not txt_path or not os.path.exists(txt_path):
+        messagebox.showwarning("Ошибка", f"TXT-файл не найден:\n{txt_path}", parent=parent_window)
+        return
+    xlsx_path = state.settings["excel_path"].get().strip() if state.settings["save_excel"].get() else None
+
+    window = tk.Toplevel(parent_window)
+    window.title("Правка записей")
+    window.geometry("800x450")
+    window.grab_set()
+    window.focus_set()
+
+    controls = tk.Frame(window)
+    controls.pack(fill="x", padx=10, pady=(10, 5))
+    day_var = tk.StringVar(value=date.today().strftime("%d.%m.%Y"))
+    tk.Label(controls, text="День:").pack(side="left")
+    tk.Entry(controls, textvariable=day_var, width=10).pack(side="left", padx=(2, 8))
+
+    columns = ('Дата', 'Время', 'Вид задачи', 'Сложность', 'Задача')
+    tree = ttk.Treeview(window, columns=columns, show='headings', selectmode='browse')
+    for column, width in zip(columns, (80, 60, 80, 80, 450)):
+        tree.heading(column, text=column)
+        tree.column(column, width=width, anchor='w' if column == 'Задача' else 'center')
+    tree.pack(fill="both", expand=True, padx=10)
+
+    # Форма правки выбранной записи
+    form = tk.Frame(window)
+    form.pack(fill="x", padx=10, pady=5)
+    date_var, time_var = tk.StringVar(), tk.StringVar()
+    type_var, difficulty_var, description_var = tk.StringVar(), tk.StringVar(), tk.StringVar()
+    tk.Entry(form, textvariable=date_var, width=10).pack(side="left")
+    tk.Entry(form, textvariable=time_var, width=6).pack(side="left", padx=(2, 0))
+    ttk.Combobox(form, textvariable=type_var, values=data_processing.TASK_TYPE_CODES, width=4).pack(side="left", padx=(2, 0))
+    ttk.Combobox(form, textvariable=difficulty_var, values=[str(i) for i in range(6)], width=3).pack(side="left", padx=(2, 0))
+    tk.Entry(form, textvariable=description_var).pack(side="left", fill="x", expand=True, padx=(2, 0))
+
+    rows = {} # iid -> (смещение, исходная запись, действующая запись)
+
+    def load():
+        try:
+            day = datetime.strptime(day_var.get().strip(), "%d.%m.%Y").date()
+        except ValueError:
+            messagebox.showwarning("Ошибка", "Дата указывается в формате дд.мм.гггг.", parent=window)
+            return
+        tree.delete(*tree.get_children())
+        rows.clear()
+        for offset, base, _, record in report_export.iter_report_records(txt_path, day, day, detailed=True):
+            iid = tree.insert('', tk.END, values=(record[0], record[1], record[4], record[6], record[5]))
+            rows[iid] = (offset, base, record)
+        for var in (date_var, time_var, type_var, difficulty_var, description_var):
+            var.set("")
+
+    def on_select(event=None):
+        selection = tree.selection()
+        if not selection:
+            return
+        record = rows[selection[0]][2]
+        date_var.set(record[0])
+        time_var.set(record[1])
+        type_var.set(record[4])
+        difficulty_var.set(record[6])
+        description_var.set(record[5])
+
+    def selected_row():
+        selection = tree.selection()
+        if not selection:
+            messagebox.showwarning("Ошибка", "Выберите запись в списке.", parent=window)
+            return None
+        return rows[selection[0]]
+
+    def after_change():
+        load()
+        if on_change:
+            on_change()
+        compact_in_background(txt_path, xlsx_path)
+
+    def save_changes():
+        row = selected_row()
+        if row is None:
+            return
+        offset, base, _ = row
+        try:
+            new = data_processing.build_record(date_var.get(), time_var.get(), type_var.get(),
+                                               difficulty_var.get(), description_var.get())
+        except ValueError as e:
+            messagebox.showwarning("Ошибка", str(e), parent=window)
+            return
+        try:
+            amend_record(txt_path, offset, base, new)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить правку:\n{e}", parent=window)
+            return
+        after_change()
+
+    def delete_selected():
+        row = selected_row()
+        if row is None:
+            return
+        offset, base, record = row
+        if not messagebox.askyesno("Удаление", f"Удалить запись?\n{record[0]} {record[1]} {record[5]}", parent=window):
+            return
+        try:
+            delete_record(txt_path, offset, base)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось удалить запись:\n{e}", parent=window)
+            return
+        after_change()
+
+    tree.bind("<<TreeviewSelect>>", on_select)
+    tk.Button(controls, text="Показать", command=load).pack(side="left")
+
+    buttons = tk.Frame(window)
+    buttons.pack(fill="x", padx=10, pady=(0, 10))
+    tk.Button(buttons, text="Удалить запись", command=delete_selected, bg="#FF4444", fg="white").pack(side="right")
+    tk.Button(buttons, text="Сохранить изменения", command=save_changes, bg="#4CAF50", fg="white").pack(side="right", padx=5)
+    load()
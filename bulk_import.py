@@ -0,0 +1,362 @@
+# bulk_import.py
+# Массовый импорт записей из CSV (выгрузки тайм-трекеров) и ICS (календари)
+
+import os
+import re
+import sys
+import csv
+import uuid
+import argparse
+from datetime import datetime, timezone
+
+import data_processing
+import parallel_scan # Параллельный подсчёт хэшей TXT
+import save_journal
+
+# Поля записи, которые ищутся в заголовке CSV (имена в нижнем регистре)
+CSV_HEADER_ALIASES = {
+    'datetime': ["начало", "start", "started", "start datetime", "дата и время", "dtstart"],
+    'date': ["дата", "date", "day", "start date", "дата начала", "день"],
+    'time': ["время", "time", "время начала", "start time"],
+    'task_type': ["вид задачи", "вид", "тип", "type", "category", "категория", "project", "проект", "tag", "tags"],
+    'difficulty': ["сложность", "difficulty", "complexity"],
+    'description': ["задача", "описание", "description", "task", "summary", "title", "название", "comment", "комментарий"],
+}
+
+# Форматы даты и даты-времени в источниках (порядок важен: дд.мм раньше мм/дд)
+DATE_FORMATS = ["%d.%m.%Y", "%Y-%m-%d", "%d.%m.%y", "%d/%m/%Y", "%Y/%m/%d", "%m/%d/%Y"]
+DATETIME_FORMATS = [
+    "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y %H:%M", "%m/%d/%Y %H:%M", "%d.%m.%y %H:%M",
+]
+TIME_FORMATS = ["%H:%M", "%H:%M:%S", "%I:%M %p"]
+
+# Время для записей, у которых в источнике только дата
+DEFAULT_TIME = "09:00"
+
+PROGRESS_EVERY_LINES = 5000
+
+# Разделитель по умолчанию, если его не удалось определить (русский Excel пишет ";")
+class _SemicolonDialect(csv.excel):
+    delimiter = ";"
+
+_ICS_CATEGORY_SPLIT = re.compile(r"(?<!\\),")
+
+
+class _FormatGuesser:
+    """Разбор строк по списку форматов; удачный формат пробуется первым
+       (в одном файле формат обычно один, поэтому strptime вызывается ~1 раз на строку)."""
+
+    def __init__(self, formats):
+        self.formats = list(formats)
+
+    def parse(self, value):
+        for index, fmt in enumerate(self.formats):
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            if index:
+                self.formats.insert(0, self.formats.pop(index))
+            return parsed
+        return None
+
+
+def _iter_text_lines(path, progress_callback=None):
+    """Строки файла в текстовом виде с отчётом о прогрессе по байтам.
+       Кодировка: UTF-8 (с BOM или без), иначе cp1251 (выгрузки из русского Excel)."""
+    total = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(65536)
+        encoding = "utf-8-sig"
+        try:
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if e.start < len(head) - 4: # Иначе это просто обрезанный на границе символ
+                encoding = "cp1251"
+        f.seek(0)
+        done = 0
+        for line_number, raw_line in enumerate(f, 1):
+            done += len(raw_line)
+            yield raw_line.decode(encoding, errors="replace")
+            if progress_callback and line_number % PROGRESS_EVERY_LINES == 0:
+                progress_callback(done, total)
+    if progress_callback:
+        progress_callback(total, total)
+
+
+def _map_header(header):
+    """Индексы колонок CSV для полей записи по заголовку."""
+    names = [name.strip().lower() for name in header]
+    mapping = {}
+    for field, aliases in CSV_HEADER_ALIASES.items():
+        for alias in aliases:
+            if alias in names and names.index(alias) not in mapping.values():
+                mapping[field] = names.index(alias)
+                break
+    return mapping
+
+
+def iter_csv_entries(path, progress_callback=None):
+    """
+    Читает CSV потоком. Колонки определяются по заголовку (см. CSV_HEADER_ALIASES),
+    разделитель - по первой строке. Выдаёт словари с полями
+    'date', 'time', 'datetime', 'task_type', 'difficulty', 'description' (строки, могут отсутствовать).
+    """
+    lines = _iter_text_lines(path, progress_callback)
+    first_line = next(lines, None)
+    if first_line is None:
+        return
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=";,\t")
+    except csv.Error:
+        dialect = _SemicolonDialect
+    header = next(csv.reader([first_line], dialect))
+    mapping = _map_header(header)
+    if 'description' not in mapping or not ({'date', 'datetime'} & set(mapping)):
+        raise ValueError("Не удалось определить колонки даты и описания по заголовку CSV:\n" + "; ".join(header))
+    for row in csv.reader(lines, dialect):
+        yield {field: row[index] for field, index in mapping.items() if index < len(row)}
+
+
+def _unescape_ics(text):
+    return (text.replace("\\n", " ").replace("\\N", " ").replace("\\,", ",")
+            .replace("\\;", ";").replace("\\\\", "\\"))
+
+
+def _parse_ics_datetime(params, value):
+    """DTSTART: дата (VALUE=DATE), местное время или UTC (суффикс Z, переводится в местное)."""
+    value = value.strip()
+    if "VALUE=DATE" in params.upper() or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d"), False
+    is_utc = value.endswith("Z")
+    parsed = datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    if is_utc:
+        parsed = parsed.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return parsed, True
+
+
+def iter_ics_entries(path, progress_callback=None):
+    """
+    Читает события VEVENT из ICS потоком (с учётом переноса длинных строк).
+    DTSTART - дата и время, SUMMARY (+ DESCRIPTION) - описание, первая из CATEGORIES - вид задачи.
+    """
+    event = None
+
+    def unfolded(lines):
+        current = None
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and current is not None:
+                current += line[1:]
+                continue
+            if current is not None:
+                yield current
+            current = line
+        if current is not None:
+            yield current
+
+    for line in unfolded(_iter_text_lines(path, progress_callback)):
+        name_params, _, value = line.partition(":")
+        name, _, params = name_params.partition(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event = {}
+        elif name == "END" and value.upper() == "VEVENT":
+            if event is not None:
+                yield event
+            event = None
+        elif event is not None:
+            if name == "DTSTART":
+                try:
+                    start, has_time = _parse_ics_datetime(params, value)
+                except ValueError:
+                    continue
+                event['datetime_value'] = start
+                event['has_time'] = has_time
+            elif name == "SUMMARY":
+                event['summary'] = _unescape_ics(value)
+            elif name == "DESCRIPTION":
+                event['details'] = _unescape_ics(value)
+            elif name == "CATEGORIES":
+                event['task_type'] = _unescape_ics(_ICS_CATEGORY_SPLIT.split(value)[0])
+
+
+def _ics_to_entry(event):
+    description = event.get('summary', "").strip()
+    details = event.get('details', "").strip()
+    if details and details != description:
+        description = f"{description}: {details}" if description else details
+    entry = {'description': description, 'task_type': event.get('task_type', "")}
+    start = event.get('datetime_value')
+    if start is not None:
+        entry['date_value'] = start.date()
+        if event.get('has_time'):
+            entry['time_value'] = start.strftime("%H:%M")
+    return entry
+
+
+class _RecordBuilder:
+    """Собирает записи журнала из полей источника. День недели и часть дня
+       считаются один раз на дату/час (в источниках много записей за один день)."""
+
+    def __init__(self, default_task_type=data_processing.DEFAULT_TASK_TYPE,
+                 default_difficulty=data_processing.DEFAULT_DIFFICULTY, default_time=DEFAULT_TIME):
+        if default_task_type not in data_processing.TASK_TYPE_CODES:
+            raise ValueError(f"Неизвестный вид задачи {default_task_type!r}, "
+                             f"допустимы: {', '.join(data_processing.TASK_TYPE_CODES)}")
+        if default_difficulty not in data_processing.DIFFICULTY_VALUES:
+            raise ValueError(f"Сложность должна быть от 0 до 5: {default_difficulty!r}")
+        self.default_task_type = default_task_type
+        self.default_difficulty = default_difficulty
+        self.default_time = default_time
+        self.date_parser = _FormatGuesser(DATE_FORMATS)
+        self.datetime_parser = _FormatGuesser(DATETIME_FORMATS + DATE_FORMATS)
+        self.time_parser = _FormatGuesser(TIME_FORMATS)
+        self.weekdays = {}     # дата -> день недели
+        self.parts_of_day = {} # час -> часть дня
+        # Виды задач источника сверяются с кодами журнала без учёта регистра;
+        # чужие (проекты, теги тайм-трекера) заменяются видом по умолчанию
+        self.task_types = {code.upper(): code for code in data_processing.TASK_TYPE_CODES}
+        self.retyped = 0 # Сколько записей получили вид по умолчанию вместо неизвестного
+
+    def build(self, entry):
+        """Запись из 7 строк или None, если нет даты или описания."""
+        description = " ".join((entry.get('description') or "").split())
+        if not description:
+            return None
+        record_date = entry.get('date_value')
+        time_str = entry.get('time_value')
+        if record_date is None:
+            if entry.get('datetime'):
+                parsed = self.datetime_parser.parse(entry['datetime'].strip())
+                if parsed is not None:
+                    record_date = parsed.date()
+                    if parsed.time() != datetime.min.time() or ":" in entry['datetime']:
+                        time_str = parsed.strftime("%H:%M")
+            if record_date is None and entry.get('date'):
+                parsed = self.datetime_parser.parse(entry['date'].strip())
+                record_date = parsed.date() if parsed else None
+        if record_date is None:
+            return None
+        if entry.get('time'):
+            parsed = self.time_parser.parse(entry['time'].strip())
+            if parsed is not None:
+                time_str = parsed.strftime("%H:%M")
+        time_str = time_str or self.default_time
+
+        date_str = record_date.strftime("%d.%m.%Y")
+        weekday = self.weekdays.get(record_date)
+        if weekday is None:
+            weekday = self.weekdays[record_date] = data_processing.get_weekday_rus(date_str)
+        hour = int(time_str[:2])
+        part_of_day = self.parts_of_day.get(hour)
+        if part_of_day is None:
+            part_of_day = self.parts_of_day[hour] = data_processing.get_part_of_day(hour)
+
+        source_type = (entry.get('task_type') or "").strip()
+        task_type = self.task_types.get(source_type.upper())
+        if task_type is None:
+            if source_type:
+                self.retyped += 1
+            task_type = self.default_task_type
+        difficulty = (entry.get('difficulty') or "").strip()
+        if difficulty not in data_processing.DIFFICULTY_VALUES:
+            difficulty = self.default_difficulty
+        return [date_str, time_str, weekday, part_of_day, task_type, description, difficulty]
+
+
+def detect_format(path):
+    return "ics" if path.lower().endswith((".ics", ".ical", ".ifb")) else "csv"
+
+
+def _existing_hashes(txt_path, xlsx_path):
+    """Хэши записей, которые уже есть в журнале (по TXT, если он ведётся, иначе по XLSX)."""
+    if txt_path and os.path.exists(txt_path):
+        return set(parallel_scan.hash_counts(txt_path))
+    if xlsx_path and os.path.exists(xlsx_path):
+        records = data_processing.iter_excel_rows(xlsx_path)
+    else:
+        return set()
+    return {data_processing.record_hash(data_processing.normalize_record(record)) for record in records}
+
+
+def prepare_import(source_path, txt_path=None, xlsx_path=None, fmt=None, progress_callback=None, **defaults):
+    """
+    Читает источник и готовит записи к импорту, отбрасывая уже имеющиеся в журнале
+    и повторы внутри самого источника.
+    Возвращает (записи, статистика) - статистика: 'read', 'new', 'duplicates', 'rejected',
+    'retyped' (неизвестный вид задачи заменён видом по умолчанию).
+    ValueError - недопустимые значения по умолчанию.
+    """
+    fmt = fmt or detect_format(source_path)
+    existing = _existing_hashes(txt_path, xlsx_path)
+    builder = _RecordBuilder(**defaults)
+    if fmt == "ics":
+        entries = (_ics_to_entry(event) for event in iter_ics_entries(source_path, progress_callback))
+    else:
+        entries = iter_csv_entries(source_path, progress_callback)
+
+    records = []
+    stats = {'read': 0, 'new': 0, 'duplicates': 0, 'rejected': 0}
+    for entry in entries:
+        stats['read'] += 1
+        record = builder.build(entry)
+        if record is None:
+            stats['rejected'] += 1
+            continue
+        key = data_processing.record_hash(data_processing.normalize_record(record))
+        if key in existing:
+            stats['duplicates'] += 1
+            continue
+        existing.add(key)
+        records.append(record)
+    stats['new'] = len(records)
+    stats['retyped'] = builder.retyped
+    return records, stats
+
+
+def write_import(records, txt_path=None, xlsx_path=None, wal_path=None):
+    """Записывает подготовленные записи одним сохранением (одна дозапись TXT, одна запись XLSX)."""
+    if not records:
+        return
+    batch_id = uuid.uuid4().hex
+    save_journal.save_records([(f"{batch_id}-{index}", record) for index, record in enumerate(records)],
+                              txt_path, xlsx_path, wal_path)
+
+
+def format_stats(stats):
+    return (f"Прочитано: {stats['read']}\nНовых записей: {stats['new']}\n"
+            f"Уже есть в журнале: {stats['duplicates']}\nПропущено (нет даты или описания): {stats['rejected']}\n"
+            f"Неизвестный вид задачи заменён на вид по умолчанию: {stats['retyped']}")
+
+
+def main(argv=None):
+    """Импорт из командной строки: python bulk_import.py выгрузка.csv [--dry-run]"""
+    import settings
+    plain_settings = settings.read_plain_settings()
+    parser = argparse.ArgumentParser(description="Импорт записей из CSV или ICS")
+    parser.add_argument("source", help="файл CSV или ICS")
+    parser.add_argument("--format", choices=["csv", "ics"], default=None, help="формат (по умолчанию - по расширению)")
+    parser.add_argument("--default-type", default=data_processing.DEFAULT_TASK_TYPE,
+                        choices=data_processing.TASK_TYPE_CODES,
+                        help="вид задачи, если в источнике не указан или не из списка видов журнала")
+    parser.add_argument("--default-difficulty", default=data_processing.DEFAULT_DIFFICULTY,
+                        choices=data_processing.DIFFICULTY_VALUES, help="сложность, если в источнике не указана")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет импортировано")
+    args = parser.parse_args(argv)
+
+    txt_path = plain_settings["txt_path"] if plain_settings["save_txt"] else None
+    xlsx_path = plain_settings["excel_path"] if plain_settings["save_excel"] else None
+    records, stats = prepare_import(args.source, txt_path, xlsx_path, args.format,
+                                    default_task_type=args.default_type,
+                                    default_difficulty=args.default_difficulty)
+    print(format_stats(stats))
+    if not args.dry_run and records:
+        write_import(records, txt_path, xlsx_path, settings.get_app_file_path(save_journal.WAL_FILENAME))
+        print(f"Импортировано записей: {len(records)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
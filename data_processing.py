@@ -1,10 +1,12 @@
 # data_processing.py
 # Логика обработки данных: даты, время, чтение файлов
 
-from datetime import datetime
+from datetime import datetime, date, time
 from babel.dates import format_date
 import locale
 import os
+import hashlib
+from functools import lru_cache
 
 # === УСТАНОВКА ЛОКАЛИ ДЛЯ РУССКОГО ЯЗЫКА ===
 # Это можно оставить здесь или перенести в main.py, если используется только там
@@ -16,6 +18,18 @@ except:
     except:
         pass
 
+# === ВИДЫ ЗАДАЧ: КОД И ОПИСАНИЕ ===
+TASK_TYPES = [
+    ('У', 'У — Управленческая задача'),
+    ('Р', 'Р — рутина, текучка'),
+    ('ОК', 'ОК — Обще-кристовская задача'),
+    ('Л', 'Л — Личные дела'),
+    ('ЗП', 'ЗП — Зарплаты сотрудников'),
+    ('ГК', 'ГК — Работы по сдаче документов ГК'),
+    ('КК', 'КК — Криста Команда')
+]
+TASK_TYPE_CODES = [code for code, _ in TASK_TYPES]
+
 # === ФУНКЦИЯ: ОПРЕДЕЛЕНИЕ ЧАСТИ ДНЯ ПО ЧАСУ ===
 def get_part_of_day(hour):
     if 0 <= hour < 9:
@@ -30,6 +44,7 @@ def get_part_of_day(hour):
         return "После работы"
 
 # === ФУНКЦИЯ: ПОЛУЧЕНИЕ ДНЯ НЕДЕЛИ НА РУССКОМ ===
+@lru_cache(maxsize=1024) # Вызывается при вводе даты в каждой записи; babel работает медленно
 def get_weekday_rus(date_str):
     try:
         dt = datetime.strptime(date_str, "%d.%m.%Y")
@@ -41,17 +56,200 @@ def get_weekday_rus(date_str):
     except:
         return "??"
 
+# === ФУНКЦИЯ: ПРОВЕРКА И СБОРКА ЗАПИСИ ===
+# Значения по умолчанию - как у новой записи в окне программы
+DEFAULT_TASK_TYPE = "Р"
+DEFAULT_DIFFICULTY = "1"
+DIFFICULTY_VALUES = [str(i) for i in range(6)]
+
+def build_record(date_str=None, time_str=None, task_type=None, difficulty=None, description=""):
+    """Проверяет поля записи так же, как окно ввода, и собирает запись из 7 полей
+       (день недели и часть дня вычисляются). Пустые дата/время - текущие.
+       При ошибке (в том числе при значении не того типа, например из JSON)
+       выбрасывает ValueError с описанием на русском."""
+    for field_name, value in (("Дата", date_str), ("Время", time_str),
+                              ("Вид задачи", task_type), ("Описание", description)):
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field_name}: ожидается строка, а не {type(value).__name__}")
+    if difficulty is not None and (isinstance(difficulty, bool) or not isinstance(difficulty, (str, int))):
+        raise ValueError(f"Сложность: ожидается число или строка, а не {type(difficulty).__name__}")
+    now = datetime.now()
+    date_str = (date_str or "").strip() or now.strftime("%d.%m.%Y")
+    time_str = (time_str or "").strip() or now.strftime("%H:%M")
+    task_type = (task_type or "").strip() or DEFAULT_TASK_TYPE
+    difficulty = str(difficulty).strip() if difficulty not in (None, "") else DEFAULT_DIFFICULTY
+    description = " ".join((description or "").split()) # В одну строку, как при сохранении
+    try:
+        datetime.strptime(date_str, "%d.%m.%Y")
+    except ValueError:
+        raise ValueError(f"Дата должна быть в формате дд.мм.гггг: {date_str!r}")
+    try:
+        hour = datetime.strptime(time_str, "%H:%M").hour
+    except ValueError:
+        raise ValueError(f"Время должно быть в формате ЧЧ:ММ: {time_str!r}")
+    if task_type not in TASK_TYPE_CODES:
+        raise ValueError(f"Неизвестный вид задачи {task_type!r}, допустимы: {', '.join(TASK_TYPE_CODES)}")
+    if difficulty not in DIFFICULTY_VALUES:
+        raise ValueError(f"Сложность должна быть от 0 до 5: {difficulty!r}")
+    if not description:
+        raise ValueError("Описание задачи не может быть пустым")
+    return [date_str, time_str, get_weekday_rus(date_str), get_part_of_day(hour), task_type, description, difficulty]
+
 # === ФУНКЦИЯ: ЧТЕНИЕ ПОСЛЕДНИХ СТРОК ИЗ ФАЙЛА ===
+# Размер блока при чтении файла с конца
+TAIL_BLOCK_SIZE = 64 * 1024
+
+def read_last_raw_lines(filename, num_lines):
+    """Читает файл с конца блоками, пока не наберётся num_lines строк.
+       Возвращает список пар (смещение строки в байтах, строка в байтах с переводом строки)."""
+    with open(filename, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        start = end
+        data = b""
+        # Нужна ещё граница строки перед первой из нужных (или начало файла)
+        while start > 0 and data.count(b"\n", 0, max(len(data) - 1, 0)) < num_lines:
+            step = min(TAIL_BLOCK_SIZE, start)
+            start -= step
+            f.seek(start)
+            data = f.read(step) + data
+    lines = data.splitlines(keepends=True)
+    if start > 0 and lines:
+        lines = lines[1:] # Первая строка неполная - её начало в непрочитанной части
+    lines = lines[-num_lines:] if num_lines > 0 else []
+    offset = end - sum(len(line) for line in lines)
+    result = []
+    for line in lines:
+        result.append((offset, line))
+        offset += len(line)
+    return result
+
 def read_last_lines(filename, num_lines):
-    """Читает последние num_lines строк из файла"""
+    """Читает последние num_lines строк из файла (с конца, не читая файл целиком)"""
     if not os.path.exists(filename):
         return []
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            # Читаем все строки
-            lines = f.readlines()
-            # Возвращаем последние num_lines строк
-            return lines[-num_lines:] if lines else []
+        return [line.decode('utf-8', errors='replace').replace('\r\n', '\n')
+                for _, line in read_last_raw_lines(filename, num_lines)]
     except Exception as e:
         print(f"Ошибка при чтении файла {filename}: {e}")
         return []
+
+# === ФУНКЦИЯ: РАЗБОР СТРОКИ TXT-ФАЙЛА ===
+# Количество полей в строке TXT: дата, время, день недели, часть дня, вид задачи, описание, сложность
+TXT_FIELDS_COUNT = 7
+
+def parse_txt_line(line):
+    """Разбирает строку TXT-файла в список из 7 полей.
+       Возвращает None для пустых и некорректных строк."""
+    line = line.rstrip("\r\n")
+    if not line:
+        return None
+    fields = line.split("\t")
+    if len(fields) < TXT_FIELDS_COUNT:
+        return None
+    if len(fields) > TXT_FIELDS_COUNT:
+        # Табуляция внутри описания: склеиваем всё между видом задачи и сложностью
+        fields = fields[:5] + ["\t".join(fields[5:-1])] + [fields[-1]]
+    return fields
+
+# === ФУНКЦИЯ: ПОТОКОВОЕ ЧТЕНИЕ ЗАПИСЕЙ ИЗ TXT-ФАЙЛА ===
+def iter_txt_records(filename, progress_callback=None, progress_every=10000, with_offsets=False):
+    """Построчно читает TXT-файл и выдаёт разобранные записи
+       (или пары (смещение строки в байтах, запись), если with_offsets).
+       Читается только то, что было в файле на момент начала чтения.
+       progress_callback(прочитано_байт, всего_байт) вызывается каждые progress_every строк."""
+    total_bytes = os.path.getsize(filename)
+    done_bytes = 0
+    with open(filename, 'rb') as f:
+        for line_number, raw_line in enumerate(f, start=1):
+            offset = done_bytes
+            done_bytes += len(raw_line)
+            if done_bytes > total_bytes:
+                break # Строки, дописанные после начала чтения, не трогаем
+            record = parse_txt_line(raw_line.decode('utf-8', errors='replace'))
+            if record is not None:
+                yield (offset, record) if with_offsets else record
+            if progress_callback and line_number % progress_every == 0:
+                progress_callback(done_bytes, total_bytes)
+    if progress_callback:
+        progress_callback(total_bytes, total_bytes)
+
+# === ФУНКЦИЯ: НОРМАЛИЗАЦИЯ ЗАПИСИ ДЛЯ СРАВНЕНИЯ ===
+def normalize_record(values):
+    """Приводит запись из TXT или строку из XLSX к кортежу из 7 строк в том виде,
+       в каком их пишут save в TXT/Excel: дата dd.mm.yyyy, время HH:MM,
+       описание в одну строку, сложность строкой."""
+    values = list(values[:TXT_FIELDS_COUNT]) + [None] * (TXT_FIELDS_COUNT - len(values))
+    normalized = []
+    for index, value in enumerate(values):
+        if value is None:
+            text = ""
+        elif isinstance(value, datetime):
+            text = value.strftime("%H:%M") if index == 1 else value.strftime("%d.%m.%Y")
+        elif isinstance(value, date):
+            text = value.strftime("%d.%m.%Y")
+        elif isinstance(value, time):
+            text = value.strftime("%H:%M")
+        elif isinstance(value, float) and value.is_integer():
+            text = str(int(value))
+        else:
+            text = str(value)
+        if index == 5:
+            text = text.replace('\n', ' ').replace('\r', ' ')
+        normalized.append(text.strip())
+    return tuple(normalized)
+
+def record_hash(normalized_record):
+    """Короткий хэш нормализованной записи (16 байт)."""
+    return hashlib.blake2b("\x1f".join(normalized_record).encode("utf-8"), digest_size=16).digest()
+
+# === ФУНКЦИЯ: ПОТОКОВОЕ ЧТЕНИЕ СТРОК ИЗ EXCEL ===
+def iter_excel_rows(filename):
+    """Выдаёт строки журнала (первые 7 колонок первого листа) из Excel-файла.
+       Строка заголовка пропускается."""
+    import xlsx_reader # Быстрое чтение листа без openpyxl
+    for row_index, row in enumerate(xlsx_reader.iter_rows(filename, max_col=TXT_FIELDS_COUNT)):
+        first = row[0]
+        if row_index == 0 and isinstance(first, str) and 'дата' in first.lower():
+            continue # Заголовок
+        yield row
+
+# === ФУНКЦИИ: ДНЕВНАЯ СТАТИСТИКА ===
+def parse_record_date(date_value):
+    """Приводит значение поля "Дата" (строка dd.mm.yyyy, datetime или число Excel)
+       к datetime.date. Возвращает None, если это не дата."""
+    if isinstance(date_value, datetime):
+        return date_value.date()
+    if isinstance(date_value, (int, float)) and not isinstance(date_value, bool):
+        # Дата-число Excel без формата даты (например, после ручной правки ячейки)
+        if 1 <= date_value < 2958466:
+            import xlsx_reader
+            return xlsx_reader.excel_serial_to_datetime(date_value).date()
+        return None
+    if isinstance(date_value, str):
+        try:
+            # Пытаемся распарсить дату в формате dd.mm.yyyy
+            return datetime.strptime(date_value.strip(), "%d.%m.%Y").date()
+        except ValueError:
+            pass
+    return None
+
+def add_to_day_stats(days_data, record_date, task_type, difficulty_raw, count=1):
+    """Добавляет запись (или count записей с суммой сложности difficulty_raw)
+       в статистику по дням: {дата: {'count', 'total_difficulty', 'difficulty_by_type'}}."""
+    if not task_type:
+        task_type = "Не указан"
+    try:
+        difficulty = int(difficulty_raw) if difficulty_raw is not None else 0
+    except (ValueError, TypeError):
+        difficulty = 0
+    day = days_data.get(record_date)
+    if day is None:
+        day = days_data[record_date] = {
+            'count': 0,
+            'total_difficulty': 0,
+            'difficulty_by_type': {}
+        }
+    day['count'] += count
+    day['total_difficulty'] += difficulty
+    day['difficulty_by_type'][task_type] = day['difficulty_by_type'].get(task_type, 0) + difficulty
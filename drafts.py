@@ -0,0 +1,174 @@
+# drafts.py
+# Автосохранение несохранённых записей (черновиков) и их восстановление после сбоя
+
+import os
+import json
+import time
+import tkinter as tk
+
+# Имя файла журнала черновиков (лежит рядом с settings.ini)
+DRAFTS_FILENAME = "drafts.journal"
+# Как часто проверять записи на изменения (мс)
+AUTOSAVE_INTERVAL_MS = 2000
+# Как часто принудительно сбрасывать журнал на диск (fsync), секунд
+FSYNC_INTERVAL_SECONDS = 10
+# После скольких строк журнал переписывается компактным снимком
+COMPACT_AFTER_LINES = 2000
+
+
+def read_record_fields(rec):
+    """Снимает значения полей записи, которые нужно сохранять в черновике."""
+    return {
+        'date': rec['date_var'].get(),
+        'time': rec['time_var'].get(),
+        'task_type': rec['task_type_var'].get(),
+        'difficulty': rec['difficulty_var'].get(),
+        'description': rec['description_text'].get("1.0", "end-1c"),
+    }
+
+
+def load_drafts(path):
+    """
+    Восстанавливает черновики из журнала.
+    Журнал состоит из строк JSON:
+      {"id": ..., "set": {поле: значение, ...}} - изменились поля записи
+      {"id": ..., "del": true}                  - запись сохранена или удалена
+    Возвращает словарь id -> поля в порядке появления записей.
+    Оборванная последняя строка (сбой во время записи) пропускается.
+    """
+    drafts = {}
+    if not os.path.exists(path):
+        return drafts
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                record_id = entry.get("id")
+                if not record_id:
+                    continue
+                if entry.get("del"):
+                    drafts.pop(record_id, None)
+                else:
+                    drafts.setdefault(record_id, {}).update(entry.get("set", {}))
+    except Exception as e:
+        print(f"Ошибка при чтении черновиков {path}: {e}")
+    return drafts
+
+
+class DraftAutosaver:
+    """
+    Периодически дописывает в журнал только изменившиеся поля записей.
+    Пустые записи (без описания) в журнал не попадают.
+    Журнал открыт всё время работы; fsync делается не чаще раза в
+    FSYNC_INTERVAL_SECONDS, чтобы не вызывать заметных задержек на диске.
+    """
+
+    def __init__(self, root, record_widgets, path):
+        self.root = root
+        self.record_widgets = record_widgets
+        self.path = path
+        self._written = load_drafts(path) # Что уже лежит в журнале: id -> поля
+        self._lines = len(self._written)
+        self._file = None
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self._after_id = None
+
+    def start(self):
+        self._schedule()
+
+    def _schedule(self):
+        self._after_id = self.root.after(AUTOSAVE_INTERVAL_MS, self._tick)
+
+    def _tick(self):
+        try:
+            self.save_changes()
+        except Exception as e:
+            print(f"Ошибка автосохранения черновиков: {e}")
+        self._schedule()
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def save_changes(self, force_fsync=False):
+        """Дописывает в журнал изменения с прошлого вызова."""
+        entries = []
+        alive_ids = set()
+        for rec in self.record_widgets:
+            try:
+                if not rec['frame'].winfo_exists():
+                    continue
+                fields = read_record_fields(rec)
+            except tk.TclError:
+                continue # Виджеты записи уже уничтожены
+            if not fields['description'].strip():
+                continue
+            record_id = rec['record_id']
+            alive_ids.add(record_id)
+            previous = self._written.get(record_id, {})
+            changed = {key: value for key, value in fields.items() if previous.get(key) != value}
+            if changed:
+                entries.append({"id": record_id, "set": changed})
+                self._written.setdefault(record_id, {}).update(changed)
+        for record_id in [rid for rid in self._written if rid not in alive_ids]:
+            entries.append({"id": record_id, "del": True})
+            del self._written[record_id]
+
+        if entries:
+            f = self._open()
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+            f.flush()
+            self._lines += len(entries)
+            self._dirty = True
+        if self._dirty and (force_fsync or time.monotonic() - self._last_fsync >= FSYNC_INTERVAL_SECONDS):
+            os.fsync(self._open().fileno())
+            self._last_fsync = time.monotonic()
+            self._dirty = False
+        if self._lines > COMPACT_AFTER_LINES:
+            self._compact()
+
+    def _compact(self):
+        """Переписывает журнал снимком текущего состояния."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record_id, fields in self._written.items():
+                f.write(json.dumps({"id": record_id, "set": fields}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._lines = len(self._written)
+
+    def reset(self):
+        """Очищает журнал (после успешного сохранения всех записей)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._written = {}
+        self._lines = 0
+        self._dirty = False
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        except OSError as e:
+            print(f"Не удалось очистить черновики {self.path}: {e}")
+
+    def close(self):
+        """Сохраняет последние изменения и закрывает журнал (при выходе из программы)."""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        try:
+            self.save_changes(force_fsync=True)
+        except Exception as e:
+            print(f"Ошибка автосохранения черновиков: {e}")
+        if self._file is not None:
+            self._file.close()
+            self._file = None
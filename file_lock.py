@@ -0,0 +1,167 @@
+# file_lock.py
+# Межпроцессная блокировка файлов журнала (TXT/XLSX) через lock-файлы
+
+import os
+import time
+import socket
+import json
+
+# Через сколько секунд чужая блокировка считается "зависшей", даже если
+# процесс-владелец не удалось проверить (например, он на другой машине)
+STALE_LOCK_SECONDS = 60
+# Сколько ждать освобождения блокировки, прежде чем сдаться
+DEFAULT_LOCK_TIMEOUT = 15
+# Интервал опроса lock-файла
+POLL_INTERVAL = 0.05
+
+
+class FileLockTimeout(Exception):
+    """Не удалось получить блокировку файла за отведённое время."""
+
+
+def pid_alive(pid):
+    """Проверяет, жив ли процесс с указанным pid на этой машине."""
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class FileLock:
+    """
+    Блокировка файла через соседний lock-файл (<путь>.lock).
+    Lock-файл создаётся атомарно (O_CREAT | O_EXCL), поэтому работает и между
+    окнами на одной машине, и между машинами на общей папке.
+    В lock-файл пишется владелец (хост, pid, время), чтобы распознавать
+    блокировки, оставшиеся от упавших процессов.
+
+    Использование:
+        with FileLock(path):
+            ... запись в path ...
+    """
+
+    def __init__(self, path, timeout=DEFAULT_LOCK_TIMEOUT, stale_after=STALE_LOCK_SECONDS):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self._fd = None
+
+    def _owner_info(self):
+        return json.dumps({
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "time": time.time(),
+        })
+
+    def _is_stale(self):
+        """Определяет, оставлена ли текущая блокировка упавшим процессом."""
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                owner = json.loads(f.read() or "{}")
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            owner = {}
+        try:
+            age = time.time() - os.path.getmtime(self.lock_path)
+        except OSError:
+            return False
+        # Владелец на этой же машине: проверяем процесс напрямую, возраст не важен
+        if owner.get("host") == socket.gethostname() and isinstance(owner.get("pid"), int):
+            return not pid_alive(owner["pid"])
+        return age > self.stale_after
+
+    def _read_lock(self, path):
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _remove_stale(self, judged):
+        """
+        Убирает зависшую блокировку с содержимым judged. Lock-файл сначала
+        переименовывается в уникальное имя и удаляется, только если содержимое
+        совпало: иначе между проверкой и удалением его пересоздал другой процесс,
+        и такая (свежая) блокировка возвращается на место. True - блокировка убрана.
+        """
+        taken_path = f"{self.lock_path}.{socket.gethostname()}.{os.getpid()}.{time.monotonic_ns()}"
+        try:
+            os.rename(self.lock_path, taken_path)
+        except OSError:
+            return False # Блокировку уже убрал или переименовал кто-то другой
+        if self._read_lock(taken_path) == judged:
+            os.remove(taken_path)
+            print(f"Удалена зависшая блокировка: {self.lock_path}") # Для отладки
+            return True
+        try:
+            if os.name == "nt":
+                os.rename(taken_path, self.lock_path) # На Windows не заменяет существующий файл
+            else:
+                os.link(taken_path, self.lock_path) # Не заменяет существующий файл
+                os.remove(taken_path)
+        except OSError:
+            # Место уже занято новой блокировкой - возвращать некуда
+            try:
+                os.remove(taken_path)
+            except OSError:
+                pass
+        return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                judged = self._read_lock(self.lock_path)
+                if judged is not None and self._is_stale() and self._remove_stale(judged):
+                    continue
+                if time.monotonic() >= deadline:
+                    raise FileLockTimeout(f"Файл занят другим экземпляром программы:\n{self.path}")
+                time.sleep(POLL_INTERVAL)
+                continue
+            os.write(fd, self._owner_info().encode("utf-8"))
+            self._fd = fd
+            return self
+
+    def refresh(self):
+        """Обновляет время lock-файла, чтобы долгая операция не была принята за зависшую."""
+        if self._fd is not None:
+            try:
+                os.utime(self.lock_path)
+            except OSError:
+                pass
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            os.close(self._fd)
+        finally:
+            self._fd = None
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
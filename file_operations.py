@@ -4,8 +4,11 @@
 import os
 import subprocess
 import platform
+import json
 import tkinter.messagebox as messagebox # Импортируем messagebox
 import state # Для доступа к путям настроек
+from file_lock import FileLock, FileLockTimeout # Блокировка файлов между экземплярами программы
+import data_processing # Разбор записей и итоги по дням
 
 # Импортируем openpyxl внутри функций, которые его используют, чтобы избежать импорта, если не используется
 # from openpyxl import load_workbook, Workbook
@@ -49,88 +52,391 @@ def open_excel():
     except Exception as e:
         messagebox.showerror("Ошибка", f"Не удалось открыть файл:\n{e}")
 
-def save_records_to_txt(record_widgets):
-    """Сохраняет записи в текстовый файл."""
-    path = state.settings["txt_path"].get().strip()
-    if not path:
-        messagebox.showwarning("Ошибка", "Не указан путь для TXT-файла.")
-        return False
 
+# === ФОРМАТ ЗАПИСЕЙ ===
+# Заголовок таблицы Excel (порядок колонок совпадает с порядком полей в TXT)
+EXCEL_HEADERS = ["Дата", "Время", "День недели", "Часть дня", "Вид задачи", "Задача", "Сложность"]
+
+def collect_records(record_widgets):
+    """Собирает значения полей из виджетов записей.
+       Возвращает список пар (record_id, запись), где запись - список из 7 строк.
+       Пустые записи пропускаются."""
+    records = []
+    for rec in record_widgets:
+        desc = rec['description_text'].get("1.0", "end-1c").strip()
+        if not desc:
+            continue
+        # День недели и часть дня пересчитываются с задержкой после ввода - досчитываем сейчас
+        rec['update_derived']()
+        # === ИЗМЕНЕНО: Убираем переносы строк из описания ===
+        desc_single_line = desc.replace('\n', ' ').replace('\r', ' ')
+        records.append((rec['record_id'], [
+            rec['date_var'].get(),
+            rec['time_var'].get(),
+            rec['weekday_var'].get(),
+            rec['part_of_day_var'].get(),
+            rec['task_type_var'].get(),
+            desc_single_line,
+            rec['difficulty_var'].get(),
+        ]))
+    return records
+
+def record_to_txt_line(record):
+    """Форматирует запись в строку TXT-файла (поля через табуляцию, без перевода строки)."""
+    return "\t".join(str(value) for value in record)
+
+def record_to_excel_row(record):
+    """Готовит запись для строки Excel: сложность сохраняется числом."""
+    row = list(record)
+    # === ИЗМЕНЕНО: Преобразуем сложность в число ===
     try:
-        # Проверка и создание директории
-        txt_dir = os.path.dirname(path)
-        if txt_dir and not os.path.exists(txt_dir):
-            try:
-                os.makedirs(txt_dir)
-            except Exception as e:
-                 messagebox.showwarning("Предупреждение", f"Не удалось создать директорию для TXT файла:\n{txt_dir}\nОшибка: {e}")
-                 return False # Не продолжаем сохранение, если не удалось создать директорию
-
-        with open(path, "a", encoding="utf-8") as f:
-            for rec in record_widgets:
-                desc = rec['description_text'].get("1.0", "end-1c").strip()
-                if not desc:
-                    continue
-                # === ИЗМЕНЕНО: Убираем переносы строк из описания ===
-                desc_single_line = desc.replace('\n', ' ').replace('\r', ' ')
-                line = f"{rec['date_var'].get()}\t{rec['time_var'].get()}\t{rec['weekday_var'].get()}\t" \
-                       f"{rec['part_of_day_var'].get()}\t{rec['task_type_var'].get()}\t{desc_single_line}\t{rec['difficulty_var'].get()}"
-                f.write(line + "\n")
-        return True
+        row[6] = int(row[6])
+    except ValueError:
+        # Если не удалось преобразовать, сохраняем как есть (строку)
+        pass
+    return row
+
+def ensure_parent_dir(path, kind):
+    """Создаёт директорию для файла, если её нет. Возвращает False при ошибке."""
+    file_dir = os.path.dirname(path)
+    if file_dir and not os.path.exists(file_dir):
+        try:
+            os.makedirs(file_dir)
+        except Exception as e:
+            messagebox.showwarning("Предупреждение", f"Не удалось создать директорию для {kind} файла:\n{file_dir}\nОшибка: {e}")
+            return False
+    return True
+
+# === ЗАПИСЬ В TXT ===
+def txt_payload(records):
+    """Байты, которые будут дописаны в TXT-файл для этих записей.
+       Переводы строк - как при записи в текстовом режиме на этой системе."""
+    text = "".join(record_to_txt_line(record) + os.linesep for record in records)
+    return text.encode("utf-8")
+
+def append_records_to_txt(path, records, before_write=None):
+    """Дописывает записи в TXT-файл под межпроцессной блокировкой.
+       Все строки пишутся одним вызовом write, чтобы параллельные сохранения не перемешивались.
+       before_write(размер_файла) вызывается под блокировкой непосредственно перед записью."""
+    if not records:
+        return
+    payload = txt_payload(records)
+    with FileLock(path):
+        with open(path, "ab") as f:
+            if before_write:
+                before_write(f.seek(0, os.SEEK_END))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+# === ЗАПИСЬ В EXCEL ===
+# Последнее известное этому экземпляру состояние книги:
+# путь -> {'mtime_ns', 'size', 'max_row', 'widths'}
+# Нужно, чтобы после чужого сохранения перечитывать только дописанные им строки.
+_excel_known_state = {}
+
+def _update_widths(widths, rows):
+    """Обновляет максимальную длину значений по колонкам."""
+    for row in rows:
+        for index, value in enumerate(row):
+            if value is None:
+                continue
+            length = len(str(value))
+            if index >= len(widths):
+                widths.extend([0] * (index + 1 - len(widths)))
+            if length > widths[index]:
+                widths[index] = length
+
+def _merge_known_widths(ws, path):
+    """Возвращает ширины колонок с учётом строк, которых этот экземпляр ещё не видел.
+       Если книга не менялась с нашего сохранения - ничего не перечитывается;
+       если другой экземпляр дописал строки - перечитываются только они;
+       иначе (первое сохранение, файл правили вручную) - вся таблица."""
+    known = _excel_known_state.get(path)
+    if known is not None:
+        try:
+            st = os.stat(path)
+            unchanged = st.st_mtime_ns == known['mtime_ns'] and st.st_size == known['size']
+        except OSError:
+            unchanged = False
+        if unchanged and ws.max_row == known['max_row']:
+            return list(known['widths'])
+        if ws.max_row >= known['max_row']:
+            widths = list(known['widths'])
+            foreign_rows = ws.iter_rows(min_row=known['max_row'] + 1, max_row=ws.max_row, values_only=True)
+            _update_widths(widths, foreign_rows)
+            if ws.max_row > known['max_row']:
+                print(f"Подхвачено строк из другого экземпляра: {ws.max_row - known['max_row']}") # Для отладки
+            return widths
+    widths = []
+    _update_widths(widths, ws.iter_rows(values_only=True))
+    return widths
+
+# === ЛИСТ "СВОДКА" ===
+# Лист с итогами по дням: строка 1 - маркер с числом строк листа журнала на момент
+# обновления сводки, строка 2 - заголовок, далее по строке на день.
+# По маркеру statistic проверяет, что сводка соответствует журналу.
+# Число строк не меняется при ручной правке ячеек, поэтому после каждого сохранения
+# рядом с книгой пишется отметка (<книга>.summary) с контрольными суммами листов
+# журнала и сводки: если книгу сохранила другая программа (Excel), суммы не совпадут.
+SUMMARY_SHEET_TITLE = "Сводка"
+SUMMARY_MARKER_LABEL = "Строк в журнале:"
+SUMMARY_STAMP_SUFFIX = ".summary"
+SUMMARY_HEADERS = ["Дата", "Записей", "Сумма сложностей"]
+SUMMARY_FIRST_TYPE_COL = len(SUMMARY_HEADERS) + 1 # С этой колонки - суммы сложности по видам задач
+
+def _summary_days(rows):
+    """Считает итоги по дням для строк журнала (значения первых 7 колонок)."""
+    days_data = {}
+    for row in rows:
+        record_date = data_processing.parse_record_date(row[0]) if row else None
+        if record_date is not None:
+            data_processing.add_to_day_stats(days_data, record_date, row[4], row[6])
+    return days_data
+
+def _summary_rows(days_data, log_rows):
+    """Строки листа "Сводка" для итогов по дням."""
+    task_types = sorted({task_type for day in days_data.values() for task_type in day['difficulty_by_type']})
+    yield [SUMMARY_MARKER_LABEL, log_rows]
+    yield SUMMARY_HEADERS + task_types
+    for record_date in sorted(days_data):
+        day = days_data[record_date]
+        yield [record_date.strftime("%d.%m.%Y"), day['count'], day['total_difficulty']] + \
+              [day['difficulty_by_type'].get(task_type) for task_type in task_types]
+
+def _summary_checksums(path):
+    import xlsx_reader # Читается только оглавление архива
+    return xlsx_reader.sheet_checksums(path, [0, SUMMARY_SHEET_TITLE])
+
+def write_summary_stamp(path):
+    """Запоминает контрольные суммы листов только что сохранённой книги (под блокировкой книги)."""
+    stamp_path = path + SUMMARY_STAMP_SUFFIX
+    try:
+        log_crc, summary_crc = _summary_checksums(path)
+        with open(stamp_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"log": log_crc, "summary": summary_crc}, f)
+        os.replace(stamp_path + ".tmp", stamp_path)
     except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось сохранить в TXT:\n{e}")
-        return False
+        # Без отметки сводке просто не доверяют - статистика читается по журналу
+        print(f"Не удалось записать отметку сводки {stamp_path}: {e}")
 
-def save_records_to_excel(record_widgets):
-    """Сохраняет записи в Excel файл."""
-    path = state.settings["excel_path"].get().strip()
-    if not path:
-        messagebox.showwarning("Ошибка", "Не указан путь для Excel-файла.")
+def summary_is_current(path):
+    """Книга не менялась после нашего последнего сохранения (сводке можно доверять)."""
+    try:
+        with open(path + SUMMARY_STAMP_SUFFIX, "r", encoding="utf-8") as f:
+            stamp = json.load(f)
+        log_crc, summary_crc = _summary_checksums(path)
+    except Exception:
         return False
+    return summary_crc is not None and stamp == {"log": log_crc, "summary": summary_crc}
 
-    try:
-        # Проверка и создание директории
-        xlsx_dir = os.path.dirname(path)
-        if xlsx_dir and not os.path.exists(xlsx_dir):
-            try:
-                os.makedirs(xlsx_dir)
-            except Exception as e:
-                 messagebox.showwarning("Предупреждение", f"Не удалось создать директорию для XLSX файла:\n{xlsx_dir}\nОшибка: {e}")
-                 return False # Не продолжаем сохранение, если не удалось создать директорию
-
-        from openpyxl import load_workbook, Workbook # Импортируем здесь
-        
-        headers = ["Дата", "Время", "День недели", "Часть дня", "Вид задачи", "Задача", "Сложность"]
+def _update_summary(wb, log_ws, new_rows, log_rows_before, trusted=True):
+    """
+    Обновляет лист "Сводка" после дописывания new_rows в журнал.
+    Если сводка соответствует журналу до дописывания, меняются только строки
+    затронутых дат; иначе (сводки нет, журнал правили вручную) она строится заново.
+    trusted=False - книгу меняли не мы (см. summary_is_current), сводка строится заново.
+    """
+    ws = wb[SUMMARY_SHEET_TITLE] if SUMMARY_SHEET_TITLE in wb.sheetnames else None
+    if not trusted or ws is None or ws.cell(1, 1).value != SUMMARY_MARKER_LABEL \
+            or ws.cell(1, 2).value != log_rows_before:
+        if ws is not None:
+            wb.remove(ws)
+        ws = wb.create_sheet(SUMMARY_SHEET_TITLE)
+        days_data = _summary_days(log_ws.iter_rows(values_only=True, max_col=len(EXCEL_HEADERS)))
+        for row in _summary_rows(days_data, log_ws.max_row):
+            ws.append(row)
+        return
+
+    # Сводка небольшая (строка на день), поэтому её индексы строятся целиком
+    type_cols = {}
+    for col_index in range(SUMMARY_FIRST_TYPE_COL, ws.max_column + 1):
+        header = ws.cell(2, col_index).value
+        if header is not None:
+            type_cols[header] = col_index
+    date_rows = {}
+    for row_index in range(3, ws.max_row + 1):
+        record_date = data_processing.parse_record_date(ws.cell(row_index, 1).value)
+        if record_date is not None:
+            date_rows[record_date] = row_index
+
+    for record_date, day in _summary_days(new_rows).items():
+        row_index = date_rows.get(record_date)
+        if row_index is None:
+            row_index = date_rows[record_date] = ws.max_row + 1
+            ws.cell(row_index, 1, record_date.strftime("%d.%m.%Y"))
+            ws.cell(row_index, 2, 0)
+            ws.cell(row_index, 3, 0)
+        ws.cell(row_index, 2).value = (ws.cell(row_index, 2).value or 0) + day['count']
+        ws.cell(row_index, 3).value = (ws.cell(row_index, 3).value or 0) + day['total_difficulty']
+        for task_type, difficulty in day['difficulty_by_type'].items():
+            col_index = type_cols.get(task_type)
+            if col_index is None:
+                col_index = type_cols[task_type] = max([SUMMARY_FIRST_TYPE_COL - 1] + list(type_cols.values())) + 1
+                ws.cell(2, col_index, task_type)
+            ws.cell(row_index, col_index).value = (ws.cell(row_index, col_index).value or 0) + difficulty
+    ws.cell(1, 2).value = log_ws.max_row
+
+def append_records_to_excel(path, records):
+    """Дописывает записи в Excel-файл под межпроцессной блокировкой.
+       Книга загружается уже под блокировкой, поэтому строки, сохранённые
+       другим экземпляром, не теряются."""
+    if not records:
+        return
+    from openpyxl import load_workbook, Workbook # Импортируем здесь
+    from openpyxl.utils import get_column_letter
+
+    with FileLock(path):
+        summary_trusted = summary_is_current(path)
         wb = load_workbook(path) if os.path.exists(path) else Workbook()
-        ws = wb.active
+        ws = wb.worksheets[0]
         if ws.max_row == 1 and ws.cell(1, 1).value is None:
-            ws.append(headers)
-        for rec in record_widgets:
-            desc = rec['description_text'].get("1.0", "end-1c").strip()
-            if not desc:
-                continue
-            # === ИЗМЕНЕНО: Преобразуем сложность в число ===
-            try:
-                difficulty_value = int(rec['difficulty_var'].get())
-            except ValueError:
-                # Если не удалось преобразовать, сохраняем как есть (строку)
-                difficulty_value = rec['difficulty_var'].get()
-            # === ИЗМЕНЕНО: Убираем переносы строк из описания ===
-            desc_single_line = desc.replace('\n', ' ').replace('\r', ' ')
-            ws.append([
-                rec['date_var'].get(),
-                rec['time_var'].get(),
-                rec['weekday_var'].get(),
-                rec['part_of_day_var'].get(),
-                rec['task_type_var'].get(),
-                desc_single_line,  # Используем обработанное описание
-                difficulty_value  # Используем числовое значение
-            ])
-        for col in ws.columns:
-            max_len = max((len(str(cell.value)) for cell in col), default=10)
-            ws.column_dimensions[col[0].column_letter].width = min(max_len + 2, 50)
-        wb.save(path)
-        return True
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось сохранить в Excel:\n{e}")
-        return False
+            # Заголовок пишем прямо в первую строку (append после ws.cell() добавил бы его второй строкой)
+            for col_index, header in enumerate(EXCEL_HEADERS, start=1):
+                ws.cell(1, col_index, header)
+        widths = _merge_known_widths(ws, path)
+        log_rows_before = ws.max_row
+        rows = [record_to_excel_row(record) for record in records]
+        for row in rows:
+            ws.append(row)
+        _update_summary(wb, ws, rows, log_rows_before, summary_trusted)
+        _update_widths(widths, rows)
+        for index, max_len in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(index)].width = min(max_len + 2, 50)
+        # Сохраняем во временный файл и подменяем книгу атомарно:
+        # при сбое на диске остаётся либо старая, либо новая книга целиком
+        tmp_path = path + ".tmp"
+        try:
+            wb.save(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        write_summary_stamp(path)
+        st = os.stat(path)
+        _excel_known_state[path] = {
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'max_row': ws.max_row,
+            'widths': widths,
+        }
+
+# === ПЕРЕСОЗДАНИЕ EXCEL ИЗ TXT ===
+# Ширины колонок для пересоздаваемой книги. В режиме write_only их нужно задать
+# до записи строк, поэтому они фиксированные, а не по содержимому.
+REBUILD_COLUMN_WIDTHS = [12, 8, 13, 15, 12, 50, 11]
+
+def rebuild_excel_from_txt(txt_path, xlsx_path, progress_callback=None):
+    """Пересоздаёт Excel-файл из TXT-журнала потоковой записью (openpyxl write_only).
+       Память не зависит от размера журнала (в памяти только итоги по дням для
+       листа "Сводка"). Книга пишется во временный файл и
+       подменяет старую атомарно; старая сохраняется рядом с расширением .bak.
+       progress_callback(прочитано_байт, всего_байт) вызывается по ходу чтения TXT.
+       Возвращает количество записанных строк."""
+    from openpyxl import Workbook # Импортируем здесь
+    from openpyxl.utils import get_column_letter
+
+    tmp_path = xlsx_path + ".tmp"
+    rows_written = 0
+    with FileLock(xlsx_path) as lock:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        for index, width in enumerate(REBUILD_COLUMN_WIDTHS, start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+        ws.append(EXCEL_HEADERS)
+
+        def on_progress(done_bytes, total_bytes):
+            lock.refresh()
+            if progress_callback:
+                progress_callback(done_bytes, total_bytes)
+
+        days_data = {}
+        try:
+            for record in data_processing.iter_txt_records(txt_path, on_progress):
+                row = record_to_excel_row(record)
+                ws.append(row)
+                rows_written += 1
+                record_date = data_processing.parse_record_date(row[0])
+                if record_date is not None:
+                    data_processing.add_to_day_stats(days_data, record_date, row[4], row[6])
+            summary_ws = wb.create_sheet(SUMMARY_SHEET_TITLE)
+            for summary_row in _summary_rows(days_data, rows_written + 1):
+                summary_ws.append(summary_row)
+            wb.save(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if os.path.exists(xlsx_path):
+            os.replace(xlsx_path, xlsx_path + ".bak")
+        os.replace(tmp_path, xlsx_path)
+        write_summary_stamp(xlsx_path)
+    _excel_known_state.pop(xlsx_path, None)
+    return rows_written
+
+# === ВНЕСЕНИЕ ПОПРАВОК В EXCEL ===
+# Сколько раз пробовать заново, если книгу сохранили, пока она переписывалась
+APPLY_CHANGES_ATTEMPTS = 3
+
+def apply_changes_to_excel(path, changes):
+    """Заменяет или удаляет строки журнала Excel по поправкам: changes - пары
+       (исходная запись, новая запись или None - удалить). Книга читается потоково
+       и переписывается в write_only: строки, которых нет в TXT, и ручные правки
+       остаются (оформление ячеек - нет). Строка ищется по содержимому исходной
+       записи; из одинаковых строк меняется первая.
+       Перезапись идёт без блокировки, под блокировкой - только подмена файла,
+       если книгу за это время не сохраняли (иначе - заново). Сохранению в этот
+       момент ждать почти не приходится. Возвращает количество изменённых строк."""
+    from openpyxl import Workbook # Импортируем здесь
+    from openpyxl.utils import get_column_letter
+    import xlsx_reader # Быстрое чтение листа без openpyxl
+
+    by_base = {}
+    for base, new in changes:
+        key = data_processing.record_hash(data_processing.normalize_record(base))
+        by_base.setdefault(key, []).append(new)
+
+    tmp_path = path + ".changes.tmp" # Не .tmp: тот занимают сохранения под блокировкой
+    for _ in range(APPLY_CHANGES_ATTEMPTS):
+        st = os.stat(path)
+        pending = {key: list(values) for key, values in by_base.items()}
+        applied = rows_written = 0
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        for index, width in enumerate(REBUILD_COLUMN_WIDTHS, start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+        days_data = {}
+        try:
+            for row in xlsx_reader.iter_rows(path):
+                replacements = pending.get(data_processing.record_hash(data_processing.normalize_record(row)))
+                if replacements:
+                    new = replacements.pop(0)
+                    applied += 1
+                    if new is None:
+                        continue
+                    row = record_to_excel_row(new) + row[len(new):] # Колонки правее журнала сохраняются
+                ws.append(row)
+                rows_written += 1
+                values = row + [None] * (len(EXCEL_HEADERS) - len(row))
+                record_date = data_processing.parse_record_date(values[0])
+                if record_date is not None:
+                    data_processing.add_to_day_stats(days_data, record_date, values[4], values[6])
+            summary_ws = wb.create_sheet(SUMMARY_SHEET_TITLE)
+            for summary_row in _summary_rows(days_data, rows_written):
+                summary_ws.append(summary_row)
+            wb.save(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with FileLock(path):
+            current = os.stat(path)
+            if (current.st_mtime_ns, current.st_size) == (st.st_mtime_ns, st.st_size):
+                os.replace(tmp_path, path)
+                write_summary_stamp(path)
+                _excel_known_state.pop(path, None)
+                return applied
+        os.remove(tmp_path)
+        print(f"Книгу сохранили во время внесения поправок, повтор: {path}") # Для отладки
+    raise FileLockTimeout(f"Книга постоянно меняется, поправки не внесены:\n{path}")
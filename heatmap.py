@@ -0,0 +1,168 @@
+# heatmap.py
+# Календарь нагрузки за год (тепловая карта по дням)
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import date, timedelta
+import statistic # Итоги по дням
+
+# Геометрия календаря
+CELL_SIZE = 13
+CELL_GAP = 3
+LEFT_MARGIN = 30
+TOP_MARGIN = 22
+
+# Цвета: пустой день и шкала от слабой нагрузки к сильной
+EMPTY_COLOR = "#ebedf0"
+LEVEL_COLORS = ["#c6e48b", "#7bc96f", "#239a3b", "#196127"]
+
+WEEKDAY_LABELS = ["пн", "", "ср", "", "пт", "", ""]
+MONTH_LABELS = ["янв", "фев", "мар", "апр", "май", "июн", "июл", "авг", "сен", "окт", "ноя", "дек"]
+
+ALL_TYPES = "Все виды"
+METRIC_DIFFICULTY = "difficulty"
+METRIC_COUNT = "count"
+
+
+def day_value(day_stats, metric, task_type):
+    """Значение дня для раскраски. По виду задачи в итогах есть только сумма сложности,
+       поэтому при выбранном виде всегда показывается она."""
+    if day_stats is None:
+        return 0
+    if task_type != ALL_TYPES:
+        return day_stats['difficulty_by_type'].get(task_type, 0)
+    if metric == METRIC_COUNT:
+        return day_stats['count']
+    return day_stats['total_difficulty']
+
+
+def color_for(value, max_value):
+    if value <= 0 or max_value <= 0:
+        return EMPTY_COLOR
+    level = min(int(value * len(LEVEL_COLORS) / max_value), len(LEVEL_COLORS) - 1)
+    return LEVEL_COLORS[level]
+
+
+class YearHeatmap:
+    """
+    Окно календаря. Прямоугольники дней рисуются на одном Canvas один раз на год;
+    смена показателя или вида задачи только перекрашивает их (itemconfig),
+    данные берутся из уже посчитанных итогов по дням.
+    """
+
+    def __init__(self, parent_window, days_data):
+        self.days_data = days_data
+        self.day_items = {} # id прямоугольника -> дата
+
+        self.window = tk.Toplevel(parent_window)
+        self.window.title("Календарь нагрузки")
+        self.window.resizable(False, False)
+        self.window.grab_set()
+        self.window.focus_set()
+
+        controls = tk.Frame(self.window)
+        controls.pack(fill="x", padx=10, pady=(10, 5))
+
+        years = sorted({day.year for day in days_data}, reverse=True) or [date.today().year]
+        self.year_var = tk.StringVar(value=str(years[0]))
+        tk.Label(controls, text="Год:").pack(side="left")
+        year_combo = ttk.Combobox(controls, textvariable=self.year_var, values=[str(year) for year in years],
+                                  width=6, state="readonly")
+        year_combo.pack(side="left", padx=(2, 10))
+        year_combo.bind("<<ComboboxSelected>>", lambda e: self.draw_year())
+
+        self.metric_var = tk.StringVar(value=METRIC_DIFFICULTY)
+        self.metric_buttons = [
+            tk.Radiobutton(controls, text="Сумма сложностей", variable=self.metric_var,
+                           value=METRIC_DIFFICULTY, command=self.recolor),
+            tk.Radiobutton(controls, text="Записей", variable=self.metric_var,
+                           value=METRIC_COUNT, command=self.recolor),
+        ]
+        for button in self.metric_buttons:
+            button.pack(side="left")
+
+        task_types = sorted({task_type for day in days_data.values() for task_type in day['difficulty_by_type']})
+        self.type_var = tk.StringVar(value=ALL_TYPES)
+        tk.Label(controls, text="Вид задачи:").pack(side="left", padx=(10, 2))
+        type_combo = ttk.Combobox(controls, textvariable=self.type_var, values=[ALL_TYPES] + task_types,
+                                  width=10, state="readonly")
+        type_combo.pack(side="left")
+        type_combo.bind("<<ComboboxSelected>>", lambda e: self.recolor())
+
+        width = LEFT_MARGIN + 54 * (CELL_SIZE + CELL_GAP) + 10
+        height = TOP_MARGIN + 7 * (CELL_SIZE + CELL_GAP) + 10
+        self.canvas = tk.Canvas(self.window, width=width, height=height, bg="white", highlightthickness=0)
+        self.canvas.pack(padx=10, pady=5)
+        self.canvas.bind("<Motion>", self.on_motion)
+        self.canvas.bind("<Leave>", lambda e: self.status_var.set(""))
+
+        self.status_var = tk.StringVar(value="")
+        tk.Label(self.window, textvariable=self.status_var, fg="gray").pack(anchor="w", padx=10, pady=(0, 10))
+
+        self.draw_year()
+
+    def draw_year(self):
+        """Рисует сетку дней выбранного года (колонка - неделя, строка - день недели)."""
+        self.canvas.delete("all")
+        self.day_items = {}
+        year = int(self.year_var.get())
+        first_day = date(year, 1, 1)
+        offset = first_day.weekday() # Пустые клетки до 1 января в первой неделе
+
+        for row, label in enumerate(WEEKDAY_LABELS):
+            if label:
+                y = TOP_MARGIN + row * (CELL_SIZE + CELL_GAP) + CELL_SIZE // 2
+                self.canvas.create_text(LEFT_MARGIN - 6, y, text=label, anchor="e", font=("Arial", 7), fill="gray")
+
+        current = first_day
+        while current.year == year:
+            index = (current - first_day).days + offset
+            week, weekday = divmod(index, 7)
+            x = LEFT_MARGIN + week * (CELL_SIZE + CELL_GAP)
+            y = TOP_MARGIN + weekday * (CELL_SIZE + CELL_GAP)
+            if current.day == 1:
+                self.canvas.create_text(x, TOP_MARGIN - 8, text=MONTH_LABELS[current.month - 1],
+                                        anchor="w", font=("Arial", 7), fill="gray")
+            item = self.canvas.create_rectangle(x, y, x + CELL_SIZE, y + CELL_SIZE, outline="", fill=EMPTY_COLOR)
+            self.day_items[item] = current
+            current += timedelta(days=1)
+        self.recolor()
+
+    def recolor(self):
+        """Перекрашивает дни по выбранному показателю и виду задачи."""
+        task_type = self.type_var.get()
+        # По отдельному виду задачи доступна только сумма сложности
+        by_type = task_type != ALL_TYPES
+        for button in self.metric_buttons:
+            button.config(state="disabled" if by_type else "normal")
+        metric = self.metric_var.get()
+        values = {item: day_value(self.days_data.get(day), metric, task_type) for item, day in self.day_items.items()}
+        max_value = max(values.values(), default=0)
+        for item, value in values.items():
+            self.canvas.itemconfig(item, fill=color_for(value, max_value))
+
+    def on_motion(self, event):
+        item = self.canvas.find_withtag("current")
+        day = self.day_items.get(item[0]) if item else None
+        if day is None:
+            self.status_var.set("")
+            return
+        day_stats = self.days_data.get(day)
+        if day_stats is None:
+            self.status_var.set(f"{day.strftime('%d.%m.%Y')}: нет записей")
+            return
+        types = ", ".join(f"{task_type}: {value}" for task_type, value in sorted(day_stats['difficulty_by_type'].items()))
+        self.status_var.set(f"{day.strftime('%d.%m.%Y')}: записей {day_stats['count']}, "
+                            f"сумма сложностей {day_stats['total_difficulty']} ({types})")
+
+
+def show_heatmap(parent_window, days_data=None):
+    """Открывает календарь нагрузки. days_data - уже посчитанные итоги по дням
+       (если не переданы, читаются через statistic.get_task_statistics)."""
+    if days_data is None:
+        stats_result = statistic.get_task_statistics()
+        if stats_result['error']:
+            messagebox.showwarning("Ошибка", stats_result['error'], parent=parent_window)
+            return None
+        days_data = stats_result['days_data']
+    return YearHeatmap(parent_window, days_data)
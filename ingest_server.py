@@ -0,0 +1,267 @@
+# ingest_server.py
+# Приём записей от других программ по HTTP (только localhost) с пакетной записью в файлы
+
+import sys
+import json
+import uuid
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import data_processing
+import save_journal
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Накопленные записи сохраняются не реже этого интервала...
+FLUSH_INTERVAL_SECONDS = 2.0
+# ...или сразу, когда их набралось столько
+FLUSH_MAX_RECORDS = 5000
+# Самый большой принимаемый запрос
+MAX_BODY_BYTES = 16 * 1024 * 1024
+# Допустимые имена в заголовке Host (защита от DNS rebinding: чужое имя, указывающее на 127.0.0.1)
+ALLOWED_HOSTS = ("127.0.0.1", "localhost")
+
+
+def parse_payload(payload):
+    """
+    Разбирает тело запроса: одна запись {...}, список [{...}, ...] или {"records": [...]}.
+    Поля записи: date (дд.мм.гггг), time (ЧЧ:ММ), task_type, difficulty, description.
+    Возвращает (записи, ошибки) - ошибки в виде списка {"index", "error"}.
+    """
+    if isinstance(payload, dict) and isinstance(payload.get("records"), list):
+        items = payload["records"]
+    elif isinstance(payload, list):
+        items = payload
+    else:
+        items = [payload]
+    records, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "Запись должна быть объектом JSON"})
+            continue
+        try:
+            records.append(data_processing.build_record(
+                item.get("date"), item.get("time"), item.get("task_type", item.get("type")),
+                item.get("difficulty"), item.get("description", "")))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    return records, errors
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "PhotodayIngest/1.0"
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _is_local_request(self):
+        """
+        Запрос от программы на этом компьютере, а не от веб-страницы в браузере:
+        Host - localhost/127.0.0.1, заголовка Origin нет (его ставит браузер).
+        Иначе отвечает 403 и возвращает False.
+        """
+        host = (self.headers.get("Host") or "").strip().lower()
+        if host.startswith("["):
+            hostname = host # IPv6 не разрешён
+        else:
+            hostname = host.rsplit(":", 1)[0] if ":" in host else host
+        if hostname not in ALLOWED_HOSTS or self.headers.get("Origin") is not None:
+            self._reply(403, {"error": "Запросы принимаются только от программ на этом компьютере"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._is_local_request():
+            return
+        if self.path.rstrip("/") in ("", "/health"):
+            self._reply(200, {"status": "ok", "buffered": self.server.ingest.buffered()})
+        else:
+            self._reply(404, {"error": "Не найдено"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("", "/records"):
+            self._reply(404, {"error": "Не найдено"})
+            return
+        if not self._is_local_request():
+            return
+        # Только application/json: страница в браузере не может отправить его без
+        # предварительного CORS-запроса, на который сервер не отвечает
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._reply(415, {"error": "Нужен Content-Type: application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._reply(411 if length <= 0 else 413, {"error": "Нужен Content-Length до 16 МБ"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+        except (ValueError, UnicodeDecodeError) as e:
+            self._reply(400, {"error": f"Некорректный JSON: {e}"})
+            return
+        records, errors = parse_payload(payload)
+        if errors:
+            # Пакет принимается целиком или не принимается совсем - чтобы повтор не создавал дублей
+            self._reply(400, {"accepted": 0, "errors": errors})
+            return
+        if not self.server.ingest.submit(records):
+            self._reply(503, {"accepted": 0, "error": "Приём записей остановлен"})
+            return
+        self._reply(202, {"accepted": len(records)})
+
+    def log_message(self, format, *args):
+        pass # Не пишем в консоль каждый запрос
+
+
+class IngestServer:
+    """
+    HTTP-сервер на localhost: принятые записи копятся в памяти и сохраняются
+    пачками через save_journal.save_records (одна дозапись TXT и одно сохранение XLSX
+    на пачку) по таймеру или при накоплении FLUSH_MAX_RECORDS записей.
+    Пути к файлам передаются значениями (update_paths), а не переменными Tk,
+    потому что сохранение идёт из фонового потока.
+    """
+
+    def __init__(self, txt_path, xlsx_path, wal_path, port=DEFAULT_PORT, host=DEFAULT_HOST):
+        self.txt_path = txt_path
+        self.xlsx_path = xlsx_path
+        self.wal_path = wal_path
+        self.port = port
+        self.host = host
+        self.saved_count = 0 # Сколько записей сохранено (окно по нему понимает, что пора обновиться)
+        self.last_error = None # Последняя ошибка сохранения (None - сохранение прошло)
+        # Пары (record_id, запись): id выдаётся один раз при приёме, поэтому повтор после
+        # ошибки (например, книга открыта в Excel) журнал сохранений узнаёт и не дублирует строки
+        self._buffer = []
+        self._accepting = False # Меняется под _lock: после остановки submit ничего не берёт
+        self._lock = threading.Lock()
+        self._flush_needed = threading.Event()
+        self._stopping = threading.Event()
+        self._httpd = None
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._httpd is not None
+
+    def update_paths(self, txt_path, xlsx_path):
+        with self._lock:
+            self.txt_path, self.xlsx_path = txt_path, xlsx_path
+
+    def buffered(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def submit(self, records):
+        """Ставит записи в очередь на сохранение. False - сервер остановлен, записи не приняты."""
+        with self._lock:
+            if not self._accepting:
+                return False
+            batch_id = uuid.uuid4().hex
+            self._buffer.extend((f"{batch_id}-{index}", record) for index, record in enumerate(records))
+            if len(self._buffer) >= FLUSH_MAX_RECORDS:
+                self._flush_needed.set()
+        return True
+
+    def flush(self):
+        """Сохраняет всё накопленное одной пачкой. При ошибке записи возвращаются
+           в буфер с теми же id (ошибка - в last_error)."""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            txt_path, xlsx_path = self.txt_path, self.xlsx_path
+        if not records:
+            return 0
+        try:
+            save_journal.save_records(records, txt_path, xlsx_path, self.wal_path)
+        except Exception as e:
+            print(f"Ошибка сохранения принятых записей ({len(records)}): {e}")
+            self.last_error = e
+            with self._lock:
+                self._buffer[:0] = records
+            return 0
+        self.last_error = None
+        self.saved_count += len(records)
+        print(f"Сохранено принятых по HTTP записей: {len(records)}") # Для отладки
+        return len(records)
+
+    def _flush_loop(self):
+        while not self._stopping.is_set():
+            self._flush_needed.wait(FLUSH_INTERVAL_SECONDS)
+            self._flush_needed.clear()
+            self.flush()
+
+    def start(self):
+        """Запускает сервер. OSError, если порт занят."""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.ingest = self
+        self._stopping.clear()
+        with self._lock:
+            self._accepting = True
+        self._threads = [
+            threading.Thread(target=self._httpd.serve_forever, name="ingest-http", daemon=True),
+            threading.Thread(target=self._flush_loop, name="ingest-flush", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"Приём записей: http://{self.host}:{self.port}/records") # Для отладки
+
+    def stop(self):
+        """
+        Останавливает приём и сохраняет то, что осталось в буфере.
+        Сначала закрывается приём в submit: запрос, который уже обрабатывается,
+        либо попал в буфер до этого (и будет сохранён ниже), либо получит ответ 503.
+        Возвращает число записей, которые сохранить не удалось (они остаются в буфере:
+        повторный stop() или start() попробует снова; ошибка - в last_error).
+        """
+        if self._httpd is not None:
+            with self._lock:
+                self._accepting = False
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+            self._stopping.set()
+            self._flush_needed.set()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+        self.flush()
+        return self.buffered()
+
+
+def main(argv=None):
+    """Сервер без окна: python ingest_server.py [--port 8765]"""
+    import settings
+    plain_settings = settings.read_plain_settings()
+    parser = argparse.ArgumentParser(description="Приём записей по HTTP на localhost")
+    parser.add_argument("--port", type=int, default=plain_settings["ingest_port"], help="порт")
+    args = parser.parse_args(argv)
+
+    server = IngestServer(
+        plain_settings["txt_path"] if plain_settings["save_txt"] else None,
+        plain_settings["excel_path"] if plain_settings["save_excel"] else None,
+        settings.get_app_file_path(save_journal.WAL_FILENAME), args.port)
+    save_journal.recover_incomplete_saves(server.wal_path)
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("Остановка...")
+    unsaved = server.stop()
+    if unsaved:
+        print(f"Не сохранено записей: {unsaved} ({server.last_error})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
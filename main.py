@@ -9,6 +9,7 @@ import platform
 # === НОВЫЙ ИМПОРТ ===
 import configparser
 import sys  # Для определения пути к .exe
+import multiprocessing # Защита от запуска окна в дочерних процессах
 # === НОВЫЕ ИМПОРТЫ ===
 import state # Для доступа к глобальным настройкам
 import settings # Для загрузки/сохранения настроек
@@ -16,177 +17,338 @@ import data_processing # Для функций обработки данных
 import ui_components # Для компонентов UI
 import file_operations # Для операций с файлами
 import statistic # === НОВЫЙ ИМПОРТ ДЛЯ СТАТИСТИКИ ===
+import drafts # Автосохранение черновиков
+import save_journal # Двухфазное сохранение в TXT/XLSX
+import reconcile # Сверка TXT и XLSX
+import stall_watchdog # Диагностика зависаний окна
+import bulk_import # Импорт записей из CSV/ICS
+import amendments # Правка и удаление старых записей
+import ingest_server # Приём записей по HTTP
 # === /НОВЫЕ ИМПОРТЫ ===
 # from openpyxl import load_workbook, Workbook
 # from openpyxl.styles import Alignment
 
-# === ОСНОВНОЕ ОКНО ПРИЛОЖЕНИЯ ===
-root = tk.Tk()
-root.title("Журнал рабочих задач")
-# 2. Изменён размер окна по умолчанию на 800x500
-root.geometry("800x500")  # Увеличил высоту для отображения последних задач
-root.resizable(True, True)
-
-# === ЗАГРУЗКА НАСТРОЕК ===
-# Инициализируем и загружаем настройки
-settings.load_settings_from_ini(root) # Передаем root для создания Tkinter переменных
-
-# === ФРЕЙМ ДЛЯ ЗАПИСЕЙ С ПРОКРУТКОЙ ===
-records_frame = tk.Frame(root)
-records_frame.pack(pady=5, padx=10, fill="both", expand=True)
-canvas = tk.Canvas(records_frame)
-scrollbar = ttk.Scrollbar(records_frame, orient="vertical", command=canvas.yview)
-scrollable_frame = tk.Frame(canvas)
-scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-canvas.configure(yscrollcommand=scrollbar.set)
-canvas.pack(side="left", fill="both", expand=True)
-scrollbar.pack(side="right", fill="y")
-
-# === СПИСОК ВИДЖЕТОВ ЗАПИСЕЙ ===
-record_widgets = []
-
-# === ФУНКЦИЯ: СОЗДАНИЕ НОВОЙ ЗАПИСИ (обертка для ui_components.create_record) ===
-def create_record_wrapper(parent, default_date=None, default_time=None):
-    """Обертка для создания записи, чтобы передать record_widgets."""
-    rec_dict = ui_components.create_record(parent, record_widgets, default_date, default_time)
-    # Установка фокуса на поле описания после создания записи
-    # Делаем это здесь, так как у нас есть доступ к root
-    root.after_idle(lambda: rec_dict['description_text'].focus_set())
-    return rec_dict
-
-# === КНОПКА: ОТКРЫТЬ НАСТРОЙКИ ===
-def open_settings():
-    settings_window = tk.Toplevel(root)
-    settings_window.title("Настройки")
-    # settings_window.geometry("550x230")
-    settings_window.resizable(False, False)
-    settings_window.grab_set()
-    settings_window.focus_set()
-
-    # Создаем основной фрейм для всех элементов настроек
-    settings_frame = tk.Frame(settings_window)
-    settings_frame.pack(padx=20, pady=10) # Отступы вокруг всего содержимого
-
-    tk.Label(settings_frame, text="Формат сохранения:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(0, 5))
-    tk.Checkbutton(settings_frame, text="Текстовый файл (.txt)", variable=state.settings["save_txt"]).pack(anchor="w", padx=20)
-    tk.Label(settings_frame, text="Путь к TXT:").pack(anchor="w", padx=40)
-    # Фрейм для поля ввода пути и кнопки выбора файла
-    txt_path_frame = tk.Frame(settings_frame)
-    txt_path_frame.pack(anchor="w", fill="x", padx=40, pady=2)
-    tk.Entry(txt_path_frame, textvariable=state.settings["txt_path"], width=55).pack(side="left", fill="x", expand=True)
-    tk.Button(
-        txt_path_frame, text="...", command=lambda: state.settings["txt_path"].set(
-            filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
-            or state.settings["txt_path"].get())
-    ).pack(side="right", padx=(5, 0))
-
-    tk.Checkbutton(settings_frame, text="Таблица Excel (.xlsx)", variable=state.settings["save_excel"]).pack(anchor="w", padx=20, pady=(10, 0))
-    tk.Label(settings_frame, text="Путь к XLSX:").pack(anchor="w", padx=40)
-    # Фрейм для поля ввода пути и кнопки выбора файла
-    xlsx_path_frame = tk.Frame(settings_frame)
-    xlsx_path_frame.pack(anchor="w", fill="x", padx=40, pady=2)
-    tk.Entry(xlsx_path_frame, textvariable=state.settings["excel_path"], width=55).pack(side="left", fill="x", expand=True)
-    tk.Button(
-        xlsx_path_frame, text="...", command=lambda: state.settings["excel_path"].set(
-            filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")])
-            or state.settings["excel_path"].get())
-    ).pack(side="right", padx=(5, 0))
-
-    # === НОВАЯ НАСТРОЙКА: КОЛИЧЕСТВО ПОСЛЕДНИХ ЗАДАЧ ===
-    tk.Label(settings_frame, text="Количество последних задач:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(15, 5))
-    # Создаем фрейм для Spinbox и метки
-    count_frame = tk.Frame(settings_frame)
-    count_frame.pack(anchor="w", padx=40, pady=2)
-    tk.Label(count_frame, text="Количество (1-50):").pack(side="left")  # Изменено на 50
-    # Используем Spinbox для ограничения ввода чисел в диапазоне 1-50
-    count_spinbox = tk.Spinbox(count_frame, from_=1, to=50, width=5)  # Изменено на 50
-    count_spinbox.pack(side="left", padx=(5, 0))
-    # Устанавливаем текущее значение в Spinbox
-    try:
-        current_count = state.settings["old_tasks_count"].get()
-        count_spinbox.delete(0, "end")
-        count_spinbox.insert(0, str(min(max(current_count, 1), 50)))  # Изменено на 50
-    except (tk.TclError, ValueError):
-        count_spinbox.delete(0, "end")
-        count_spinbox.insert(0, "5")
-
-    # === НОВАЯ НАСТРОЙКА: СТИЛЬ ВЫБОРА СЛОЖНОСТИ ===
-    tk.Label(settings_frame, text="Стиль выбора сложности:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(15, 5))
-    # Создаем фрейм для Radiobuttons
-    style_frame = tk.Frame(settings_frame)
-    style_frame.pack(anchor="w", padx=40, pady=2)
-    # Переменная для отслеживания выбранного стиля (загружаем из settings)
-    difficulty_style_var = tk.StringVar(value=state.settings["difficulty_style"].get())
-    tk.Radiobutton(style_frame, text="Выпадающий список", variable=difficulty_style_var, value="dropdown").pack(anchor="w")
-    tk.Radiobutton(style_frame, text="Кнопки", variable=difficulty_style_var, value="buttons").pack(anchor="w")
-    # === /НОВАЯ НАСТРОЙКА ===
-
-    def save_settings():
-        if not state.settings["save_txt"].get() and not state.settings["save_excel"].get():
-            messagebox.showwarning("Ошибка", "Выберите хотя бы один формат сохранения.")
+# Окно создаётся только при запуске main.py как программы: дочерние процессы
+# параллельного чтения журнала (parallel_scan, режим spawn в Windows) импортируют
+# этот модуль заново, и окно в них открываться не должно.
+if __name__ == "__main__":
+    multiprocessing.freeze_support() # Для собранного .exe (PyInstaller)
+
+    # === ОСНОВНОЕ ОКНО ПРИЛОЖЕНИЯ ===
+    root = tk.Tk()
+    root.title("Журнал рабочих задач")
+    # 2. Изменён размер окна по умолчанию на 800x500
+    root.geometry("800x500")  # Увеличил высоту для отображения последних задач
+    root.resizable(True, True)
+
+    # === ЗАГРУЗКА НАСТРОЕК ===
+    # Инициализируем и загружаем настройки
+    settings.load_settings_from_ini(root) # Передаем root для создания Tkinter переменных
+
+    # === ФРЕЙМ ДЛЯ ЗАПИСЕЙ С ПРОКРУТКОЙ ===
+    records_frame = tk.Frame(root)
+    records_frame.pack(pady=5, padx=10, fill="both", expand=True)
+    canvas = tk.Canvas(records_frame)
+    scrollbar = ttk.Scrollbar(records_frame, orient="vertical", command=canvas.yview)
+    scrollable_frame = tk.Frame(canvas)
+    scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+    canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
+    canvas.configure(yscrollcommand=scrollbar.set)
+    canvas.pack(side="left", fill="both", expand=True)
+    scrollbar.pack(side="right", fill="y")
+
+    # === СПИСОК ВИДЖЕТОВ ЗАПИСЕЙ ===
+    record_widgets = []
+
+    # === ФУНКЦИЯ: СОЗДАНИЕ НОВОЙ ЗАПИСИ (обертка для ui_components.create_record) ===
+    def create_record_wrapper(parent, default_date=None, default_time=None, **record_values):
+        """Обертка для создания записи, чтобы передать record_widgets."""
+        rec_dict = ui_components.create_record(parent, record_widgets, default_date, default_time, **record_values)
+        # Установка фокуса на поле описания после создания записи
+        # Делаем это здесь, так как у нас есть доступ к root
+        root.after_idle(lambda: rec_dict['description_text'].focus_set())
+        return rec_dict
+
+    # === КНОПКА: ОТКРЫТЬ НАСТРОЙКИ ===
+    def open_settings():
+        settings_window = tk.Toplevel(root)
+        settings_window.title("Настройки")
+        # settings_window.geometry("550x230")
+        settings_window.resizable(False, False)
+        settings_window.grab_set()
+        settings_window.focus_set()
+
+        # Создаем основной фрейм для всех элементов настроек
+        settings_frame = tk.Frame(settings_window)
+        settings_frame.pack(padx=20, pady=10) # Отступы вокруг всего содержимого
+
+        tk.Label(settings_frame, text="Формат сохранения:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(0, 5))
+        tk.Checkbutton(settings_frame, text="Текстовый файл (.txt)", variable=state.settings["save_txt"]).pack(anchor="w", padx=20)
+        tk.Label(settings_frame, text="Путь к TXT:").pack(anchor="w", padx=40)
+        # Фрейм для поля ввода пути и кнопки выбора файла
+        txt_path_frame = tk.Frame(settings_frame)
+        txt_path_frame.pack(anchor="w", fill="x", padx=40, pady=2)
+        tk.Entry(txt_path_frame, textvariable=state.settings["txt_path"], width=55).pack(side="left", fill="x", expand=True)
+        tk.Button(
+            txt_path_frame, text="...", command=lambda: state.settings["txt_path"].set(
+                filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+                or state.settings["txt_path"].get())
+        ).pack(side="right", padx=(5, 0))
+
+        tk.Checkbutton(settings_frame, text="Таблица Excel (.xlsx)", variable=state.settings["save_excel"]).pack(anchor="w", padx=20, pady=(10, 0))
+        tk.Label(settings_frame, text="Путь к XLSX:").pack(anchor="w", padx=40)
+        # Фрейм для поля ввода пути и кнопки выбора файла
+        xlsx_path_frame = tk.Frame(settings_frame)
+        xlsx_path_frame.pack(anchor="w", fill="x", padx=40, pady=2)
+        tk.Entry(xlsx_path_frame, textvariable=state.settings["excel_path"], width=55).pack(side="left", fill="x", expand=True)
+        tk.Button(
+            xlsx_path_frame, text="...", command=lambda: state.settings["excel_path"].set(
+                filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")])
+                or state.settings["excel_path"].get())
+        ).pack(side="right", padx=(5, 0))
+
+        # === НОВАЯ НАСТРОЙКА: КОЛИЧЕСТВО ПОСЛЕДНИХ ЗАДАЧ ===
+        tk.Label(settings_frame, text="Количество последних задач:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(15, 5))
+        # Создаем фрейм для Spinbox и метки
+        count_frame = tk.Frame(settings_frame)
+        count_frame.pack(anchor="w", padx=40, pady=2)
+        tk.Label(count_frame, text="Количество (1-50):").pack(side="left")  # Изменено на 50
+        # Используем Spinbox для ограничения ввода чисел в диапазоне 1-50
+        count_spinbox = tk.Spinbox(count_frame, from_=1, to=50, width=5)  # Изменено на 50
+        count_spinbox.pack(side="left", padx=(5, 0))
+        # Устанавливаем текущее значение в Spinbox
+        try:
+            current_count = state.settings["old_tasks_count"].get()
+            count_spinbox.delete(0, "end")
+            count_spinbox.insert(0, str(min(max(current_count, 1), 50)))  # Изменено на 50
+        except (tk.TclError, ValueError):
+            count_spinbox.delete(0, "end")
+            count_spinbox.insert(0, "5")
+
+        # === НОВАЯ НАСТРОЙКА: СТИЛЬ ВЫБОРА СЛОЖНОСТИ ===
+        tk.Label(settings_frame, text="Стиль выбора сложности:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(15, 5))
+        # Создаем фрейм для Radiobuttons
+        style_frame = tk.Frame(settings_frame)
+        style_frame.pack(anchor="w", padx=40, pady=2)
+        # Переменная для отслеживания выбранного стиля (загружаем из settings)
+        difficulty_style_var = tk.StringVar(value=state.settings["difficulty_style"].get())
+        tk.Radiobutton(style_frame, text="Выпадающий список", variable=difficulty_style_var, value="dropdown").pack(anchor="w")
+        tk.Radiobutton(style_frame, text="Кнопки", variable=difficulty_style_var, value="buttons").pack(anchor="w")
+        # === /НОВАЯ НАСТРОЙКА ===
+
+        # === ДИАГНОСТИКА ЗАВИСАНИЙ ===
+        tk.Label(settings_frame, text="Диагностика:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(15, 5))
+        watchdog_var = tk.BooleanVar(value=state.settings["watchdog_enabled"].get())
+        tk.Checkbutton(settings_frame, text=f"Записывать зависания окна в {stall_watchdog.LOG_FILENAME}",
+                       variable=watchdog_var).pack(anchor="w", padx=40)
+
+        # === ПРИЁМ ЗАПИСЕЙ ПО HTTP ===
+        tk.Label(settings_frame, text="Приём записей от других программ:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(15, 5))
+        ingest_frame = tk.Frame(settings_frame)
+        ingest_frame.pack(anchor="w", padx=40, pady=2)
+        ingest_var = tk.BooleanVar(value=state.settings["ingest_enabled"].get())
+        tk.Checkbutton(ingest_frame, text=f"Принимать JSON на http://{ingest_server.DEFAULT_HOST}:<порт>/records, порт:",
+                       variable=ingest_var).pack(side="left")
+        ingest_port_entry = tk.Entry(ingest_frame, width=6)
+        ingest_port_entry.insert(0, str(state.settings["ingest_port"].get()))
+        ingest_port_entry.pack(side="left", padx=(5, 0))
+
+        def save_settings():
+            if not state.settings["save_txt"].get() and not state.settings["save_excel"].get():
+                messagebox.showwarning("Ошибка", "Выберите хотя бы один формат сохранения.")
+                return
+            if state.settings["save_txt"].get() and not state.settings["txt_path"].get().strip():
+                messagebox.showwarning("Ошибка", "Укажите путь для TXT-файла.")
+                return
+            if state.settings["save_excel"].get() and not state.settings["excel_path"].get().strip():
+                messagebox.showwarning("Ошибка", "Укажите путь для Excel-файла.")
+                return
+            # Сохраняем значение количества задач из Spinbox
+            try:
+                count_value = int(count_spinbox.get())
+                # Убеждаемся, что значение в допустимых пределах
+                count_value = min(max(count_value, 1), 50)  # Изменено на 50
+                state.settings["old_tasks_count"].set(count_value)
+            except ValueError:
+                messagebox.showwarning("Ошибка", "Некорректное значение количества задач.")
+                return
+            # === НОВОЕ: Сохраняем стиль сложности ===
+            state.settings["difficulty_style"].set(difficulty_style_var.get())
+            # === /НОВОЕ ===
+            try:
+                ingest_port = int(ingest_port_entry.get())
+                if not 1024 <= ingest_port <= 65535:
+                    raise ValueError
+            except ValueError:
+                messagebox.showwarning("Ошибка", "Порт приёма записей - число от 1024 до 65535.")
+                return
+            state.settings["watchdog_enabled"].set(watchdog_var.get())
+            apply_watchdog_setting()
+            state.settings["ingest_enabled"].set(ingest_var.get())
+            state.settings["ingest_port"].set(ingest_port)
+            apply_ingest_setting()
+            settings_window.destroy()
+            # === НОВОЕ: СОХРАНЕНИЕ НАСТРОЕК ===
+            settings.save_settings_to_ini()
+            # === /НОВОЕ ===
+            # === НОВОЕ: ОБНОВЛЯЕМ ОТОБРАЖЕНИЕ ПОСЛЕДНИХ ЗАДАЧ ===
+            update_last_tasks_display()
+
+        # === НОВОЕ: ОБСЛУЖИВАНИЕ ФАЙЛОВ ===
+        tk.Label(settings_frame, text="Обслуживание файлов:", font=("Arial", 10, "bold")).pack(anchor="w", pady=(15, 5))
+        maintenance_frame = tk.Frame(settings_frame)
+        maintenance_frame.pack(anchor="w", padx=40, pady=2)
+        tk.Button(maintenance_frame, text="Пересоздать XLSX из TXT", command=lambda: rebuild_excel(settings_window)).pack(side="left")
+        tk.Button(maintenance_frame, text="Сверить TXT и XLSX", command=lambda: reconcile_files(settings_window)).pack(side="left", padx=(5, 0))
+        tk.Button(maintenance_frame, text="Импорт из CSV/ICS", command=lambda: import_records(settings_window)).pack(side="left", padx=(5, 0))
+        # === /НОВОЕ ===
+
+        # Фрейм для кнопки сохранить, чтобы она была прижата внизу
+        button_frame = tk.Frame(settings_frame)
+        button_frame.pack(fill="x", pady=(20, 0))
+        tk.Button(button_frame, text="Сохранить", command=save_settings, bg="#4CAF50", fg="white").pack(side="right")
+
+        # Обновляем геометрию окна после размещения всех виджетов
+        settings_window.update_idletasks() # Обновляем информацию о размерах виджетов
+        req_width = settings_frame.winfo_reqwidth()
+        req_height = settings_frame.winfo_reqheight()
+        # Добавляем отступы (20 слева + 20 справа, 10 сверху + 10 снизу)
+        window_width = req_width + 40
+        window_height = req_height + 20
+        settings_window.geometry(f"{window_width}x{window_height}")
+
+    # === ФУНКЦИЯ: ПЕРЕСОЗДАНИЕ EXCEL ИЗ TXT ===
+    def rebuild_excel(parent):
+        txt_path = state.settings["txt_path"].get().strip()
+        xlsx_path = state.settings["excel_path"].get().strip()
+        if not txt_path or not os.path.exists(txt_path):
+            messagebox.showwarning("Ошибка", f"TXT-файл не найден:\n{txt_path}", parent=parent)
             return
-        if state.settings["save_txt"].get() and not state.settings["txt_path"].get().strip():
-            messagebox.showwarning("Ошибка", "Укажите путь для TXT-файла.")
+        if not xlsx_path:
+            messagebox.showwarning("Ошибка", "Не указан путь для Excel-файла.", parent=parent)
             return
-        if state.settings["save_excel"].get() and not state.settings["excel_path"].get().strip():
-            messagebox.showwarning("Ошибка", "Укажите путь для Excel-файла.")
+        if not messagebox.askyesno("Пересоздание XLSX",
+                                   f"Таблица будет заново собрана из текстового файла.\n"
+                                   f"Текущая таблица сохранится как:\n{xlsx_path}.bak\n\nПродолжить?", parent=parent):
             return
-        # Сохраняем значение количества задач из Spinbox
+        progress = ui_components.ProgressDialog(parent, "Пересоздание XLSX", "Перенос записей из TXT в XLSX...")
         try:
-            count_value = int(count_spinbox.get())
-            # Убеждаемся, что значение в допустимых пределах
-            count_value = min(max(count_value, 1), 50)  # Изменено на 50
-            state.settings["old_tasks_count"].set(count_value)
-        except ValueError:
-            messagebox.showwarning("Ошибка", "Некорректное значение количества задач.")
+            rows_written = file_operations.rebuild_excel_from_txt(txt_path, xlsx_path, progress.update)
+        except Exception as e:
+            progress.close()
+            messagebox.showerror("Ошибка", f"Не удалось пересоздать Excel-файл:\n{e}", parent=parent)
             return
-        # === НОВОЕ: Сохраняем стиль сложности ===
-        state.settings["difficulty_style"].set(difficulty_style_var.get())
-        # === /НОВОЕ ===
-        settings_window.destroy()
-        # === НОВОЕ: СОХРАНЕНИЕ НАСТРОЕК ===
-        settings.save_settings_to_ini()
-        # === /НОВОЕ ===
-        # === НОВОЕ: ОБНОВЛЯЕМ ОТОБРАЖЕНИЕ ПОСЛЕДНИХ ЗАДАЧ ===
-        update_last_tasks_display()
+        progress.close()
+        messagebox.showinfo("Успех", f"Таблица пересоздана, записей: {rows_written}", parent=parent)
 
-    # Фрейм для кнопки сохранить, чтобы она была прижата внизу
-    button_frame = tk.Frame(settings_frame)
-    button_frame.pack(fill="x", pady=(20, 0))
-    tk.Button(button_frame, text="Сохранить", command=save_settings, bg="#4CAF50", fg="white").pack(side="right")
-
-    # Обновляем геометрию окна после размещения всех виджетов
-    settings_window.update_idletasks() # Обновляем информацию о размерах виджетов
-    req_width = settings_frame.winfo_reqwidth()
-    req_height = settings_frame.winfo_reqheight()
-    # Добавляем отступы (20 слева + 20 справа, 10 сверху + 10 снизу)
-    window_width = req_width + 40
-    window_height = req_height + 20
-    settings_window.geometry(f"{window_width}x{window_height}")
-
-# === КНОПКА: СОХРАНИТЬ ВСЁ (основная логика) ===
-def save_all():
-    if not state.settings["save_txt"].get() and not state.settings["save_excel"].get():
-        messagebox.showwarning("Ошибка", "В настройках не выбран ни один формат сохранения.")
-        return
-
-    saved = False
-    if state.settings["save_txt"].get():
-        if not file_operations.save_records_to_txt(record_widgets):
-            return # Ошибка уже показана в file_operations
-        saved = True
-
-    if state.settings["save_excel"].get():
-        if not file_operations.save_records_to_excel(record_widgets):
-            return # Ошибка уже показана в file_operations
-        saved = True
-
-    if saved:
-        messagebox.showinfo("Успех", "Данные сохранены!")
-        # Обновляем отображение последних задач
+    # === ФУНКЦИЯ: СВЕРКА TXT И EXCEL ===
+    def reconcile_files(parent):
+        txt_path = state.settings["txt_path"].get().strip()
+        xlsx_path = state.settings["excel_path"].get().strip()
+        if not txt_path or not xlsx_path:
+            messagebox.showwarning("Ошибка", "Укажите пути к TXT- и Excel-файлам.", parent=parent)
+            return
+        try:
+            result = reconcile.reconcile(txt_path, xlsx_path)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось сверить файлы:\n{e}", parent=parent)
+            return
+
+        report_window = tk.Toplevel(parent)
+        report_window.title("Сверка TXT и XLSX")
+        report_window.geometry("700x400")
+        report_window.grab_set()
+        report_text = tk.Text(report_window, wrap="none", font=("Arial", 9))
+        report_text.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+        report_text.insert("1.0", reconcile.format_report(result))
+        report_text.config(state="disabled")
+
+        def fix():
+            try:
+                added_txt, added_xlsx = reconcile.fix_missing(result, txt_path, xlsx_path)
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось дописать записи:\n{e}", parent=report_window)
+                return
+            messagebox.showinfo("Успех", f"Дописано в TXT: {added_txt}, в XLSX: {added_xlsx}", parent=report_window)
+            report_window.destroy()
+            update_last_tasks_display()
+
+        if result['missing_in_xlsx'] or result['missing_in_txt']:
+            tk.Button(report_window, text="Дописать недостающие", command=fix, bg="#4CAF50", fg="white").pack(side="right", padx=10, pady=(0, 10))
+
+    # === ФУНКЦИЯ: ИМПОРТ ЗАПИСЕЙ ИЗ CSV/ICS ===
+    def import_records(parent):
+        source_path = filedialog.askopenfilename(
+            parent=parent, title="Файл для импорта",
+            filetypes=[("CSV и календари", "*.csv *.ics"), ("CSV files", "*.csv"), ("Календарь ICS", "*.ics")])
+        if not source_path:
+            return
+        txt_path = state.settings["txt_path"].get().strip() if state.settings["save_txt"].get() else None
+        xlsx_path = state.settings["excel_path"].get().strip() if state.settings["save_excel"].get() else None
+        if not txt_path and not xlsx_path:
+            messagebox.showwarning("Ошибка", "В настройках не выбран ни один формат сохранения.", parent=parent)
+            return
+        progress = ui_components.ProgressDialog(parent, "Импорт", "Чтение файла и поиск повторов...")
+        try:
+            records, stats = bulk_import.prepare_import(source_path, txt_path, xlsx_path, progress_callback=progress.update)
+        except Exception as e:
+            progress.close()
+            messagebox.showerror("Ошибка", f"Не удалось прочитать файл:\n{e}", parent=parent)
+            return
+        progress.close()
+        if not records:
+            messagebox.showinfo("Импорт", bulk_import.format_stats(stats) + "\n\nНечего импортировать.", parent=parent)
+            return
+        if not messagebox.askyesno("Импорт", bulk_import.format_stats(stats) + "\n\nДобавить новые записи в журнал?", parent=parent):
+            return
+        for path, kind in ((txt_path, "TXT"), (xlsx_path, "Excel")):
+            if path and not file_operations.ensure_parent_dir(path, kind):
+                return
+        try:
+            bulk_import.write_import(records, txt_path, xlsx_path, wal_path)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось записать импортированные записи:\n{e}", parent=parent)
+            return
+        messagebox.showinfo("Успех", f"Импортировано записей: {len(records)}", parent=parent)
         update_last_tasks_display()
-        
+
+    # === КНОПКА: СОХРАНИТЬ ВСЁ (основная логика) ===
+    def save_all():
+        if not state.settings["save_txt"].get() and not state.settings["save_excel"].get():
+            messagebox.showwarning("Ошибка", "В настройках не выбран ни один формат сохранения.")
+            return
+
+        # Проверка путей и создание директорий
+        txt_path = None
+        if state.settings["save_txt"].get():
+            txt_path = state.settings["txt_path"].get().strip()
+            if not txt_path:
+                messagebox.showwarning("Ошибка", "Не указан путь для TXT-файла.")
+                return
+            if not file_operations.ensure_parent_dir(txt_path, "TXT"):
+                return # Не продолжаем сохранение, если не удалось создать директорию
+        xlsx_path = None
+        if state.settings["save_excel"].get():
+            xlsx_path = state.settings["excel_path"].get().strip()
+            if not xlsx_path:
+                messagebox.showwarning("Ошибка", "Не указан путь для Excel-файла.")
+                return
+            if not file_operations.ensure_parent_dir(xlsx_path, "XLSX"):
+                return
+
+        # === НОВОЕ: ДВУХФАЗНОЕ СОХРАНЕНИЕ С ЖУРНАЛОМ ===
+        # Если Excel не сохранится (например, файл открыт), TXT уже будет отмечен в журнале
+        # и повторное нажатие допишет записи только в Excel, без дублей в TXT
+        try:
+            save_journal.save_records(file_operations.collect_records(record_widgets), txt_path, xlsx_path, wal_path)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить записи:\n{e}\n\nПовторите сохранение - уже записанные данные не продублируются.")
+            return
+
+        # Сохранённые записи больше не черновики. Сразу после записи, до любых окон:
+        # журнал сохранений уже очищен, и черновик, восстановленный после сбоя, записался бы повторно
+        draft_autosaver.reset()
+
         # === НОВОЕ: УДАЛЕНИЕ ВСЕХ ЗАПИСЕЙ ПОСЛЕ СОХРАНЕНИЯ ===
         # Создаем копию списка, так как мы будем его модифицировать
         widgets_to_delete = record_widgets.copy()
@@ -197,61 +359,166 @@ def save_all():
         # === НОВОЕ: ДОБАВЛЕНИЕ НОВОЙ ПУСТОЙ ЗАПИСИ ===
         create_record_wrapper(scrollable_frame)
 
-# === ФУНКЦИЯ: ОБНОВЛЕНИЕ ОТОБРАЖЕНИЯ ПОСЛЕДНИХ ЗАДАЧ ===
-def update_last_tasks_display():
-    # Очищаем предыдущее содержимое
-    for widget in last_tasks_frame.winfo_children():
-        widget.destroy()
-    # Получаем количество строк для отображения (ограничиваем 50)
+        # Обновляем отображение последних задач
+        update_last_tasks_display()
+        messagebox.showinfo("Успех", "Данные сохранены!")
+
+    # === ФУНКЦИЯ: ОБНОВЛЕНИЕ ОТОБРАЖЕНИЯ ПОСЛЕДНИХ ЗАДАЧ ===
+    def update_last_tasks_display():
+        # Очищаем предыдущее содержимое
+        for widget in last_tasks_frame.winfo_children():
+            widget.destroy()
+        # Получаем количество строк для отображения (ограничиваем 50)
+        try:
+            # Убираем ограничение min() с 30, теперь используем значение напрямую с ограничением 50
+            num_lines = min(state.settings["old_tasks_count"].get(), 50)
+        except (tk.TclError, ValueError):
+            num_lines = settings.DEFAULT_OLD_TASKS_COUNT
+        # Читаем последние строки из текстового файла
+        txt_path = state.settings["txt_path"].get()
+        last_lines = amendments.read_last_lines(txt_path, num_lines)
+        # Создаем текстовое поле для отображения
+        if last_lines:
+            # Увеличиваем максимальную высоту текстового поля до 50
+            text_widget = tk.Text(last_tasks_frame, height=min(num_lines + 1, 50), width=80, font=("Arial", 9))
+            text_widget.pack(fill="both", expand=True, padx=5, pady=5)
+            # Добавляем заголовок
+            text_widget.insert("1.0", f"Последние {len(last_lines)} задач(и):\n")
+            text_widget.insert("2.0", "-" * 50 + "\n")
+            # Добавляем строки
+            for i, line in enumerate(last_lines, start=3):
+                text_widget.insert(f"{i}.0", line)
+            # Делаем текстовое поле только для чтения
+            text_widget.config(state="disabled")
+        else:
+            tk.Label(last_tasks_frame, text="Нет данных для отображения", fg="gray").pack(pady=10)
+
+    # === НИЖНИЙ ФРЕЙМ С КНОПКАМИ ===
+    bottom_frame = tk.Frame(root)
+    bottom_frame.pack(pady=5, padx=10, fill="x")
+
+    # === КНОПКИ В НИЖНЕМ ФРЕЙМЕ ===
+    # Передаем функции из других модулей
+    tk.Button(bottom_frame, text="📂 Открыть текст", command=file_operations.open_text, bg="#2196F3", fg="white").pack(side="left", padx=2)
+    tk.Button(bottom_frame, text="📊 Открыть таблицу", command=file_operations.open_excel, bg="#4CAF50", fg="white").pack(side="left", padx=2)
+    tk.Button(bottom_frame, text="⚙️ Настройки", command=open_settings, bg="#9C27B0", fg="white").pack(side="left", padx=2)
+    tk.Button(bottom_frame, text="➕ Добавить запись", command=lambda: create_record_wrapper(scrollable_frame), bg="#FF9800", fg="white").pack(side="left", padx=2)
+    tk.Button(bottom_frame, text="💾 Сохранить всё", command=save_all, bg="#009688", fg="white").pack(side="left", padx=2)
+    # === НОВАЯ КНОПКА СТАТИСТИКИ ===
+    # Передаем ссылку на главное окно (root) в функцию show_statistics
+    tk.Button(bottom_frame, text="📊 Статистика", command=lambda: statistic.show_statistics(root), bg="#FF5722", fg="white").pack(side="left", padx=2)
+    tk.Button(bottom_frame, text="✏️ Правка", command=lambda: amendments.show_edit_window(root, update_last_tasks_display), bg="#607D8B", fg="white").pack(side="left", padx=2)
+    # === /НОВАЯ КНОПКА СТАТИСТИКИ ===
+
+    # === ФРЕЙМ ДЛЯ ОТОБРАЖЕНИЯ ПОСЛЕДНИХ ЗАДАЧ ===
+    last_tasks_frame = tk.LabelFrame(root, text="Последние задачи", padx=5, pady=5)
+    last_tasks_frame.pack(pady=5, padx=10, fill="both", expand=True)
+
+    # === ДОВЕДЕНИЕ ПРЕРВАННЫХ СОХРАНЕНИЙ ===
+    wal_path = settings.get_app_file_path(save_journal.WAL_FILENAME)
     try:
-        # Убираем ограничение min() с 30, теперь используем значение напрямую с ограничением 50
-        num_lines = min(state.settings["old_tasks_count"].get(), 50)
-    except (tk.TclError, ValueError):
-        num_lines = settings.DEFAULT_OLD_TASKS_COUNT
-    # Читаем последние строки из текстового файла
-    txt_path = state.settings["txt_path"].get()
-    last_lines = data_processing.read_last_lines(txt_path, num_lines)
-    # Создаем текстовое поле для отображения
-    if last_lines:
-        # Увеличиваем максимальную высоту текстового поля до 50
-        text_widget = tk.Text(last_tasks_frame, height=min(num_lines + 1, 50), width=80, font=("Arial", 9))
-        text_widget.pack(fill="both", expand=True, padx=5, pady=5)
-        # Добавляем заголовок
-        text_widget.insert("1.0", f"Последние {len(last_lines)} задач(и):\n")
-        text_widget.insert("2.0", "-" * 50 + "\n")
-        # Добавляем строки
-        for i, line in enumerate(last_lines, start=3):
-            text_widget.insert(f"{i}.0", line)
-        # Делаем текстовое поле только для чтения
-        text_widget.config(state="disabled")
-    else:
-        tk.Label(last_tasks_frame, text="Нет данных для отображения", fg="gray").pack(pady=10)
-
-# === НИЖНИЙ ФРЕЙМ С КНОПКАМИ ===
-bottom_frame = tk.Frame(root)
-bottom_frame.pack(pady=5, padx=10, fill="x")
-
-# === КНОПКИ В НИЖНЕМ ФРЕЙМЕ ===
-# Передаем функции из других модулей
-tk.Button(bottom_frame, text="📂 Открыть текст", command=file_operations.open_text, bg="#2196F3", fg="white").pack(side="left", padx=2)
-tk.Button(bottom_frame, text="📊 Открыть таблицу", command=file_operations.open_excel, bg="#4CAF50", fg="white").pack(side="left", padx=2)
-tk.Button(bottom_frame, text="⚙️ Настройки", command=open_settings, bg="#9C27B0", fg="white").pack(side="left", padx=2)
-tk.Button(bottom_frame, text="➕ Добавить запись", command=lambda: create_record_wrapper(scrollable_frame), bg="#FF9800", fg="white").pack(side="left", padx=2)
-tk.Button(bottom_frame, text="💾 Сохранить всё", command=save_all, bg="#009688", fg="white").pack(side="left", padx=2)
-# === НОВАЯ КНОПКА СТАТИСТИКИ ===
-# Передаем ссылку на главное окно (root) в функцию show_statistics
-tk.Button(bottom_frame, text="📊 Статистика", command=lambda: statistic.show_statistics(root), bg="#FF5722", fg="white").pack(side="left", padx=2)
-# === /НОВАЯ КНОПКА СТАТИСТИКИ ===
-
-# === ФРЕЙМ ДЛЯ ОТОБРАЖЕНИЯ ПОСЛЕДНИХ ЗАДАЧ ===
-last_tasks_frame = tk.LabelFrame(root, text="Последние задачи", padx=5, pady=5)
-last_tasks_frame.pack(pady=5, padx=10, fill="both", expand=True)
-
-# === СОЗДАНИЕ ПЕРВОЙ ЗАПИСИ ПО УМОЛЧАНИЮ ===
-create_record_wrapper(scrollable_frame)
-
-# === ИНИЦИАЛИЗАЦИЯ ОТОБРАЖЕНИЯ ПОСЛЕДНИХ ЗАДАЧ ===
-update_last_tasks_display()
-
-# === ЗАПУСК ПРИЛОЖЕНИЯ ===
-root.mainloop()
+        recovered_ids = save_journal.recover_incomplete_saves(wal_path)
+    except Exception as e:
+        print(f"Ошибка восстановления прерванных сохранений: {e}")
+        recovered_ids = set()
+
+    # === ВНЕСЕНИЕ НАКОПИВШИХСЯ ПРАВОК В ФАЙЛЫ (В ФОНЕ) ===
+    amendments.compact_in_background(
+        state.settings["txt_path"].get().strip() if state.settings["save_txt"].get() else None,
+        state.settings["excel_path"].get().strip() if state.settings["save_excel"].get() else None)
+
+    # === ВОССТАНОВЛЕНИЕ ЧЕРНОВИКОВ / СОЗДАНИЕ ПЕРВОЙ ЗАПИСИ ПО УМОЛЧАНИЮ ===
+    drafts_path = settings.get_app_file_path(drafts.DRAFTS_FILENAME)
+    saved_drafts = drafts.load_drafts(drafts_path)
+    # Записи, которые уже попали в файлы, черновиками не восстанавливаем
+    for draft_id in recovered_ids:
+        saved_drafts.pop(draft_id, None)
+    for draft_id, draft in saved_drafts.items():
+        create_record_wrapper(
+            scrollable_frame,
+            default_date=draft.get('date'),
+            default_time=draft.get('time'),
+            default_task_type=draft.get('task_type'),
+            default_difficulty=draft.get('difficulty'),
+            default_description=draft.get('description'),
+            record_id=draft_id,
+        )
+    if not saved_drafts:
+        create_record_wrapper(scrollable_frame)
+
+    # === АВТОСОХРАНЕНИЕ ЧЕРНОВИКОВ ===
+    draft_autosaver = drafts.DraftAutosaver(root, record_widgets, drafts_path)
+    draft_autosaver.start()
+
+    # === ДИАГНОСТИКА ЗАВИСАНИЙ (ВКЛЮЧАЕТСЯ В НАСТРОЙКАХ) ===
+    watchdog = stall_watchdog.StallWatchdog(root, settings.get_app_file_path(stall_watchdog.LOG_FILENAME))
+
+    def apply_watchdog_setting():
+        if state.settings["watchdog_enabled"].get():
+            watchdog.start()
+        else:
+            watchdog.stop()
+
+    apply_watchdog_setting()
+
+    # === ПРИЁМ ЗАПИСЕЙ ПО HTTP (ВКЛЮЧАЕТСЯ В НАСТРОЙКАХ) ===
+    # Один объект на всё время работы: записи, которые не удалось сохранить,
+    # остаются в его буфере и после остановки или смены порта
+    ingest = ingest_server.IngestServer(None, None, wal_path, state.settings["ingest_port"].get())
+
+    def ingest_paths():
+        txt_path = state.settings["txt_path"].get().strip() if state.settings["save_txt"].get() else None
+        xlsx_path = state.settings["excel_path"].get().strip() if state.settings["save_excel"].get() else None
+        return txt_path, xlsx_path
+
+    def warn_ingest_unsaved(unsaved):
+        messagebox.showwarning("Приём записей", f"Не удалось сохранить записи, принятые по HTTP ({unsaved}):\n"
+                                                f"{ingest.last_error}\n\nСохранение повторится при закрытии программы.")
+
+    def apply_ingest_setting():
+        enabled = state.settings["ingest_enabled"].get()
+        port = state.settings["ingest_port"].get()
+        if ingest.running and (not enabled or ingest.port != port):
+            unsaved = ingest.stop()
+            if unsaved:
+                warn_ingest_unsaved(unsaved)
+        ingest.update_paths(*ingest_paths())
+        if enabled and not ingest.running:
+            ingest.port = port
+            try:
+                ingest.start()
+            except OSError as e:
+                messagebox.showwarning("Приём записей", f"Не удалось открыть порт {port}:\n{e}")
+
+    # Панель последних задач обновляется, когда сервер сохранил новые записи
+    ingest_saved_count = 0
+
+    def poll_ingest():
+        global ingest_saved_count
+        if ingest.saved_count != ingest_saved_count:
+            ingest_saved_count = ingest.saved_count
+            update_last_tasks_display()
+        root.after(2000, poll_ingest)
+
+    apply_ingest_setting()
+    poll_ingest()
+
+    def on_close():
+        unsaved = ingest.stop() # Сохраняет записи, которые ещё в буфере
+        if unsaved and not messagebox.askyesno(
+                "Приём записей",
+                f"Не удалось сохранить записи, принятые по HTTP ({unsaved}):\n{ingest.last_error}\n\n"
+                "Закрыть программу без них? (Нет - оставить окно открытым и повторить позже)"):
+            apply_ingest_setting() # Приём снова включается, если включён в настройках
+            return
+        watchdog.stop()
+        draft_autosaver.close()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    # === ИНИЦИАЛИЗАЦИЯ ОТОБРАЖЕНИЯ ПОСЛЕДНИХ ЗАДАЧ ===
+    update_last_tasks_display()
+
+    # === ЗАПУСК ПРИЛОЖЕНИЯ ===
+    root.mainloop()
@@ -0,0 +1,138 @@
+# parallel_scan.py
+# Параллельное чтение TXT-журнала кусками по ядрам процессора
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import data_processing
+
+# Файлы меньше этого размера читаются в одном процессе (запуск процессов дороже чтения)
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+# Кусок не меньше этого размера, чтобы на пересылку итогов не уходило больше, чем на разбор
+MIN_CHUNK_BYTES = 2 * 1024 * 1024
+
+
+def split_ranges(path, parts, size=None):
+    """Делит файл на parts диапазонов байт [начало, конец), границы - сразу после перевода строки."""
+    size = os.path.getsize(path) if size is None else size
+    bounds = [0]
+    with open(path, "rb") as f:
+        for index in range(1, parts):
+            approx = size * index // parts
+            if approx <= bounds[-1]:
+                continue
+            f.seek(approx - 1)
+            f.readline() # Дочитываем строку, в которую попала граница
+            position = min(f.tell(), size)
+            if position > bounds[-1]:
+                bounds.append(position)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_range_records(path, start, end, with_offsets=False):
+    """Записи TXT-файла из диапазона байт [start, end) (границы - начала строк)."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        while offset < end:
+            raw_line = f.readline()
+            if not raw_line:
+                break
+            line_offset = offset
+            offset += len(raw_line)
+            if offset > end:
+                break # Строка дописана после начала чтения
+            record = data_processing.parse_txt_line(raw_line.decode("utf-8", errors="replace"))
+            if record is not None:
+                yield (line_offset, record) if with_offsets else record
+
+
+def worker_count(size):
+    """Сколько процессов имеет смысл запустить для файла такого размера."""
+    if size < PARALLEL_MIN_BYTES:
+        return 1
+    return max(1, min(os.cpu_count() or 1, size // MIN_CHUNK_BYTES))
+
+
+def scan(path, chunk_function, merge_function, initial):
+    """
+    Считает итог по TXT-файлу: chunk_function(path, start, end) считает частичный
+    итог по куску (должна быть функцией уровня модуля, чтобы её можно было передать
+    в процесс), merge_function(итог, частичный_итог) объединяет итоги по порядку кусков.
+    Читается то, что было в файле на момент вызова. Для небольших файлов,
+    одного ядра или если процессы не запускаются - всё в текущем процессе.
+    """
+    size = os.path.getsize(path)
+    workers = worker_count(size)
+    ranges = split_ranges(path, workers, size) if workers > 1 else [(0, size)]
+    if len(ranges) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+                partials = list(pool.map(chunk_function, [path] * len(ranges),
+                                         [start for start, _ in ranges], [end for _, end in ranges]))
+        except (OSError, RuntimeError, ImportError) as e:
+            # Например, запрет на запуск процессов или сломанный пул - считаем по-старому
+            print(f"Параллельное чтение недоступно ({e}), читаем в одном процессе") # Для отладки
+            partials = [chunk_function(path, 0, size)]
+    else:
+        partials = [chunk_function(path, 0, size)]
+    result = initial
+    for partial in partials:
+        result = merge_function(result, partial)
+    return result
+
+
+# === ЧАСТИЧНЫЕ ИТОГИ ДЛЯ ТИПОВЫХ ПРОХОДОВ ===
+def day_stats_chunk(path, start, end):
+    """Статистика по дням (как get_task_statistics) для куска файла."""
+    days_data = {}
+    parsed_dates = {}
+    for record in iter_range_records(path, start, end):
+        record_date = parsed_dates.get(record[0])
+        if record_date is None:
+            record_date = parsed_dates[record[0]] = data_processing.parse_record_date(record[0])
+        if record_date is not None:
+            data_processing.add_to_day_stats(days_data, record_date, record[4], record[6])
+    return days_data
+
+
+def merge_day_stats(total, partial):
+    for record_date, day in partial.items():
+        target = total.get(record_date)
+        if target is None:
+            total[record_date] = day
+            continue
+        target['count'] += day['count']
+        target['total_difficulty'] += day['total_difficulty']
+        for task_type, difficulty in day['difficulty_by_type'].items():
+            target['difficulty_by_type'][task_type] = target['difficulty_by_type'].get(task_type, 0) + difficulty
+    return total
+
+
+def hash_counts_chunk(path, start, end):
+    """Количество записей по хэшу (для сверки и поиска повторов) для куска файла."""
+    counts = {}
+    for record in iter_range_records(path, start, end):
+        key = data_processing.record_hash(data_processing.normalize_record(record))
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def merge_counts(total, partial):
+    if not total:
+        return partial
+    for key, count in partial.items():
+        total[key] = total.get(key, 0) + count
+    return total
+
+
+def day_stats(path):
+    """Статистика по дням по всему TXT-файлу."""
+    return scan(path, day_stats_chunk, merge_day_stats, {})
+
+
+def hash_counts(path):
+    """{хэш записи: количество} по всему TXT-файлу."""
+    return scan(path, hash_counts_chunk, merge_counts, {})
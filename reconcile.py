@@ -0,0 +1,150 @@
+# reconcile.py
+# Сверка TXT- и XLSX-журналов по хэшам записей
+
+import os
+import sys
+import argparse
+
+import data_processing
+import file_operations
+import parallel_scan # Параллельный подсчёт хэшей TXT
+
+# Сколько примеров расхождений показывать в отчёте по каждой категории
+REPORT_EXAMPLES = 20
+
+
+def _count_hashes(records, counts, side):
+    """Считает хэши записей одного файла. side: 0 - TXT, 1 - XLSX."""
+    total = 0
+    for record in records:
+        key = data_processing.record_hash(data_processing.normalize_record(record))
+        entry = counts.get(key)
+        if entry is None:
+            entry = counts[key] = [0, 0]
+        entry[side] += 1
+        total += 1
+    return total
+
+
+def _collect_rows(records, wanted):
+    """Второй проход по файлу: достаёт записи для нужных хэшей (по одной на хэш)."""
+    found = {}
+    for record in records:
+        normalized = data_processing.normalize_record(record)
+        key = data_processing.record_hash(normalized)
+        if key in wanted and key not in found:
+            found[key] = list(normalized)
+            if len(found) == len(wanted):
+                break
+    return found
+
+
+def reconcile(txt_path, xlsx_path):
+    """
+    Сверяет записи TXT- и XLSX-файлов за один проход по каждому файлу.
+    Память пропорциональна числу различных записей (хранится только хэш и два счётчика).
+    Возвращает словарь:
+      'txt_rows', 'xlsx_rows'  - количество записей в файлах
+      'missing_in_xlsx'        - {хэш: сколько копий не хватает в XLSX}
+      'missing_in_txt'         - {хэш: сколько копий не хватает в TXT}
+      'duplicates_txt', 'duplicates_xlsx' - {хэш: сколько раз запись повторяется}
+      'rows'                   - {хэш: нормализованная запись} для всех хэшей из отчёта
+    """
+    counts = {}
+    txt_rows = 0
+    if os.path.exists(txt_path):
+        # TXT читается кусками во всех ядрах; XLSX - последовательно
+        for key, count in parallel_scan.hash_counts(txt_path).items():
+            counts[key] = [count, 0]
+            txt_rows += count
+    xlsx_rows = _count_hashes(data_processing.iter_excel_rows(xlsx_path), counts, 1) if os.path.exists(xlsx_path) else 0
+
+    result = {
+        'txt_rows': txt_rows,
+        'xlsx_rows': xlsx_rows,
+        'missing_in_xlsx': {},
+        'missing_in_txt': {},
+        'duplicates_txt': {},
+        'duplicates_xlsx': {},
+        'rows': {},
+    }
+    for key, (in_txt, in_xlsx) in counts.items():
+        if in_txt > in_xlsx:
+            result['missing_in_xlsx'][key] = in_txt - in_xlsx
+        elif in_xlsx > in_txt:
+            result['missing_in_txt'][key] = in_xlsx - in_txt
+        if in_txt > 1:
+            result['duplicates_txt'][key] = in_txt
+        if in_xlsx > 1:
+            result['duplicates_xlsx'][key] = in_xlsx
+    del counts
+
+    # Содержимое нужно только для расхождений: дочитываем его вторым проходом,
+    # и только по тем файлам, где эти записи есть
+    wanted_txt = set(result['missing_in_xlsx']) | set(result['duplicates_txt'])
+    wanted_xlsx = (set(result['missing_in_txt']) | set(result['duplicates_xlsx'])) - wanted_txt
+    if wanted_txt:
+        result['rows'].update(_collect_rows(data_processing.iter_txt_records(txt_path), wanted_txt))
+    if wanted_xlsx:
+        result['rows'].update(_collect_rows(data_processing.iter_excel_rows(xlsx_path), wanted_xlsx))
+    return result
+
+
+def fix_missing(result, txt_path, xlsx_path):
+    """Дописывает в каждый файл только недостающие в нём записи (одной пачкой на файл).
+       Возвращает (дописано_в_txt, дописано_в_xlsx)."""
+    to_xlsx = [result['rows'][key] for key, missing in result['missing_in_xlsx'].items() for _ in range(missing)]
+    to_txt = [result['rows'][key] for key, missing in result['missing_in_txt'].items() for _ in range(missing)]
+    if to_txt:
+        file_operations.append_records_to_txt(txt_path, to_txt)
+    if to_xlsx:
+        file_operations.append_records_to_excel(xlsx_path, to_xlsx)
+    return len(to_txt), len(to_xlsx)
+
+
+def format_report(result):
+    """Текст отчёта о сверке."""
+    lines = [
+        f"Записей в TXT: {result['txt_rows']}",
+        f"Записей в XLSX: {result['xlsx_rows']}",
+    ]
+    sections = [
+        ("Нет в XLSX (есть в TXT)", result['missing_in_xlsx'], "не хватает"),
+        ("Нет в TXT (есть в XLSX)", result['missing_in_txt'], "не хватает"),
+        ("Повторы в TXT", result['duplicates_txt'], "раз"),
+        ("Повторы в XLSX", result['duplicates_xlsx'], "раз"),
+    ]
+    for title, items, unit in sections:
+        total = sum(items.values()) if unit == "не хватает" else len(items)
+        lines.append("")
+        lines.append(f"{title}: {total}")
+        for key, count in list(items.items())[:REPORT_EXAMPLES]:
+            lines.append(f"  [{unit} {count}] " + " | ".join(result['rows'].get(key, ())))
+        if len(items) > REPORT_EXAMPLES:
+            lines.append(f"  ... и ещё {len(items) - REPORT_EXAMPLES}")
+    if not (result['missing_in_xlsx'] or result['missing_in_txt']):
+        lines.append("")
+        lines.append("Файлы содержат одинаковые записи.")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Запуск сверки из командной строки: python reconcile.py [--fix]"""
+    import settings
+    plain_settings = settings.read_plain_settings()
+    parser = argparse.ArgumentParser(description="Сверка TXT- и XLSX-журналов")
+    parser.add_argument("--txt", default=plain_settings["txt_path"], help="путь к TXT-файлу")
+    parser.add_argument("--xlsx", default=plain_settings["excel_path"], help="путь к XLSX-файлу")
+    parser.add_argument("--fix", action="store_true", help="дописать недостающие записи в отстающий файл")
+    args = parser.parse_args(argv)
+
+    result = reconcile(args.txt, args.xlsx)
+    print(format_report(result))
+    if args.fix:
+        added_txt, added_xlsx = fix_missing(result, args.txt, args.xlsx)
+        print(f"\nДописано в TXT: {added_txt}, в XLSX: {added_xlsx}")
+    return 1 if (result['missing_in_xlsx'] or result['missing_in_txt']) and not args.fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
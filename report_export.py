@@ -0,0 +1,382 @@
+# report_export.py
+# Потоковая выгрузка отчёта за период в CSV или HTML
+
+import os
+import sys
+import csv
+import html
+import argparse
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import datetime, date
+
+import state # Для доступа к пути TXT-файла из настроек
+import data_processing
+import file_operations
+import amendments # Правки и удаления записей
+import parallel_scan # Параллельное построение индекса для больших журналов
+
+# Сколько строк журнала в одном блоке индекса дат
+INDEX_BLOCK_LINES = 4096
+
+# Индексы блоков по файлам: путь -> _DateBlockIndex
+_indexes = {}
+
+
+class _DateBlockIndex:
+    """
+    Разреженный индекс TXT-журнала: для каждого блока из INDEX_BLOCK_LINES строк
+    хранятся смещения в файле и минимальная/максимальная дата в блоке.
+    Блоки, чей диапазон дат не пересекается с периодом отчёта, пропускаются
+    без чтения. Порядок записей в журнале при этом не важен.
+    Строится попутно при первом чтении и дополняется, когда журнал дописывается.
+    """
+
+    # Конец проиндексированной части, по которому видно, что файл подменили
+    # (перезапись через временный файл, например при внесении поправок, видна и по номеру inode)
+    CHECK_BYTES = 64
+
+    def __init__(self, path):
+        self.path = path
+        self.blocks = [] # [начало, конец, мин. дата, макс. дата]
+        self.indexed_to = 0
+        self.check = b""
+        self.inode = None
+
+    def _is_same_file(self, st):
+        if st.st_size < self.indexed_to or (self.inode is not None and st.st_ino != self.inode):
+            return False
+        if not self.check:
+            return True
+        with open(self.path, "rb") as f:
+            f.seek(self.indexed_to - len(self.check))
+            return f.read(len(self.check)) == self.check
+
+    def iter_records(self, date_from=None, date_to=None):
+        """Выдаёт (смещение строки, дата, запись) из журнала с датой в [date_from, date_to]."""
+        st = os.stat(self.path)
+        if not self._is_same_file(st):
+            self.__init__(self.path)
+        self.inode = st.st_ino
+        if not self.blocks and parallel_scan.worker_count(st.st_size) > 1:
+            self._build_parallel()
+        parsed_dates = {}
+
+        def record_date(record):
+            value = record[0]
+            if value not in parsed_dates:
+                parsed_dates[value] = data_processing.parse_record_date(value)
+            return parsed_dates[value]
+
+        with open(self.path, "rb") as f:
+            # 1. Уже проиндексированная часть: читаем только подходящие блоки
+            for start, end, min_date, max_date in self.blocks:
+                if min_date is None or (date_from and max_date < date_from) or (date_to and min_date > date_to):
+                    continue
+                f.seek(start)
+                offset = start
+                for raw_line in f.read(end - start).splitlines(keepends=True):
+                    line_offset = offset
+                    offset += len(raw_line)
+                    record = data_processing.parse_txt_line(raw_line.decode("utf-8", errors="replace"))
+                    if record is None:
+                        continue
+                    day = record_date(record)
+                    if day is not None and not (date_from and day < date_from) and not (date_to and day > date_to):
+                        yield line_offset, day, record
+
+            # 2. Новая часть файла: читаем целиком и попутно дополняем индекс
+            f.seek(self.indexed_to)
+            block_start = self.indexed_to
+            block_lines = 0
+            min_date = max_date = None
+            position = self.indexed_to
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    break # Неполная строка (запись ещё идёт)
+                line_offset = position
+                position += len(raw_line)
+                block_lines += 1
+                record = data_processing.parse_txt_line(raw_line.decode("utf-8", errors="replace"))
+                day = record_date(record) if record is not None else None
+                if day is not None:
+                    min_date = day if min_date is None or day < min_date else min_date
+                    max_date = day if max_date is None or day > max_date else max_date
+                    if not (date_from and day < date_from) and not (date_to and day > date_to):
+                        yield line_offset, day, record
+                if block_lines == INDEX_BLOCK_LINES:
+                    self._add_block(f, block_start, position, min_date, max_date)
+                    block_start, block_lines = position, 0
+                    min_date = max_date = None
+            # Хвост короче блока в индекс не добавляем - он будет перечитан в следующий раз
+
+    def _build_parallel(self):
+        """Первое построение индекса большого журнала - кусками во всех ядрах."""
+        self.blocks = parallel_scan.scan(self.path, _date_blocks_chunk, _merge_blocks, [])
+        if self.blocks:
+            end = self.blocks[-1][1]
+            self.indexed_to = end
+            with open(self.path, "rb") as f:
+                f.seek(max(0, end - self.CHECK_BYTES))
+                self.check = f.read(end - max(0, end - self.CHECK_BYTES))
+
+    def _add_block(self, f, start, end, min_date, max_date):
+        self.blocks.append([start, end, min_date, max_date])
+        self.indexed_to = end
+        current = f.tell()
+        f.seek(max(start, end - self.CHECK_BYTES))
+        self.check = f.read(end - max(start, end - self.CHECK_BYTES))
+        f.seek(current)
+
+
+def _date_blocks_chunk(path, start, end):
+    """Блоки индекса дат для куска файла [start, end) (для parallel_scan).
+       Неполная последняя строка файла в индекс не попадает."""
+    blocks = []
+    parsed_dates = {}
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = block_start = start
+        block_lines = 0
+        min_date = max_date = None
+        while position < end:
+            raw_line = f.readline()
+            if not raw_line.endswith(b"\n") or position + len(raw_line) > end:
+                break
+            position += len(raw_line)
+            block_lines += 1
+            record = data_processing.parse_txt_line(raw_line.decode("utf-8", errors="replace"))
+            if record is not None:
+                day = parsed_dates.get(record[0])
+                if day is None:
+                    day = parsed_dates[record[0]] = data_processing.parse_record_date(record[0])
+                if day is not None:
+                    min_date = day if min_date is None or day < min_date else min_date
+                    max_date = day if max_date is None or day > max_date else max_date
+            if block_lines == INDEX_BLOCK_LINES or position >= end:
+                blocks.append([block_start, position, min_date, max_date])
+                block_start, block_lines = position, 0
+                min_date = max_date = None
+        if block_lines:
+            blocks.append([block_start, position, min_date, max_date])
+    return blocks
+
+
+def _merge_blocks(blocks, partial):
+    blocks.extend(partial)
+    return blocks
+
+
+def iter_report_records(txt_path, date_from=None, date_to=None, task_types=None, detailed=False):
+    """Генератор записей журнала за период (с учётом поправок) с фильтром по видам задач.
+       Выдаёт (дата, запись), а при detailed - (смещение, исходная запись, дата, запись)."""
+    index = _indexes.get(txt_path)
+    if index is None:
+        index = _indexes[txt_path] = _DateBlockIndex(txt_path)
+    records = amendments.apply_in_period(index.iter_records(date_from, date_to),
+                                         amendments.current_amendments(txt_path), date_from, date_to)
+    for offset, base, day, record in records:
+        if task_types and (record[4] or "Не указан") not in task_types:
+            continue
+        yield (offset, base, day, record) if detailed else (day, record)
+
+
+class _Subtotals:
+    """Итоги по дням и по видам задач (память - по числу дней и видов, не записей)."""
+
+    def __init__(self):
+        self.by_day = {}
+        self.by_type = {}
+
+    def add(self, day, record):
+        try:
+            difficulty = int(record[6])
+        except ValueError:
+            difficulty = 0
+        task_type = record[4] or "Не указан"
+        for totals, key in ((self.by_day, day), (self.by_type, task_type)):
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = [0, 0]
+            entry[0] += 1
+            entry[1] += difficulty
+
+
+def _counted(records, subtotals):
+    for day, record in records:
+        subtotals.add(day, record)
+        yield record
+
+
+def _period_title(date_from, date_to, task_types):
+    period = f"{date_from.strftime('%d.%m.%Y') if date_from else '...'} - {date_to.strftime('%d.%m.%Y') if date_to else '...'}"
+    types = ", ".join(sorted(task_types)) if task_types else "все"
+    return f"Отчёт за период {period}, виды задач: {types}"
+
+
+def _write_csv(out, records, subtotals, title):
+    writer = csv.writer(out, delimiter=";")
+    writer.writerow([title])
+    writer.writerow(file_operations.EXCEL_HEADERS)
+    writer.writerows(_counted(records, subtotals))
+    writer.writerow([])
+    writer.writerow(["Итоги по дням", "Записей", "Сумма сложностей"])
+    for day in sorted(subtotals.by_day):
+        writer.writerow([day.strftime("%d.%m.%Y")] + subtotals.by_day[day])
+    writer.writerow([])
+    writer.writerow(["Итоги по видам задач", "Записей", "Сумма сложностей"])
+    for task_type in sorted(subtotals.by_type):
+        writer.writerow([task_type] + subtotals.by_type[task_type])
+
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: Arial, sans-serif; font-size: 13px; margin: 20px; }}
+table {{ border-collapse: collapse; margin-bottom: 24px; }}
+th, td {{ border: 1px solid #ccc; padding: 3px 8px; text-align: left; }}
+th {{ background: #f0f0f0; }}
+td.num {{ text-align: right; }}
+</style></head><body>
+<h2>{title}</h2>
+"""
+
+
+def _html_table(out, headers, rows, numeric_from):
+    out.write("<table><tr>" + "".join(f"<th>{html.escape(str(h))}</th>" for h in headers) + "</tr>\n")
+    for row in rows:
+        cells = []
+        for index, value in enumerate(row):
+            css = ' class="num"' if index >= numeric_from else ""
+            cells.append(f"<td{css}>{html.escape(str(value))}</td>")
+        out.write("<tr>" + "".join(cells) + "</tr>\n")
+    out.write("</table>\n")
+
+
+def _write_html(out, records, subtotals, title):
+    out.write(_HTML_HEAD.format(title=html.escape(title)))
+    out.write("<h3>Записи</h3>\n")
+    _html_table(out, file_operations.EXCEL_HEADERS, _counted(records, subtotals), len(file_operations.EXCEL_HEADERS) - 1)
+    out.write("<h3>Итоги по дням</h3>\n")
+    _html_table(out, ["Дата", "Записей", "Сумма сложностей"],
+                ([day.strftime("%d.%m.%Y")] + subtotals.by_day[day] for day in sorted(subtotals.by_day)), 1)
+    out.write("<h3>Итоги по видам задач</h3>\n")
+    _html_table(out, ["Вид задачи", "Записей", "Сумма сложностей"],
+                ([task_type] + subtotals.by_type[task_type] for task_type in sorted(subtotals.by_type)), 1)
+    out.write("</body></html>\n")
+
+
+def export_report(txt_path, output_path, date_from=None, date_to=None, task_types=None, fmt="csv"):
+    """
+    Выгружает записи за период (и итоги по дням и видам задач) в CSV или HTML.
+    Записи идут из журнала прямо в файл через генераторы, в памяти только итоги.
+    Возвращает количество выгруженных записей.
+    """
+    subtotals = _Subtotals()
+    records = iter_report_records(txt_path, date_from, date_to, set(task_types) if task_types else None)
+    title = _period_title(date_from, date_to, task_types)
+    tmp_path = output_path + ".tmp"
+    try:
+        if fmt == "html":
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                _write_html(out, records, subtotals, title)
+        else:
+            # utf-8-sig и ";" - чтобы Excel с русской локалью открыл файл без мастера импорта
+            with open(tmp_path, "w", encoding="utf-8-sig", newline="") as out:
+                _write_csv(out, records, subtotals, title)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sum(count for count, _ in subtotals.by_day.values())
+
+
+def _parse_date_arg(value):
+    return datetime.strptime(value.strip(), "%d.%m.%Y").date() if value and value.strip() else None
+
+
+def show_export_dialog(parent_window, task_types=()):
+    """Окно выгрузки отчёта. task_types - виды задач для фильтра."""
+    window = tk.Toplevel(parent_window)
+    window.title("Выгрузка отчёта")
+    window.resizable(False, False)
+    window.grab_set()
+    window.focus_set()
+
+    frame = tk.Frame(window)
+    frame.pack(padx=20, pady=10)
+
+    first_day = date.today().replace(day=1)
+    from_var = tk.StringVar(value=first_day.strftime("%d.%m.%Y"))
+    to_var = tk.StringVar(value=date.today().strftime("%d.%m.%Y"))
+    type_var = tk.StringVar(value="Все")
+    format_var = tk.StringVar(value="csv")
+
+    tk.Label(frame, text="С (дд.мм.гггг):").grid(row=0, column=0, sticky="w")
+    tk.Entry(frame, textvariable=from_var, width=12).grid(row=0, column=1, sticky="w", pady=2)
+    tk.Label(frame, text="По (дд.мм.гггг):").grid(row=1, column=0, sticky="w")
+    tk.Entry(frame, textvariable=to_var, width=12).grid(row=1, column=1, sticky="w", pady=2)
+    tk.Label(frame, text="Вид задачи:").grid(row=2, column=0, sticky="w")
+    ttk.Combobox(frame, textvariable=type_var, values=["Все"] + sorted(task_types), width=10,
+                 state="readonly").grid(row=2, column=1, sticky="w", pady=2)
+    tk.Label(frame, text="Формат:").grid(row=3, column=0, sticky="w")
+    format_frame = tk.Frame(frame)
+    format_frame.grid(row=3, column=1, sticky="w")
+    tk.Radiobutton(format_frame, text="CSV", variable=format_var, value="csv").pack(side="left")
+    tk.Radiobutton(format_frame, text="HTML", variable=format_var, value="html").pack(side="left")
+
+    def run_export():
+        try:
+            date_from = _parse_date_arg(from_var.get())
+            date_to = _parse_date_arg(to_var.get())
+        except ValueError:
+            messagebox.showwarning("Ошибка", "Даты указываются в формате дд.мм.гггг.", parent=window)
+            return
+        txt_path = state.settings["txt_path"].get().strip()
+        if not txt_path or not os.path.exists(txt_path):
+            messagebox.showwarning("Ошибка", f"TXT-файл не найден:\n{txt_path}", parent=window)
+            return
+        fmt = format_var.get()
+        output_path = filedialog.asksaveasfilename(
+            parent=window, defaultextension=f".{fmt}",
+            filetypes=[("CSV files", "*.csv")] if fmt == "csv" else [("HTML files", "*.html")])
+        if not output_path:
+            return
+        task_type = type_var.get()
+        try:
+            exported = export_report(txt_path, output_path, date_from, date_to,
+                                     None if task_type == "Все" else [task_type], fmt)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось выгрузить отчёт:\n{e}", parent=window)
+            return
+        messagebox.showinfo("Успех", f"Выгружено записей: {exported}\n{output_path}", parent=window)
+        window.destroy()
+
+    tk.Button(frame, text="Выгрузить", command=run_export, bg="#4CAF50", fg="white").grid(
+        row=4, column=1, sticky="e", pady=(10, 0))
+
+
+def main(argv=None):
+    """Выгрузка из командной строки:
+       python report_export.py --from 01.01.2026 --to 31.03.2026 [--type Р] [--format html] отчёт.html"""
+    import settings
+    plain_settings = settings.read_plain_settings()
+    parser = argparse.ArgumentParser(description="Выгрузка отчёта за период")
+    parser.add_argument("output", help="файл отчёта")
+    parser.add_argument("--from", dest="date_from", help="начало периода, дд.мм.гггг")
+    parser.add_argument("--to", dest="date_to", help="конец периода, дд.мм.гггг")
+    parser.add_argument("--type", dest="task_types", action="append", help="вид задачи (можно несколько)")
+    parser.add_argument("--format", choices=["csv", "html"], default=None, help="формат (по умолчанию - по расширению)")
+    parser.add_argument("--txt", default=plain_settings["txt_path"], help="путь к TXT-файлу")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("html" if args.output.lower().endswith((".html", ".htm")) else "csv")
+    exported = export_report(args.txt, args.output, _parse_date_arg(args.date_from),
+                             _parse_date_arg(args.date_to), args.task_types, fmt)
+    print(f"Выгружено записей: {exported} -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# save_journal.py
+# Двухфазное сохранение записей в TXT и XLSX с журналом намерений (write-ahead log)
+
+import os
+import json
+import uuid
+import socket
+
+import file_operations
+from file_lock import FileLock, pid_alive
+
+# Имя журнала сохранений (лежит рядом с settings.ini)
+WAL_FILENAME = "save_journal.wal"
+
+# Формат журнала - строки JSON:
+#   {"txn": id, "op": "begin", "host", "pid", "txt": путь|null, "xlsx": путь|null,
+#    "txt_size": размер TXT до записи|null,
+#    "records": [[record_id, запись, ["txt", "xlsx"]], ...]}   - в какие файлы пишется каждая запись
+#   {"txn": id, "op": "txt_done"}    - строки дописаны в TXT
+#   {"txn": id, "op": "xlsx_done"}   - строки дописаны в XLSX
+#   {"txn": id, "op": "rollback"}    - сохранение отменено, файлы не изменены
+#
+# По журналу для каждой записи известно, в какие файлы она уже попала.
+# Повторное сохранение той же записи (после ошибки Excel) пропускает файлы,
+# где она уже есть, поэтому повтор не создаёт дублей в TXT.
+
+
+def _read_wal(wal_path):
+    """Читает журнал: возвращает список транзакций в порядке начала."""
+    txns = {}
+    if not os.path.exists(wal_path):
+        return []
+    with open(wal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # Оборванная строка после сбоя
+            txn_id = entry.get("txn")
+            if entry.get("op") == "begin":
+                entry["done"] = set()
+                entry["rolled_back"] = False
+                txns[txn_id] = entry
+            elif txn_id in txns:
+                if entry.get("op") == "rollback":
+                    txns[txn_id]["rolled_back"] = True
+                elif entry.get("op") in ("txt_done", "xlsx_done"):
+                    txns[txn_id]["done"].add(entry["op"][:-5])
+    return list(txns.values())
+
+
+def _append_wal(wal_path, entry):
+    with open(wal_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _record_targets(txns):
+    """
+    Сводит журнал по записям.
+    Возвращает (requested, done, content):
+      requested[record_id] - множество файлов ("txt"/"xlsx"), куда запись просили сохранить
+      done[record_id]      - множество файлов, куда она уже записана
+      content[record_id]   - запись в том виде, в каком она попала в первый файл
+    """
+    requested, done, content = {}, {}, {}
+    for txn in txns:
+        if txn["rolled_back"]:
+            continue
+        for record_id, record, targets in txn["records"]:
+            requested.setdefault(record_id, set()).update(targets)
+            written = txn["done"].intersection(targets)
+            if written:
+                done.setdefault(record_id, set()).update(written)
+                content.setdefault(record_id, record)
+    return requested, done, content
+
+
+def _settled_ids(txns):
+    """record_id записей, которые дошли до всех запрошенных файлов."""
+    requested, done, _ = _record_targets(txns)
+    return {record_id for record_id, targets in requested.items() if targets <= done.get(record_id, set())}
+
+
+def _compact_if_settled(wal_path):
+    """Очищает журнал, если все записи дошли до всех запрошенных файлов."""
+    with FileLock(wal_path):
+        txns = _read_wal(wal_path)
+        if len(_settled_ids(txns)) == len(_record_targets(txns)[0]):
+            try:
+                os.remove(wal_path)
+            except OSError:
+                pass
+
+
+def _log(wal_path, entry):
+    with FileLock(wal_path):
+        _append_wal(wal_path, entry)
+
+
+def _begin_entry(txn_id, txt_path, xlsx_path, records, txt_size=None):
+    return {
+        "txn": txn_id, "op": "begin",
+        "host": socket.gethostname(), "pid": os.getpid(),
+        "txt": txt_path, "xlsx": xlsx_path, "txt_size": txt_size,
+        "records": records,
+    }
+
+
+def save_records(records, txt_path=None, xlsx_path=None, wal_path=None):
+    """
+    Сохраняет записи (список пар (record_id, запись)) в TXT и/или XLSX.
+    1. В журнал пишется намерение (записи, размер TXT до записи).
+    2. Строки дописываются в TXT, в журнал - отметка txt_done.
+    3. XLSX сохраняется через временный файл и атомарную подмену, отметка xlsx_done.
+    Записи, которые по журналу уже есть в каком-то файле, туда повторно не пишутся;
+    для догоняющего файла берётся их содержимое из журнала, чтобы файлы совпадали.
+    Ошибки пробрасываются вызывающему коду.
+    """
+    with FileLock(wal_path):
+        txns = _read_wal(wal_path)
+    _, done, content = _record_targets(txns)
+
+    pending = []
+    for record_id, record in records:
+        record_done = done.get(record_id, set())
+        targets = [target for target, path in (("txt", txt_path), ("xlsx", xlsx_path))
+                   if path and target not in record_done]
+        if targets:
+            pending.append([record_id, content.get(record_id, record), targets])
+    if not pending:
+        _compact_if_settled(wal_path)
+        return
+
+    txt_records = [record for _, record, targets in pending if "txt" in targets]
+    xlsx_records = [record for _, record, targets in pending if "xlsx" in targets]
+    txn_id = uuid.uuid4().hex
+    txn_txt_path = txt_path if txt_records else None
+    txn_xlsx_path = xlsx_path if xlsx_records else None
+
+    if txt_records:
+        # Намерение пишется под блокировкой TXT, когда известен его размер до записи
+        def write_intent(txt_size):
+            _log(wal_path, _begin_entry(txn_id, txn_txt_path, txn_xlsx_path, pending, txt_size))
+        file_operations.append_records_to_txt(txt_path, txt_records, before_write=write_intent)
+        _log(wal_path, {"txn": txn_id, "op": "txt_done"})
+    else:
+        _log(wal_path, _begin_entry(txn_id, txn_txt_path, txn_xlsx_path, pending))
+
+    if xlsx_records:
+        file_operations.append_records_to_excel(xlsx_path, xlsx_records)
+        _log(wal_path, {"txn": txn_id, "op": "xlsx_done"})
+
+    _compact_if_settled(wal_path)
+
+
+def _recover_txt(txn):
+    """Доводит или откатывает прерванную запись в TXT. Возвращает True, если строки в файле."""
+    txt_path = txn["txt"]
+    txt_size = txn.get("txt_size")
+    if txt_size is None or not os.path.exists(txt_path):
+        return False
+    payload = file_operations.txt_payload([record for _, record, targets in txn["records"] if "txt" in targets])
+    with FileLock(txt_path):
+        with open(txt_path, "r+b") as f:
+            f.seek(txt_size)
+            written = f.read(len(payload))
+            if written == payload:
+                return True # Строки успели записаться целиком
+            if written and payload.startswith(written):
+                # Запись оборвалась на середине - возвращаем файл к исходному размеру
+                f.truncate(txt_size)
+                print(f"Откат незавершённой записи в {txt_path}") # Для отладки
+    return False
+
+
+def recover_incomplete_saves(wal_path):
+    """
+    Восстановление при запуске: для прерванных сохранений дописывает записи
+    в отстающий файл (если в другой они уже попали) или откатывает их.
+    Сохранения, которые ведёт другой работающий экземпляр программы, не трогаются.
+    Возвращает множество record_id, которые теперь сохранены полностью
+    (их черновики больше не нужны).
+    """
+    with FileLock(wal_path):
+        txns = _read_wal(wal_path)
+    if not txns:
+        return set()
+
+    host = socket.gethostname()
+    for txn in txns:
+        targets = {target for target in ("txt", "xlsx") if txn.get(target)}
+        if txn["rolled_back"] or txn["done"] >= targets:
+            continue
+        if txn.get("host") == host and txn.get("pid") != os.getpid() and pid_alive(txn.get("pid", 0)):
+            continue # Сохранение ещё идёт в другом окне
+        try:
+            if "txt" in targets and "txt" not in txn["done"] and _recover_txt(txn):
+                _log(wal_path, {"txn": txn["txn"], "op": "txt_done"})
+                txn["done"].add("txt")
+            if not txn["done"]:
+                # Ни один файл не изменён - записи остаются черновиками
+                _log(wal_path, {"txn": txn["txn"], "op": "rollback"})
+                txn["rolled_back"] = True
+        except Exception as e:
+            print(f"Ошибка восстановления сохранения {txn['txn']}: {e}")
+
+    # Записи, которые попали в TXT, но не в XLSX, дописываем в XLSX
+    requested, done, content = _record_targets(txns)
+    lagging = {}
+    for txn in txns:
+        if txn["rolled_back"] or not txn.get("xlsx"):
+            continue
+        for record_id, _, targets in txn["records"]:
+            record_done = done.get(record_id, set())
+            if "xlsx" in targets and record_done and "xlsx" not in record_done:
+                lagging.setdefault(txn["xlsx"], {})[record_id] = content[record_id]
+    for xlsx_path, pending in lagging.items():
+        replay_id = uuid.uuid4().hex
+        _log(wal_path, _begin_entry(replay_id, None, xlsx_path,
+                                    [[record_id, record, ["xlsx"]] for record_id, record in pending.items()]))
+        try:
+            file_operations.append_records_to_excel(xlsx_path, list(pending.values()))
+        except Exception as e:
+            print(f"Не удалось дописать записи в {xlsx_path}: {e}")
+            _log(wal_path, {"txn": replay_id, "op": "rollback"})
+            continue
+        _log(wal_path, {"txn": replay_id, "op": "xlsx_done"})
+        print(f"Дописано в {xlsx_path} после прерванного сохранения: {len(pending)}") # Для отладки
+
+    with FileLock(wal_path):
+        saved_ids = _settled_ids(_read_wal(wal_path))
+    _compact_if_settled(wal_path)
+    return saved_ids
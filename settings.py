@@ -16,15 +16,26 @@ DEFAULT_OLD_TASKS_COUNT = 5  # Количество последних зада
 # Новое: Стиль выбора сложности по умолчанию
 DEFAULT_DIFFICULTY_STYLE = "buttons"
 
-def get_settings_path():
-    """Определяет путь к settings.ini рядом с исполняемым файлом или скриптом."""
+# Диагностика зависаний окна (журнал diagnostics.log) по умолчанию выключена
+DEFAULT_WATCHDOG_ENABLED = False
+
+# Приём записей по HTTP на localhost (ingest_server) по умолчанию выключен
+DEFAULT_INGEST_ENABLED = False
+DEFAULT_INGEST_PORT = 8765
+
+def get_app_file_path(filename):
+    """Путь к служебному файлу программы рядом с исполняемым файлом или скриптом."""
     if getattr(sys, 'frozen', False):
         # Если запущено как .exe (например, собрано PyInstaller)
         application_path = os.path.dirname(sys.executable)
     else:
         # Если запущено как скрипт .py
         application_path = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(application_path, "settings.ini")
+    return os.path.join(application_path, filename)
+
+def get_settings_path():
+    """Определяет путь к settings.ini рядом с исполняемым файлом или скриптом."""
+    return get_app_file_path("settings.ini")
 
 def load_settings_from_ini(root):
     """Загружает настройки из settings.ini, если файл существует.
@@ -41,6 +52,9 @@ def load_settings_from_ini(root):
         "old_tasks_count": tk.IntVar(master=root, value=DEFAULT_OLD_TASKS_COUNT),
         # Новое: Переменная для стиля сложности
         "difficulty_style": tk.StringVar(master=root, value=DEFAULT_DIFFICULTY_STYLE),
+        "watchdog_enabled": tk.BooleanVar(master=root, value=DEFAULT_WATCHDOG_ENABLED),
+        "ingest_enabled": tk.BooleanVar(master=root, value=DEFAULT_INGEST_ENABLED),
+        "ingest_port": tk.IntVar(master=root, value=DEFAULT_INGEST_PORT),
     }
     
     if os.path.exists(settings_path):
@@ -73,6 +87,15 @@ def load_settings_from_ini(root):
                         state.settings["difficulty_style"].set(style_value)
                     else:
                         state.settings["difficulty_style"].set(DEFAULT_DIFFICULTY_STYLE) # значение по умолчанию
+                if 'watchdog_enabled' in section:
+                    state.settings["watchdog_enabled"].set(section.getboolean('watchdog_enabled'))
+                if 'ingest_enabled' in section:
+                    state.settings["ingest_enabled"].set(section.getboolean('ingest_enabled'))
+                if 'ingest_port' in section:
+                    try:
+                        state.settings["ingest_port"].set(int(section['ingest_port']))
+                    except ValueError:
+                        pass # Оставляем порт по умолчанию
                         
             print(f"Настройки загружены из {settings_path}") # Для отладки
         except Exception as e:
@@ -94,6 +117,9 @@ def save_settings_to_ini():
         'old_tasks_count': str(state.settings["old_tasks_count"].get()),
         # Новое: Сохранение стиля сложности
         'difficulty_style': state.settings["difficulty_style"].get(),
+        'watchdog_enabled': str(state.settings["watchdog_enabled"].get()),
+        'ingest_enabled': str(state.settings["ingest_enabled"].get()),
+        'ingest_port': str(state.settings["ingest_port"].get()),
     }
     
     try:
@@ -104,3 +130,42 @@ def save_settings_to_ini():
         error_msg = f"Не удалось сохранить настройки в файл {settings_path}: {e}"
         print(error_msg)
         # messagebox.showwarning("Ошибка сохранения настроек", error_msg) # Может потребоваться доступ к root
+
+def read_plain_settings():
+    """Читает settings.ini без Tkinter (для запуска утилит из командной строки).
+       Возвращает словарь обычных значений; отсутствующие ключи берутся по умолчанию."""
+    values = {
+        "save_txt": True,
+        "save_excel": True,
+        "txt_path": DEFAULT_TXT_PATH,
+        "excel_path": DEFAULT_XLSX_PATH,
+        "old_tasks_count": DEFAULT_OLD_TASKS_COUNT,
+        "difficulty_style": DEFAULT_DIFFICULTY_STYLE,
+        "watchdog_enabled": DEFAULT_WATCHDOG_ENABLED,
+        "ingest_enabled": DEFAULT_INGEST_ENABLED,
+        "ingest_port": DEFAULT_INGEST_PORT,
+    }
+    settings_path = get_settings_path()
+    if not os.path.exists(settings_path):
+        return values
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    try:
+        config.read(settings_path, encoding='utf-8')
+        if 'Settings' in config:
+            section = config['Settings']
+            for key, default in values.items():
+                if key not in section:
+                    continue
+                if isinstance(default, bool):
+                    values[key] = section.getboolean(key)
+                elif isinstance(default, int):
+                    try:
+                        values[key] = int(section[key])
+                    except ValueError:
+                        pass # Оставляем значение по умолчанию
+                else:
+                    values[key] = section[key]
+    except Exception as e:
+        print(f"Ошибка при загрузке настроек из {settings_path}: {e}")
+    return values
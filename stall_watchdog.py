@@ -0,0 +1,141 @@
+# stall_watchdog.py
+# Диагностика зависаний окна: пульс главного цикла Tk и запись стека при остановке
+
+import os
+import sys
+import time
+import logging
+import threading
+import traceback
+from logging.handlers import RotatingFileHandler
+
+import state # Для снимка путей к файлам из настроек
+
+# Журнал диагностики рядом с settings.ini
+LOG_FILENAME = "diagnostics.log"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# Пульс главного цикла и порог, после которого окно считается зависшим
+HEARTBEAT_INTERVAL_MS = 250
+STALL_THRESHOLD_SECONDS = 2.0
+# Пока зависание продолжается, стек снимается повторно с таким интервалом
+RESAMPLE_SECONDS = 5.0
+
+
+def _get_logger(log_path):
+    logger = logging.getLogger("photoday.watchdog")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not any(getattr(handler, "baseFilename", None) == os.path.abspath(log_path) for handler in logger.handlers):
+        handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+def _file_sizes(paths):
+    """Размеры файлов для журнала (ошибка доступа тоже пишется - она бывает причиной)."""
+    parts = []
+    for label, path in paths:
+        if not path:
+            continue
+        try:
+            parts.append(f"{label}: {path} ({os.path.getsize(path)} байт)")
+        except OSError as e:
+            parts.append(f"{label}: {path} (недоступен: {e})")
+    return "; ".join(parts)
+
+
+class StallWatchdog:
+    """
+    Главный цикл Tk через root.after отмечает пульс; фоновый поток проверяет,
+    как давно пульса не было. Если дольше порога - в журнал пишется стек
+    главного потока (sys._current_frames) в момент зависания, а после
+    восстановления - длительность зависания и размеры TXT/XLSX.
+    Пути к файлам читаются только в главном потоке (переменные Tk не потокобезопасны).
+    """
+
+    def __init__(self, root, log_path, threshold=STALL_THRESHOLD_SECONDS, interval_ms=HEARTBEAT_INTERVAL_MS):
+        self.root = root
+        self.log_path = log_path
+        self.threshold = threshold
+        self.interval_ms = interval_ms
+        self.main_thread_id = threading.main_thread().ident
+        self.last_beat = time.monotonic()
+        self.paths = ()
+        self.after_id = None
+        self.thread = None
+        self.stop_event = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.logger = _get_logger(self.log_path)
+        self.stop_event = threading.Event()
+        self._beat()
+        self.thread = threading.Thread(target=self._monitor, args=(self.stop_event,),
+                                       name="stall-watchdog", daemon=True)
+        self.thread.start()
+        print(f"Диагностика зависаний включена, журнал: {self.log_path}") # Для отладки
+
+    def stop(self):
+        if not self.running:
+            return
+        self.stop_event.set()
+        self.thread = None
+        if self.after_id:
+            try:
+                self.root.after_cancel(self.after_id)
+            except Exception:
+                pass # Окно уже закрыто
+            self.after_id = None
+
+    def _beat(self):
+        """Пульс (в главном потоке)."""
+        self.last_beat = time.monotonic()
+        try:
+            self.paths = (("TXT", state.settings["txt_path"].get().strip()),
+                          ("XLSX", state.settings["excel_path"].get().strip()))
+        except Exception:
+            pass
+        self.after_id = self.root.after(self.interval_ms, self._beat)
+
+    def _monitor(self, stop_event):
+        """Фоновый поток: следит за пульсом."""
+        check_interval = min(0.5, self.threshold / 4)
+        expected_gap = self.interval_ms / 1000
+        stalled_beat = None    # пульс, после которого началось зависание
+        next_sample = 0
+        while not stop_event.wait(check_interval):
+            last_beat = self.last_beat
+            now = time.monotonic()
+            if stalled_beat is not None and last_beat != stalled_beat:
+                # Пульс вернулся - записываем итог зависания
+                duration = last_beat - stalled_beat - expected_gap
+                self.logger.info(f"Окно снова отвечает. Зависание длилось {duration:.1f} с")
+                self.logger.info(f"Файлы: {_file_sizes(self.paths)}")
+                stalled_beat = None
+                continue
+            silence = now - last_beat - expected_gap
+            if silence < self.threshold:
+                continue
+            if stalled_beat is None or now >= next_sample:
+                first = stalled_beat is None
+                stalled_beat = last_beat
+                next_sample = now + RESAMPLE_SECONDS
+                self._log_stack(silence, first)
+
+    def _log_stack(self, silence, first):
+        frame = sys._current_frames().get(self.main_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "  (стек недоступен)\n"
+        title = "Окно не отвечает" if first else "Окно всё ещё не отвечает"
+        # Стек пишем отдельной записью до размеров файлов: если зависание из-за сетевого
+        # диска, обращение к размерам может зависнуть и в этом потоке
+        self.logger.info(f"{title} {silence:.1f} с. Стек главного потока:\n{stack.rstrip()}")
+        if first:
+            self.logger.info(f"Файлы: {_file_sizes(self.paths)}")
@@ -3,7 +3,11 @@
 
 import os
 from datetime import datetime, timedelta
-from openpyxl import load_workbook
+import xlsx_reader # Быстрое чтение листа без openpyxl
+import data_processing # Разбор дат и подсчёт статистики по дням
+import file_operations # Структура листа "Сводка"
+import amendments # Правки и удаления записей
+import parallel_scan # Параллельное чтение TXT-журнала
 import tkinter as tk
 from tkinter import ttk
 import state  # Для доступа к пути Excel-файла из настроек
@@ -13,30 +17,72 @@ DATE_COL_INDEX = 1      # Колонка "Дата"
 TASK_TYPE_COL_INDEX = 5 # Колонка "Вид задачи"
 DIFFICULTY_COL_INDEX = 7 # Колонка "Сложность"
 
-# Кэширование распарсенных дат для ускорения
-_date_cache = {}
+def _scan_log(xlsx_path, days_data):
+    """Полный проход по листу журнала (первые 7 колонок)."""
+    # Разных дат немного, поэтому их разбор кэшируется в пределах одного вызова
+    parsed_dates = {}
+    rows = xlsx_reader.iter_rows(xlsx_path, max_col=DIFFICULTY_COL_INDEX)
+    for row_index, row in enumerate(rows):
+        date_cell_value = row[DATE_COL_INDEX - 1]
+        if not date_cell_value:
+            continue
 
-def _parse_date_cached(date_value):
-    """Парсит дату с кэшированием для ускорения."""
-    if date_value in _date_cache:
-        return _date_cache[date_value]
-    
-    record_date = None
-    if isinstance(date_value, datetime):
-        record_date = date_value.date()
-    elif isinstance(date_value, str):
-        try:
-            # Пытаемся распарсить дату в формате dd.mm.yyyy
-            record_date = datetime.strptime(date_value, "%d.%m.%Y").date()
-        except ValueError:
-            pass
-    
-    _date_cache[date_value] = record_date
-    return record_date
+        # Пропускаем заголовок, если он есть
+        if row_index == 0 and isinstance(date_cell_value, str) and 'дата' in date_cell_value.lower():
+            continue
+
+        if date_cell_value in parsed_dates:
+            record_date = parsed_dates[date_cell_value]
+        else:
+            record_date = parsed_dates[date_cell_value] = data_processing.parse_record_date(date_cell_value)
+
+        # Если дата не распознана, пропускаем
+        if record_date is None:
+            continue
+
+        data_processing.add_to_day_stats(days_data, record_date,
+                                         row[TASK_TYPE_COL_INDEX - 1], row[DIFFICULTY_COL_INDEX - 1])
+
+def _read_summary(xlsx_path):
+    """
+    Читает статистику из листа "Сводка", который ведёт file_operations при сохранении.
+    Возвращает None, если листа нет или он не соответствует журналу: число строк
+    журнала изменилось без обновления сводки или книгу сохраняли не мы
+    (например, правили ячейки в Excel - см. file_operations.summary_is_current).
+    """
+    if not file_operations.summary_is_current(xlsx_path):
+        return None
+    rows = xlsx_reader.iter_rows(xlsx_path, sheet=file_operations.SUMMARY_SHEET_TITLE)
+    marker = next(rows, None)
+    header = next(rows, None)
+    if not marker or not header or marker[0] != file_operations.SUMMARY_MARKER_LABEL:
+        return None
+    # Книги, записанные потоково (write_only), размер листа не указывают - тогда хватает отметки
+    log_rows = xlsx_reader.read_dimension(xlsx_path)
+    if log_rows is not None and marker[1] != log_rows:
+        return None
+    type_columns = list(enumerate(header))[file_operations.SUMMARY_FIRST_TYPE_COL - 1:]
+    days_data = {}
+    for row in rows:
+        record_date = data_processing.parse_record_date(row[0])
+        if record_date is None:
+            continue
+        day = days_data[record_date] = {
+            'count': int(row[1] or 0),
+            'total_difficulty': int(row[2] or 0),
+            'difficulty_by_type': {},
+        }
+        for index, task_type in type_columns:
+            if index < len(row) and row[index] is not None:
+                day['difficulty_by_type'][task_type] = int(row[index])
+    return days_data
 
 def get_task_statistics():
     """
     Считает статистику по записям из Excel-файла.
+    Если в книге есть актуальный лист "Сводка", читается только он (по строке на день),
+    иначе - весь журнал. Если сохранение в Excel выключено в настройках,
+    статистика считается по TXT-файлу (большой файл - кусками во всех ядрах).
     Возвращает только дни, за которые есть хотя бы одна запись.
     
     Возвращает словарь с ключами:
@@ -49,6 +95,22 @@ def get_task_statistics():
         'error': None
     }
 
+    txt_path = state.settings["txt_path"].get().strip() if "txt_path" in state.settings else ""
+    if "save_excel" in state.settings and not state.settings["save_excel"].get():
+        if not txt_path:
+            stats['error'] = "Сохранение в Excel выключено, а путь к TXT-файлу не задан в настройках."
+            return stats
+        if not os.path.exists(txt_path):
+            stats['error'] = f"TXT-файл не найден: {txt_path}"
+            return stats
+        try:
+            stats['days_data'] = parallel_scan.day_stats(txt_path)
+            # Поправки, уже внесённые в TXT, повторно не учитываются
+            amendments.apply_to_day_stats(stats['days_data'], txt_path, include_folded=False)
+        except Exception as e:
+            stats['error'] = f"Ошибка при чтении TXT-файла: {e}"
+        return stats
+
     # Получаем путь к Excel-файлу из настроек
     xlsx_path = state.settings.get("excel_path", None)
     if not xlsx_path:
@@ -64,71 +126,33 @@ def get_task_statistics():
         stats['error'] = f"Excel-файл не найден: {xlsx_path_value}"
         return stats
 
-    # Очистка кэша перед каждым вызовом
-    global _date_cache
-    _date_cache = {}
-
     try:
-        # Открываем файл в режиме только для чтения и без вычисления формул
-        wb = load_workbook(xlsx_path_value, read_only=True, data_only=True)
-        ws = wb.active
-
-        # Пропускаем заголовок, если он есть
-        start_row = 1
-        if ws.max_row > 0:
-            first_date_cell = ws.cell(row=1, column=DATE_COL_INDEX).value
-            if isinstance(first_date_cell, str) and 'дата' in first_date_cell.lower():
-                start_row = 2
-
-        # Используем iter_rows для более эффективного чтения
-        for row in ws.iter_rows(min_row=start_row, values_only=True, max_col=DIFFICULTY_COL_INDEX):
-            # Получаем дату из кортежа
-            date_cell_value = row[DATE_COL_INDEX - 1] if len(row) >= DATE_COL_INDEX else None
-            if not date_cell_value:
-                continue
-
-            # Используем кэшированную функцию парсинга даты
-            record_date = _parse_date_cached(date_cell_value)
-
-            # Если дата не распознана, пропускаем
-            if record_date is None:
-                continue
-
-            # Получаем вид задачи и сложность из кортежа
-            task_type = row[TASK_TYPE_COL_INDEX - 1] if len(row) >= TASK_TYPE_COL_INDEX else None
-            if not task_type:
-                task_type = "Не указан"
-
-            difficulty_raw = row[DIFFICULTY_COL_INDEX - 1] if len(row) >= DIFFICULTY_COL_INDEX else None
-            try:
-                difficulty = int(difficulty_raw) if difficulty_raw is not None else 0
-            except (ValueError, TypeError):
-                difficulty = 0
-
-            # Инициализируем структуру для этой даты, если она еще не существует
-            if record_date not in stats['days_data']:
-                stats['days_data'][record_date] = {
-                    'count': 0,
-                    'total_difficulty': 0,
-                    'difficulty_by_type': {}
-                }
-
-            # Обновляем статистику для этой даты
-            stats['days_data'][record_date]['count'] += 1
-            stats['days_data'][record_date]['total_difficulty'] += difficulty
-            
-            if task_type not in stats['days_data'][record_date]['difficulty_by_type']:
-                stats['days_data'][record_date]['difficulty_by_type'][task_type] = 0
-            stats['days_data'][record_date]['difficulty_by_type'][task_type] += difficulty
-
+        summary_days = _read_summary(xlsx_path_value)
+        if summary_days is not None:
+            stats['days_data'] = summary_days
+        else:
+            _scan_log(xlsx_path_value, stats['days_data'])
+        # Правки старых записей хранятся в журнале поправок рядом с TXT, пока не внесены в файлы
+        if txt_path:
+            amendments.apply_to_day_stats(stats['days_data'], txt_path)
     except Exception as e:
         stats['error'] = f"Ошибка при чтении Excel-файла: {e}"
-    finally:
-        if 'wb' in locals():
-            wb.close()
 
     return stats
 
+def _open_heatmap(parent_window, days_data):
+    import heatmap # Импортируем здесь: heatmap сам использует statistic
+    heatmap.show_heatmap(parent_window, days_data)
+
+def _open_utilization(parent_window):
+    import utilization
+    utilization.show_utilization(parent_window)
+
+def _open_export(parent_window, days_data):
+    import report_export
+    task_types = {task_type for day in days_data.values() for task_type in day['difficulty_by_type']}
+    report_export.show_export_dialog(parent_window, task_types)
+
 def show_statistics(parent_window):
     """
     Собирает и отображает статистику во всплывающем окне в виде таблицы.
@@ -239,5 +263,15 @@ def show_statistics(parent_window):
                  tree.insert('', tk.END, values=('Сложность по типам:',) + ('Нет данных',) * len(days_to_show))
 
     # 6. Размещение виджетов в окне
+    # Кнопки дополнительных отчётов (используют уже посчитанные итоги по дням)
+    if not stats_result['error']:
+        reports_frame = tk.Frame(stats_window)
+        reports_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 10))
+        tk.Button(reports_frame, text="🗓 Календарь нагрузки",
+                  command=lambda: _open_heatmap(stats_window, stats_result['days_data'])).pack(side=tk.LEFT)
+        tk.Button(reports_frame, text="⏱ Загрузка по времени",
+                  command=lambda: _open_utilization(stats_window)).pack(side=tk.LEFT, padx=(5, 0))
+        tk.Button(reports_frame, text="📄 Выгрузить отчёт",
+                  command=lambda: _open_export(stats_window, stats_result['days_data'])).pack(side=tk.LEFT, padx=(5, 0))
     tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
     scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
@@ -4,57 +4,132 @@
 import tkinter as tk
 from tkinter import ttk
 from datetime import datetime
-from data_processing import get_weekday_rus, get_part_of_day # Импортируем нужные функции
+import uuid
+from data_processing import get_weekday_rus, get_part_of_day, TASK_TYPES # Импортируем нужные функции
 import state # Для доступа к настройкам
 
+# Задержка пересчёта дня недели и части дня после ввода даты/времени (мс)
+DERIVED_UPDATE_DELAY_MS = 150
+
 # === КЛАСС ДЛЯ TOOLTIP ===
 class ToolTip:
+    """
+    Всплывающая подсказка виджета. Все подсказки приложения показываются в одном
+    окне Toplevel (создаётся при первом показе, дальше только скрывается и
+    показывается) через одну привязку событий на тег "ToolTip" в bindtags виджета.
+    Тексты хранятся в словаре по пути виджета, поэтому число записей на экране
+    не добавляет ни окон, ни обработчиков.
+    """
+    BINDTAG = "ToolTip"
+    DELAY_MS = 500
+
+    _texts = {}          # путь виджета -> текст подсказки
+    _bound_roots = []    # корневые окна, где уже есть привязка тега
+    _window = None
+    _label = None
+    _after_id = None
+    _after_widget = None
+
     def __init__(self, widget, text):
         self.widget = widget
-        self.text = text
-        self.tooltip_window = None
-        self.id = None
-        self.x = self.y = 0
-        widget.bind("<Enter>", self.on_enter)
-        widget.bind("<Leave>", self.on_leave)
-
-    def on_enter(self, event=None):
-        self.schedule()
-
-    def on_leave(self, event=None):
-        self.unschedule()
-        self.hide_tooltip()
-
-    def schedule(self):
-        self.unschedule()
-        self.id = self.widget.after(500, self.show_tooltip)
-
-    def unschedule(self):
-        id = self.id
-        self.id = None
-        if id:
-            self.widget.after_cancel(id)
-
-    def show_tooltip(self, event=None):
-        x, y, _, _ = self.widget.bbox("insert")
-        x += self.widget.winfo_rootx() + 25
-        y += self.widget.winfo_rooty() + 25
-        self.tooltip_window = tw = tk.Toplevel(self.widget)
-        tw.wm_overrideredirect(True)
-        tw.wm_geometry(f"+{x}+{y}")
-        label = tk.Label(tw, text=self.text, justify='left',
-                         background="#ffffe0", relief='solid', borderwidth=1,
-                         font=("tahoma", "8", "normal"))
-        label.pack(ipadx=1)
-
-    def hide_tooltip(self):
-        tw = self.tooltip_window
-        self.tooltip_window = None
-        if tw:
-            tw.destroy()
+        ToolTip._texts[str(widget)] = text
+        root = widget._root()
+        if root not in ToolTip._bound_roots:
+            ToolTip._bound_roots.append(root)
+            widget.bind_class(self.BINDTAG, "<Enter>", ToolTip._on_enter)
+            widget.bind_class(self.BINDTAG, "<Leave>", ToolTip._on_leave)
+            widget.bind_class(self.BINDTAG, "<ButtonPress>", ToolTip._on_leave)
+            widget.bind_class(self.BINDTAG, "<Destroy>", ToolTip._on_destroy)
+        widget.bindtags((self.BINDTAG,) + widget.bindtags())
+
+    @property
+    def text(self):
+        return ToolTip._texts.get(str(self.widget), "")
+
+    @text.setter
+    def text(self, value):
+        ToolTip._texts[str(self.widget)] = value
+
+    @classmethod
+    def _on_enter(cls, event):
+        cls._unschedule()
+        cls._after_widget = event.widget
+        cls._after_id = event.widget.after(cls.DELAY_MS, lambda w=event.widget: cls._show(w))
+
+    @classmethod
+    def _on_leave(cls, event=None):
+        cls._unschedule()
+        if cls._window is not None:
+            cls._window.withdraw()
+
+    @classmethod
+    def _on_destroy(cls, event):
+        cls._texts.pop(str(event.widget), None)
+        if cls._after_widget is event.widget:
+            cls._on_leave()
+
+    @classmethod
+    def _unschedule(cls):
+        after_id, widget = cls._after_id, cls._after_widget
+        cls._after_id = cls._after_widget = None
+        if after_id:
+            try:
+                widget.after_cancel(after_id)
+            except tk.TclError:
+                pass
+
+    @classmethod
+    def _show(cls, widget):
+        cls._after_id = cls._after_widget = None
+        text = cls._texts.get(str(widget))
+        if not text or not widget.winfo_exists():
+            return
+        if cls._window is None or not cls._window.winfo_exists():
+            cls._window = tk.Toplevel(widget._root())
+            cls._window.withdraw()
+            cls._window.wm_overrideredirect(True)
+            cls._label = tk.Label(cls._window, justify='left',
+                                  background="#ffffe0", relief='solid', borderwidth=1,
+                                  font=("tahoma", "8", "normal"))
+            cls._label.pack(ipadx=1)
+        x = widget.winfo_rootx() + 25
+        y = widget.winfo_rooty() + 25
+        cls._label.config(text=text)
+        cls._window.wm_geometry(f"+{x}+{y}")
+        cls._window.deiconify()
+        cls._window.lift()
+
+# === КЛАСС ДЛЯ ОКНА ПРОГРЕССА ДОЛГИХ ОПЕРАЦИЙ ===
+class ProgressDialog:
+    """Небольшое модальное окно с полосой прогресса.
+       update(done, total) можно передавать как progress_callback в файловые операции."""
+    def __init__(self, parent, title, text):
+        self.window = tk.Toplevel(parent)
+        self.window.title(title)
+        self.window.resizable(False, False)
+        self.window.transient(parent)
+        self.window.grab_set()
+        tk.Label(self.window, text=text).pack(padx=20, pady=(15, 5))
+        self.progress = ttk.Progressbar(self.window, length=300, mode="determinate", maximum=100)
+        self.progress.pack(padx=20, pady=5)
+        self.status_var = tk.StringVar(value="")
+        tk.Label(self.window, textvariable=self.status_var, fg="gray").pack(padx=20, pady=(0, 15))
+        self.window.update()
+
+    def update(self, done, total):
+        percent = (done * 100 / total) if total else 100
+        self.progress["value"] = percent
+        self.status_var.set(f"{percent:.0f}%")
+        # Обрабатываем события, чтобы окно перерисовывалось во время операции
+        self.window.update()
+
+    def close(self):
+        self.window.grab_release()
+        self.window.destroy()
 
 # === ФУНКЦИЯ: СОЗДАНИЕ НОВОЙ ЗАПИСИ ===
-def create_record(parent, record_widgets, default_date=None, default_time=None):
+def create_record(parent, record_widgets, default_date=None, default_time=None,
+                  default_task_type=None, default_difficulty=None, default_description=None, record_id=None):
     frame = tk.LabelFrame(parent, text="Запись", padx=8, pady=8)
     frame.pack(fill="x", pady=3)
     
@@ -69,18 +144,35 @@ def create_record(parent, record_widgets, default_date=None, default_time=None):
     weekday_var = tk.StringVar(value=weekday_val)
     part_of_day_var = tk.StringVar(value=part_of_day_val)
 
-    def update_weekday(*args):
-        weekday_var.set(get_weekday_rus(date_var.get()))
+    # День недели и часть дня пересчитываются не на каждое нажатие клавиши,
+    # а один раз после паузы в вводе, и только если дата/час действительно изменились
+    derived_state = {'after_id': None, 'date': date_val, 'hour': None}
 
-    def update_part_of_day(*args):
+    def update_derived():
+        if derived_state['after_id']:
+            frame.after_cancel(derived_state['after_id'])
+            derived_state['after_id'] = None
+        date_str = date_var.get()
+        if date_str != derived_state['date']:
+            derived_state['date'] = date_str
+            weekday = get_weekday_rus(date_str)
+            if weekday != weekday_var.get():
+                weekday_var.set(weekday)
         try:
             hour = int(time_var.get().split(":")[0])
+        except ValueError:
+            return # Время не распознано - оставляем прежнюю часть дня
+        if hour != derived_state['hour']:
+            derived_state['hour'] = hour
             part_of_day_var.set(get_part_of_day(hour))
-        except:
-            pass
 
-    date_var.trace("w", lambda *args: update_weekday())
-    time_var.trace("w", lambda *args: update_part_of_day())
+    def schedule_derived_update(*args):
+        if derived_state['after_id']:
+            frame.after_cancel(derived_state['after_id'])
+        derived_state['after_id'] = frame.after(DERIVED_UPDATE_DELAY_MS, update_derived)
+
+    date_var.trace_add("write", schedule_derived_update)
+    time_var.trace_add("write", schedule_derived_update)
 
     # === СЕТКА ПОЛЕЙ ===
     row = 0
@@ -119,17 +211,9 @@ def create_record(parent, record_widgets, default_date=None, default_time=None):
 
     # --- ВИД ЗАДАЧИ (КНОПКИ) ---
     tk.Label(type_diff_frame, text="Вид задачи:").pack(side="left", padx=(0, 2))
-    task_type_var = tk.StringVar(value="Р")
+    task_type_var = tk.StringVar(value=default_task_type or "Р")
     
-    task_types_info = [
-        ('У', 'У — Управленческая задача'),
-        ('Р', 'Р — рутина, текучка'),
-        ('ОК', 'ОК — Обще-кристовская задача'),
-        ('Л', 'Л — Личные дела'),
-        ('ЗП', 'ЗП — Зарплаты сотрудников'),
-        ('ГК', 'ГК — Работы по сдаче документов ГК'),
-        ('КК', 'КК — Криста Команда')
-    ]
+    task_types_info = TASK_TYPES
     
     task_type_buttons_frame = tk.Frame(type_diff_frame)
     task_type_buttons_frame.pack(side="left")
@@ -157,7 +241,7 @@ def create_record(parent, record_widgets, default_date=None, default_time=None):
     tk.Label(type_diff_frame, text="Сложность:").pack(side="left", padx=(10, 2))
     
     difficulty_style = state.settings["difficulty_style"].get()
-    difficulty_var = tk.StringVar(value="1")
+    difficulty_var = tk.StringVar(value=default_difficulty or "1")
     difficulty_buttons_frame = None
     difficulty_combo_hidden = None
     
@@ -189,6 +273,8 @@ def create_record(parent, record_widgets, default_date=None, default_time=None):
     description_text = tk.Text(frame, height=2, width=60)
     description_text.bind("<Control-v>", lambda event: description_text.event_generate("<<Paste>>"))
     description_text.grid(row=row, column=1, columnspan=3, sticky="ew", pady=(5, 0))
+    if default_description:
+        description_text.insert("1.0", default_description)
     frame.columnconfigure(1, weight=1)
     frame.columnconfigure(2, weight=1)
     frame.columnconfigure(3, weight=1)
@@ -210,24 +296,29 @@ def create_record(parent, record_widgets, default_date=None, default_time=None):
             set_difficulty("1")
 
     def delete_record():
+        if derived_state['after_id']:
+            frame.after_cancel(derived_state['after_id'])
+            derived_state['after_id'] = None
         frame.destroy()
-        # Предполагается, что record_widgets передается корректно из main.py
-        # main.py должен управлять этим списком. 
-        # Здесь мы просто удаляем фрейм. Логика удаления из record_widgets должна быть в main.py
-        # при итерации по списку или через callback.
-        # Простое удаление из record_widgets здесь может быть небезопасно.
-        # Лучше: if rec_dict in record_widgets: record_widgets.remove(rec_dict) в main.py
+        # Убираем запись и из списка, иначе автосохранение черновиков и
+        # сохранение в файлы будут обращаться к уничтоженным виджетам
+        if rec_dict in record_widgets:
+            record_widgets.remove(rec_dict)
         
     tk.Button(btn_frame, text="Сброс", command=reset_record, bg="#FFA500", fg="white", font=("Arial", 8)).pack(side="left", padx=2)
     tk.Button(btn_frame, text="Удалить", command=delete_record, bg="#FF4444", fg="white", font=("Arial", 8)).pack(side="left", padx=2)
     
     # Словарь для хранения ссылок на виджеты записи
     rec_dict = {
+        # Постоянный идентификатор записи (для черновиков)
+        'record_id': record_id or uuid.uuid4().hex,
         'frame': frame,
         'date_var': date_var,
         'time_var': time_var,
         'weekday_var': weekday_var,
         'part_of_day_var': part_of_day_var,
+        # Немедленный пересчёт дня недели и части дня (перед сохранением)
+        'update_derived': update_derived,
         'task_type_var': task_type_var,
         'description_text': description_text,
         'difficulty_var': difficulty_var,
@@ -0,0 +1,310 @@
+# utilization.py
+# Анализ загрузки: длительность задач по времени начала соседних записей
+
+import os
+import tkinter as tk
+from tkinter import ttk, messagebox
+from array import array
+from datetime import datetime, date
+import state # Для доступа к пути TXT-файла из настроек
+import data_processing
+import amendments # Правки и удаления записей
+
+# === ПРАВИЛА ПО УМОЛЧАНИЮ ===
+# Длительность записи = время до следующей записи того же дня, но не больше этого предела
+DEFAULT_MAX_GAP_MINUTES = 180
+# Последняя запись дня длится столько минут...
+DEFAULT_LAST_ENTRY_MINUTES = 60
+# ...но не дольше конца рабочего дня, если началась до него (None - без ограничения)
+DEFAULT_DAY_END = "18:00"
+
+WEEKDAY_NAMES = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+
+# Кэш по файлам: путь -> состояние разбора (см. _JournalIndex)
+_cache = {}
+
+
+def _parse_minutes(time_str):
+    """'HH:MM' -> минуты от начала дня (None, если время не распознано)."""
+    try:
+        hour, minute = time_str.strip().split(":")[:2]
+        hour, minute = int(hour), int(minute)
+    except (ValueError, AttributeError):
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+    return hour * 60 + minute
+
+
+class _JournalIndex:
+    """
+    Записи TXT-файла, сгруппированные по дням. Запись дня хранится одним числом
+    в array (минуты << 20 | код вида задачи << 10 | код части дня), поэтому
+    сортировка массива упорядочивает записи по времени, а память - 4 байта на запись.
+    Файл журнала только дописывается, поэтому при повторном вызове читаются
+    только новые байты и пересчитываются только затронутые дни.
+    """
+
+    # Сколько байт перед концом прочитанной части запоминать, чтобы заметить подмену файла
+    # (перезапись через временный файл, например при внесении поправок, видна и по номеру inode)
+    CHECK_BYTES = 64
+    # Кодов видов задач и частей дня (по 10 бит в упакованной записи)
+    MAX_CODE = 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.check = b""
+        self.inode = None
+        self.days = {}          # дата -> array('i') упакованных записей
+        self.day_results = {}   # дата -> итоги дня (для текущих правил)
+        self.rules = None
+        self.task_types = []    # код -> вид задачи
+        self.parts = []         # код -> часть дня
+        self._task_type_codes = {}
+        self._part_codes = {}
+
+    def _code(self, value, names, codes):
+        """Код строки (вида задачи или части дня) для упаковки в 10 бит."""
+        code = codes.get(value)
+        if code is None:
+            if len(names) < self.MAX_CODE - 1:
+                code = codes[value] = len(names)
+                names.append(value)
+            else:
+                # Небывалое число разных значений: остальные считаем вместе
+                if len(names) < self.MAX_CODE:
+                    names.append("Прочее")
+                code = self.MAX_CODE - 1
+        return code
+
+    def _pack(self, record, parsed_dates=None):
+        """(дата, упакованная запись) или None, если дата или время не распознаны."""
+        if parsed_dates is None:
+            record_date = data_processing.parse_record_date(record[0])
+        else:
+            record_date = parsed_dates.get(record[0])
+            if record_date is None:
+                record_date = parsed_dates[record[0]] = data_processing.parse_record_date(record[0])
+        minutes = _parse_minutes(record[1])
+        if record_date is None or minutes is None:
+            return None
+        part_of_day = record[3] or data_processing.get_part_of_day(minutes // 60)
+        task_type = record[4] or "Не указан"
+        packed = (minutes << 20) | (self._code(task_type, self.task_types, self._task_type_codes) << 10) \
+            | self._code(part_of_day, self.parts, self._part_codes)
+        return record_date, packed
+
+    def amended_days(self, changes):
+        """Копии записей дней, затронутых поправками (кэш дней не меняется).
+           changes - {смещение: (исходная запись, новая запись или None)}."""
+        days = {}
+
+        def day_entries(record_date):
+            entries = days.get(record_date)
+            if entries is None:
+                entries = days[record_date] = array("i", self.days.get(record_date, ()))
+            return entries
+
+        for base, new in changes.values():
+            packed_base = self._pack(base)
+            packed_new = self._pack(new) if new is not None else None
+            if packed_base is not None:
+                entries = day_entries(packed_base[0])
+                try:
+                    position = entries.index(packed_base[1])
+                except ValueError:
+                    continue # Исходной записи в журнале нет - поправка устарела
+                if packed_new is not None and packed_new[0] == packed_base[0]:
+                    # Новая запись встаёт на место исходной - как после внесения поправки в файл
+                    entries[position] = packed_new[1]
+                    continue
+                del entries[position]
+            if packed_new is not None:
+                day_entries(packed_new[0]).append(packed_new[1])
+        return days
+
+    def _is_same_file(self, st):
+        """Файл только дописан с прошлого чтения (а не заменён или обрезан)."""
+        if st.st_size < self.offset or (self.inode is not None and st.st_ino != self.inode):
+            return False
+        if not self.check:
+            return True
+        with open(self.path, "rb") as f:
+            f.seek(self.offset - len(self.check))
+            return f.read(len(self.check)) == self.check
+
+    def refresh(self):
+        """Дочитывает новые строки журнала. Возвращает множество затронутых дат."""
+        st = os.stat(self.path)
+        if not self._is_same_file(st):
+            self.__init__(self.path)
+        self.inode = st.st_ino
+        if st.st_size == self.offset:
+            return set()
+        touched = set()
+        parsed_dates = {} # Разных дат немного - не разбираем одну строку даты много раз
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    break # Неполная последняя строка (запись ещё идёт) - дочитаем в следующий раз
+                self.offset += len(raw_line)
+                self.check = (self.check + raw_line)[-self.CHECK_BYTES:]
+                record = data_processing.parse_txt_line(raw_line.decode("utf-8", errors="replace"))
+                packed_record = self._pack(record, parsed_dates) if record is not None else None
+                if packed_record is None:
+                    continue
+                record_date, packed = packed_record
+                entries = self.days.get(record_date)
+                if entries is None:
+                    entries = self.days[record_date] = array("i")
+                entries.append(packed)
+                touched.add(record_date)
+        for record_date in touched:
+            self.day_results.pop(record_date, None)
+        return touched
+
+    def day_result(self, record_date, rules):
+        """Итоги дня в минутах: {'by_type', 'by_part', 'total'} (с кэшем)."""
+        if rules != self.rules:
+            self.rules = rules
+            self.day_results = {}
+        result = self.day_results.get(record_date)
+        if result is None:
+            result = self.day_results[record_date] = self.day_result_for(self.days[record_date], rules)
+        return result
+
+    def day_result_for(self, entries, rules):
+        """Итоги дня в минутах для массива упакованных записей (без кэша)."""
+        max_gap, last_entry_minutes, day_end = rules
+        entries = sorted(entries)
+        by_type, by_part = {}, {}
+        total = 0
+        for index, packed in enumerate(entries):
+            start = packed >> 20
+            if index + 1 < len(entries):
+                duration = min((entries[index + 1] >> 20) - start, max_gap)
+            else:
+                duration = last_entry_minutes
+                if day_end is not None and start < day_end:
+                    duration = min(duration, day_end - start)
+            if duration <= 0:
+                continue
+            task_type = self.task_types[(packed >> 10) & 0x3FF]
+            part_of_day = self.parts[packed & 0x3FF]
+            by_type[task_type] = by_type.get(task_type, 0) + duration
+            by_part[part_of_day] = by_part.get(part_of_day, 0) + duration
+            total += duration
+        return {'by_type': by_type, 'by_part': by_part, 'total': total}
+
+
+def get_utilization(txt_path, date_from=None, date_to=None,
+                    max_gap_minutes=DEFAULT_MAX_GAP_MINUTES,
+                    last_entry_minutes=DEFAULT_LAST_ENTRY_MINUTES,
+                    day_end=DEFAULT_DAY_END):
+    """
+    Считает, куда ушли часы, за период [date_from, date_to] (границы включительно, None - без границы).
+    Длительность записи выводится из времени следующей записи того же дня
+    (не больше max_gap_minutes), для последней записи - last_entry_minutes,
+    но не дольше day_end ('HH:MM'), если запись началась раньше.
+    Возвращает словарь часов: 'by_type', 'by_part_of_day', 'by_weekday', 'total_hours', 'days'.
+    """
+    index = _cache.get(txt_path)
+    if index is None:
+        index = _cache[txt_path] = _JournalIndex(txt_path)
+    index.refresh()
+    rules = (max_gap_minutes, last_entry_minutes, _parse_minutes(day_end) if day_end else None)
+    # Дни, затронутые правками, считаются заново по копии (без кэша)
+    amended = index.amended_days(amendments.current_amendments(txt_path))
+
+    by_type, by_part, by_weekday = {}, {}, {}
+    total = 0
+    days = 0
+    for record_date in set(index.days) | set(amended):
+        if (date_from and record_date < date_from) or (date_to and record_date > date_to):
+            continue
+        if record_date in amended:
+            if not amended[record_date]:
+                continue
+            result = index.day_result_for(amended[record_date], rules)
+        else:
+            result = index.day_result(record_date, rules)
+        days += 1
+        total += result['total']
+        for task_type, minutes in result['by_type'].items():
+            by_type[task_type] = by_type.get(task_type, 0) + minutes
+        for part_of_day, minutes in result['by_part'].items():
+            by_part[part_of_day] = by_part.get(part_of_day, 0) + minutes
+        weekday = WEEKDAY_NAMES[record_date.weekday()]
+        by_weekday[weekday] = by_weekday.get(weekday, 0) + result['total']
+
+    def hours(values):
+        return {key: round(minutes / 60, 2) for key, minutes in values.items()}
+
+    return {
+        'by_type': hours(by_type),
+        'by_part_of_day': hours(by_part),
+        'by_weekday': {name: round(by_weekday[name] / 60, 2) for name in WEEKDAY_NAMES if name in by_weekday},
+        'total_hours': round(total / 60, 2),
+        'days': days,
+    }
+
+
+def show_utilization(parent_window):
+    """Окно отчёта о загрузке за период."""
+    window = tk.Toplevel(parent_window)
+    window.title("Загрузка по времени")
+    window.geometry("420x420")
+    window.grab_set()
+    window.focus_set()
+
+    controls = tk.Frame(window)
+    controls.pack(fill="x", padx=10, pady=(10, 5))
+    today = date.today()
+    from_var = tk.StringVar(value=today.replace(day=1).strftime("%d.%m.%Y"))
+    to_var = tk.StringVar(value=today.strftime("%d.%m.%Y"))
+    tk.Label(controls, text="С:").pack(side="left")
+    tk.Entry(controls, textvariable=from_var, width=10).pack(side="left", padx=(2, 8))
+    tk.Label(controls, text="по:").pack(side="left")
+    tk.Entry(controls, textvariable=to_var, width=10).pack(side="left", padx=(2, 8))
+
+    tree = ttk.Treeview(window, columns=('Показатель', 'Часы'), show='headings')
+    tree.heading('Показатель', text='Показатель')
+    tree.heading('Часы', text='Часы')
+    tree.column('Показатель', width=250, anchor='w')
+    tree.column('Часы', width=100, anchor='center')
+    tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+    def refresh():
+        try:
+            date_from = datetime.strptime(from_var.get().strip(), "%d.%m.%Y").date() if from_var.get().strip() else None
+            date_to = datetime.strptime(to_var.get().strip(), "%d.%m.%Y").date() if to_var.get().strip() else None
+        except ValueError:
+            messagebox.showwarning("Ошибка", "Даты указываются в формате дд.мм.гггг.", parent=window)
+            return
+        txt_path = state.settings["txt_path"].get().strip()
+        if not txt_path or not os.path.exists(txt_path):
+            messagebox.showwarning("Ошибка", f"TXT-файл не найден:\n{txt_path}", parent=window)
+            return
+        try:
+            report = get_utilization(txt_path, date_from, date_to)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось посчитать загрузку:\n{e}", parent=window)
+            return
+        tree.delete(*tree.get_children())
+        tree.insert('', tk.END, values=('Дней с записями:', report['days']))
+        tree.insert('', tk.END, values=('Всего часов:', report['total_hours']))
+        sections = [
+            ('По видам задач:', sorted(report['by_type'].items())),
+            ('По частям дня:', sorted(report['by_part_of_day'].items())),
+            ('По дням недели:', list(report['by_weekday'].items())),
+        ]
+        for title, items in sections:
+            tree.insert('', tk.END, values=('', ''))
+            tree.insert('', tk.END, values=(title, ''))
+            for name, value in items:
+                tree.insert('', tk.END, values=(f"  - {name}", value))
+
+    tk.Button(controls, text="Показать", command=refresh).pack(side="left")
+    refresh()
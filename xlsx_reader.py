@@ -0,0 +1,250 @@
+# xlsx_reader.py
+# Быстрое потоковое чтение .xlsx без openpyxl (zipfile + iterparse)
+
+import re
+import zipfile
+import posixpath
+from datetime import datetime, timedelta
+import xml.etree.ElementTree as ET
+
+# Пространства имён SpreadsheetML
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_ROW = _MAIN_NS + "row"
+_CELL = _MAIN_NS + "c"
+_VALUE = _MAIN_NS + "v"
+_INLINE = _MAIN_NS + "is"
+_TEXT = _MAIN_NS + "t"
+_PHONETIC = _MAIN_NS + "rPh"
+_SHARED_ITEM = _MAIN_NS + "si"
+_DIMENSION = _MAIN_NS + "dimension"
+_SHEET_DATA = _MAIN_NS + "sheetData"
+
+# Встроенные форматы Excel, означающие дату/время
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+# Встроенные форматы, означающие только время
+_BUILTIN_TIME_FORMATS = {18, 19, 20, 21, 45, 46, 47}
+
+_CELL_REF = re.compile(r"([A-Z]+)(\d+)")
+
+# Начало отсчёта дат Excel (с учётом ошибки 1900 года в Excel)
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_EXCEL_EPOCH_1904 = datetime(1904, 1, 1)
+
+
+def excel_serial_to_datetime(serial, date1904=False):
+    """Переводит число Excel (дата-время) в datetime."""
+    epoch = _EXCEL_EPOCH_1904 if date1904 else _EXCEL_EPOCH
+    return epoch + timedelta(days=float(serial))
+
+
+def _column_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - 64)
+    return index
+
+
+def _is_date_format_code(code):
+    """Определяет по коду пользовательского формата, что это дата/время."""
+    code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.', "", code).lower()
+    return any(char in code for char in "dmyhs")
+
+
+def _is_time_format_code(code):
+    code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.', "", code).lower()
+    return not any(char in code for char in "dy") and "h" in code
+
+
+def _sheet_path(zf, sheet):
+    """Путь к XML листа внутри архива. sheet - индекс (с 0) или имя листа.
+       Возвращает None, если листа нет."""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(_PKG_REL_NS + "Relationship")}
+    sheets = [(item.get("name"), item.get(_REL_NS + "id")) for item in workbook.iter(_MAIN_NS + "sheet")]
+    if isinstance(sheet, int):
+        if sheet >= len(sheets):
+            return None
+        rel_id = sheets[sheet][1]
+    else:
+        rel_id = next((rid for name, rid in sheets if name == sheet), None)
+        if rel_id is None:
+            return None
+    target = targets[rel_id]
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+
+def _date1904(zf):
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    properties = workbook.find(_MAIN_NS + "workbookPr")
+    return properties is not None and properties.get("date1904") in ("1", "true")
+
+
+def _shared_strings(zf):
+    """Читает таблицу общих строк один раз для всего листа."""
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    strings = []
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == _SHARED_ITEM:
+                # Текст может быть разбит на фрагменты форматирования (r/t); фонетику (rPh) пропускаем
+                parts = []
+                for child in elem:
+                    if child.tag == _TEXT:
+                        parts.append(child.text or "")
+                    elif child.tag != _PHONETIC:
+                        parts.extend(t.text or "" for t in child.iter(_TEXT))
+                strings.append("".join(parts))
+                elem.clear()
+    return strings
+
+
+def _date_styles(zf):
+    """Индексы стилей ячеек с форматом даты и отдельно - только времени."""
+    if "xl/styles.xml" not in zf.namelist():
+        return set(), set()
+    styles = ET.fromstring(zf.read("xl/styles.xml"))
+    date_formats = set(_BUILTIN_DATE_FORMATS)
+    time_formats = set(_BUILTIN_TIME_FORMATS)
+    num_formats = styles.find(_MAIN_NS + "numFmts")
+    if num_formats is not None:
+        for num_format in num_formats:
+            format_id = int(num_format.get("numFmtId"))
+            code = num_format.get("formatCode", "")
+            if _is_date_format_code(code):
+                date_formats.add(format_id)
+                if _is_time_format_code(code):
+                    time_formats.add(format_id)
+    date_styles, time_styles = set(), set()
+    cell_xfs = styles.find(_MAIN_NS + "cellXfs")
+    if cell_xfs is not None:
+        for index, xf in enumerate(cell_xfs):
+            format_id = int(xf.get("numFmtId", 0))
+            if format_id in date_formats:
+                date_styles.add(index)
+            if format_id in time_formats:
+                time_styles.add(index)
+    return date_styles, time_styles
+
+
+def iter_rows(filename, sheet=0, max_col=None, min_row=1):
+    """
+    Потоково читает строки листа .xlsx.
+    Выдаёт списки значений длиной max_col (или по фактическому числу колонок):
+    строки - str, числа - int/float, даты - datetime, время - datetime.time, пусто - None.
+    Ячейки правее max_col не разбираются. Пустые строки не выдаются.
+    """
+    with zipfile.ZipFile(filename) as zf:
+        sheet_path = _sheet_path(zf, sheet)
+        if sheet_path is None:
+            return
+        strings = _shared_strings(zf)
+        date_styles, time_styles = _date_styles(zf)
+        date1904 = _date1904(zf)
+
+        with zf.open(sheet_path) as f:
+            row_number = 0
+            sheet_data = None
+            column_cache = {} # "AB" -> 28
+            for event, elem in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == _SHEET_DATA:
+                        sheet_data = elem
+                    continue
+                if elem.tag != _ROW:
+                    continue
+                row_ref = elem.get("r")
+                row_number = int(row_ref) if row_ref else row_number + 1
+                if row_number < min_row:
+                    elem.clear()
+                    if sheet_data is not None:
+                        sheet_data.clear()
+                    continue
+                values = [None] * max_col if max_col else []
+                next_col = 1
+                for cell in elem:
+                    if cell.tag != _CELL:
+                        continue
+                    ref = cell.get("r")
+                    if ref:
+                        letters = ref.rstrip("0123456789")
+                        col = column_cache.get(letters)
+                        if col is None:
+                            col = column_cache[letters] = _column_index(letters)
+                    else:
+                        col = next_col
+                    next_col = col + 1
+                    if max_col and col > max_col:
+                        break
+                    cell_type = cell.get("t", "n")
+                    if cell_type == "inlineStr":
+                        inline = cell.find(_INLINE)
+                        value = "".join(t.text or "" for t in inline.iter(_TEXT)) if inline is not None else None
+                    else:
+                        raw = cell.findtext(_VALUE)
+                        if raw is None:
+                            value = None
+                        elif cell_type == "s":
+                            value = strings[int(raw)]
+                        elif cell_type in ("str", "e"):
+                            value = raw
+                        elif cell_type == "b":
+                            value = raw == "1"
+                        else:
+                            number = float(raw)
+                            style = int(cell.get("s", 0))
+                            if style in date_styles:
+                                value = excel_serial_to_datetime(number, date1904)
+                                if style in time_styles:
+                                    value = value.time()
+                            elif number.is_integer():
+                                value = int(number)
+                            else:
+                                value = number
+                    if not max_col and col > len(values):
+                        values.extend([None] * (col - len(values)))
+                    values[col - 1] = value
+                # Освобождаем разобранную строку, чтобы память не росла с размером листа
+                elem.clear()
+                if sheet_data is not None:
+                    sheet_data.clear()
+                if any(value is not None for value in values):
+                    yield values
+
+
+def read_dimension(filename, sheet=0):
+    """
+    Читает из листа только элемент <dimension ref="A1:G123"> (он в самом начале XML)
+    и возвращает номер последней строки. None, если размер не указан.
+    """
+    with zipfile.ZipFile(filename) as zf:
+        sheet_path = _sheet_path(zf, sheet)
+        if sheet_path is None:
+            return None
+        with zf.open(sheet_path) as f:
+            for _, elem in ET.iterparse(f, events=("start",)):
+                if elem.tag == _DIMENSION:
+                    match = _CELL_REF.findall(elem.get("ref", ""))
+                    return int(match[-1][1]) if match else None
+                if elem.tag == _SHEET_DATA:
+                    return None
+    return None
+
+
+def sheet_checksums(filename, sheets):
+    """
+    Контрольные суммы XML листов (CRC32 из оглавления архива, сами листы не читаются).
+    Возвращает список значений в порядке sheets (None для отсутствующих листов).
+    """
+    with zipfile.ZipFile(filename) as zf:
+        checksums = []
+        for sheet in sheets:
+            sheet_path = _sheet_path(zf, sheet)
+            checksums.append(zf.getinfo(sheet_path).CRC if sheet_path is not None else None)
+        return checksums